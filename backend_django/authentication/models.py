@@ -127,14 +127,18 @@ class User(AbstractUser):
         return self.role in ['admin', 'manager']
     
     def get_user_permissions(self):
-        """Get all permissions for this user through their roles"""
-        from permissions.models import UserRole
-        user_roles = UserRole.objects.filter(user=self)
-        permissions = []
-        for user_role in user_roles:
-            role_permissions = user_role.role.permissions.filter(is_active=True)
-            permissions.extend(role_permissions)
-        return list(set(permissions))  # Remove duplicates
+        """Get all effective permissions for this user (active roles and direct grants)"""
+        from permissions.cache import query_effective_permissions
+        return list(query_effective_permissions(self))
+    
+    def get_permission_codenames(self):
+        """Cached frozenset with the codenames of the user's effective permissions"""
+        from permissions.cache import get_effective_permissions
+        return get_effective_permissions(self)
+    
+    def has_permission_codename(self, codename):
+        """Check an effective permission (in-memory lookup after the first call)"""
+        return codename in self.get_permission_codenames()
 
 
 class UserProfile(models.Model):
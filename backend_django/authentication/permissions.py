@@ -32,11 +32,7 @@ def require_permission(permission_codename):
             if request.user.is_superuser:
                 return view_func(request, *args, **kwargs)
             
-            # Obtener permisos del usuario
-            user_permissions = request.user.get_user_permissions()
-            permission_codenames = [perm.codename for perm in user_permissions]
-            
-            if permission_codename not in permission_codenames:
+            if not request.user.has_permission_codename(permission_codename):
                 return JsonResponse(
                     {'error': f'No tienes permisos para realizar esta acción. Permiso requerido: {permission_codename}'}, 
                     status=403
@@ -90,7 +86,7 @@ def admin_required(view_func):
                 status=401
             )
         
-        if not request.user.is_admin():
+        if not request.user.is_admin:
             return JsonResponse(
                 {'error': 'Acceso denegado. Se requieren permisos de administrador'}, 
                 status=403
@@ -113,7 +109,7 @@ def employee_required(view_func):
                 status=401
             )
         
-        if not (request.user.is_employee() or request.user.is_admin()):
+        if not (request.user.is_employee or request.user.is_admin):
             return JsonResponse(
                 {'error': 'Acceso denegado. Se requieren permisos de empleado'}, 
                 status=403
@@ -168,10 +164,7 @@ class PermissionMixin:
         
         # Verificar permiso requerido
         if self.required_permission:
-            user_permissions = request.user.get_user_permissions()
-            permission_codenames = [perm.codename for perm in user_permissions]
-            
-            if self.required_permission not in permission_codenames:
+            if not request.user.has_permission_codename(self.required_permission):
                 self.permission_denied(
                     request, 
                     message=f'No tienes permisos para realizar esta acción. Permiso requerido: {self.required_permission}'
@@ -183,7 +176,7 @@ def check_object_permission(user, obj, permission_type='view'):
     Verificar permisos a nivel de objeto
     """
     # Administradores tienen acceso completo
-    if user.is_admin():
+    if user.is_admin:
         return True
     
     # Para órdenes, los clientes solo pueden ver sus propias órdenes
@@ -191,7 +184,7 @@ def check_object_permission(user, obj, permission_type='view'):
         return True
     
     # Para empleados, verificar permisos específicos según el tipo de objeto
-    if user.is_employee():
+    if user.is_employee:
         if hasattr(obj, '__class__'):
             model_name = obj.__class__.__name__.lower()
             
@@ -204,9 +197,6 @@ def check_object_permission(user, obj, permission_type='view'):
             }
             
             if model_name in permission_map:
-                required_permission = permission_map[model_name]
-                user_permissions = user.get_user_permissions()
-                permission_codenames = [perm.codename for perm in user_permissions]
-                return required_permission in permission_codenames
+                return user.has_permission_codename(permission_map[model_name])
     
     return False
\ No newline at end of file
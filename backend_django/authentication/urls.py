@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import AuthViewSet, UserViewSet, CustomTokenObtainPairView, login_view, register_view, me_view
-from .views_dashboard import users_this_month_view
+from .views_dashboard import users_this_month_view, admin_stats_view
 from .oauth_views import google_login_callback, google_oauth_url
 
 # Create router for ViewSets
@@ -23,6 +23,7 @@ urlpatterns = [
 
   # --- NEW ENDPOINT: /api/auth/users-this-month/ ---
   path('users-this-month/', users_this_month_view, name='api_users_this_month'),
+  path('admin-stats/', admin_stats_view, name='api_admin_stats'),
     
     # Include ViewSet URLs
     path('', include(router.urls)),
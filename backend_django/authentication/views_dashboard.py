@@ -30,6 +30,8 @@ from products.models import Product, Category
 from orders.models import Order, PaymentMethod
 from employees.models import Employee, Department
 from permissions.models import UserRole, Permission
+from reports.kpis import KPISnapshotService
+from decimal import Decimal
 
 
 @api_view(['GET'])
@@ -42,9 +44,9 @@ def dashboard_view(request):
     user_roles = UserRole.objects.filter(user=user, is_active=True)
     
     # Determinar tipo de usuario y permisos
-    is_admin = user.is_admin()
-    is_employee = user.is_employee()
-    is_customer = user.is_customer()
+    is_admin = user.is_admin
+    is_employee = user.is_employee
+    is_customer = user.is_customer
     
     dashboard_data = {
         'user_info': {
@@ -62,8 +64,7 @@ def dashboard_view(request):
     }
     
     # Obtener permisos del usuario
-    user_permissions = user.get_user_permissions()
-    dashboard_data['permissions'] = [perm.codename for perm in user_permissions]
+    dashboard_data['permissions'] = sorted(user.get_permission_codenames())
     
     # Configurar navegación según rol
     if is_admin:
@@ -108,106 +109,73 @@ def dashboard_view(request):
 
 
 def get_admin_widgets():
-    """Obtener widgets específicos para administradores"""
+    """Obtener widgets específicos para administradores (desde la instantánea de KPIs)"""
     try:
-        widgets = []
-        
-        # Widget de ventas del día
-        today_orders = Order.objects.filter(
-            created_at__date=timezone.now().date(),
-            status__in=['confirmed', 'processing', 'shipped', 'delivered']
-        )
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Ventas del Día',
-            'value': len(today_orders),
-            'subtitle': f'Total: ${sum(order.total_amount for order in today_orders):.2f}',
-            'icon': 'trending_up',
-            'color': 'primary'
-        })
-        
-        # Widget de productos con stock bajo
-        low_stock_products = Product.objects.filter(
-            variants__stock_quantity__lte=models.F('variants__min_stock_level')
-        ).distinct()
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Stock Bajo',
-            'value': len(low_stock_products),
-            'subtitle': 'Productos necesitan reabastecimiento',
-            'icon': 'warning',
-            'color': 'warning'
-        })
+        kpis = KPISnapshotService().get_global()
+        today_sales = kpis['sales']['today']
         
-        # Widget de empleados activos
-        active_employees = Employee.objects.filter(employment_status='active').count()
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Empleados Activos',
-            'value': active_employees,
-            'subtitle': 'Personal en nómina',
-            'icon': 'people',
-            'color': 'info'
-        })
-        
-        # Widget de nuevos clientes
-        new_customers = User.objects.filter(
-            role='customer',
-            created_at__date=timezone.now().date()
-        ).count()
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Nuevos Clientes',
-            'value': new_customers,
-            'subtitle': 'Registrados hoy',
-            'icon': 'person_add',
-            'color': 'success'
-        })
-        
-        return widgets
+        return [
+            {
+                'type': 'metric',
+                'title': 'Ventas del Día',
+                'value': today_sales['count'],
+                'subtitle': f"Total: ${Decimal(today_sales['total'] or 0):.2f}",
+                'icon': 'trending_up',
+                'color': 'primary'
+            },
+            {
+                'type': 'metric',
+                'title': 'Stock Bajo',
+                'value': kpis['products']['low_stock'],
+                'subtitle': 'Productos necesitan reabastecimiento',
+                'icon': 'warning',
+                'color': 'warning'
+            },
+            {
+                'type': 'metric',
+                'title': 'Empleados Activos',
+                'value': kpis['employees']['total_active'],
+                'subtitle': 'Personal en nómina',
+                'icon': 'people',
+                'color': 'info'
+            },
+            {
+                'type': 'metric',
+                'title': 'Nuevos Clientes',
+                'value': kpis['customers']['new_today'],
+                'subtitle': 'Registrados hoy',
+                'icon': 'person_add',
+                'color': 'success'
+            },
+        ]
     except Exception as e:
         return []
 
 
 def get_employee_widgets(user):
-    """Obtener widgets específicos para empleados"""
+    """Obtener widgets específicos para empleados (desde la instantánea de KPIs)"""
     try:
-        widgets = []
-        
-        # Widget de ventas personales del día
-        today_orders = Order.objects.filter(
-            processed_by=user,
-            created_at__date=timezone.now().date()
-        )
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Mis Ventas del Día',
-            'value': len(today_orders),
-            'subtitle': f'Total: ${sum(order.total_amount for order in today_orders):.2f}',
-            'icon': 'sales',
-            'color': 'primary'
-        })
+        kpis = KPISnapshotService().get_employee(user)
+        today_sales = kpis['sales']['today']
         
-        # Widget de órdenes pendientes
-        pending_orders = Order.objects.filter(
-            status__in=['pending', 'confirmed']
-        ).count()
-        
-        widgets.append({
-            'type': 'metric',
-            'title': 'Órdenes Pendientes',
-            'value': pending_orders,
-            'subtitle': 'Requieren atención',
-            'icon': 'pending',
-            'color': 'warning'
-        })
-        
-        return widgets
+        return [
+            {
+                'type': 'metric',
+                'title': 'Mis Ventas del Día',
+                'value': today_sales['count'],
+                'subtitle': f"Total: ${Decimal(today_sales['total'] or 0):.2f}",
+                'icon': 'sales',
+                'color': 'primary'
+            },
+            {
+                'type': 'metric',
+                'title': 'Órdenes Pendientes',
+                'value': kpis['orders']['pending'],
+                'subtitle': 'Requieren atención',
+                'icon': 'pending',
+                'color': 'warning'
+            },
+        ]
     except Exception as e:
         return []
 
@@ -294,57 +262,26 @@ def admin_stats_view(request):
     """
     Vista de estadísticas solo para administradores
     """
-    if not request.user.is_admin():
+    if not request.user.is_admin:
         return Response(
             {'error': 'No tienes permisos para acceder a esta información'}, 
             status=status.HTTP_403_FORBIDDEN
         )
     
-    from django.utils import timezone
-    from datetime import timedelta
-    from django.db.models import Sum, Count, Q
-    
-    # Estadísticas de ventas
-    today = timezone.now().date()
-    this_month = today.replace(day=1)
-    
+    kpis = KPISnapshotService().get_global()
     stats = {
-        'sales': {
-            'today': Order.objects.filter(
-                created_at__date=today,
-                status__in=['confirmed', 'processing', 'shipped', 'delivered']
-            ).aggregate(
-                total=Sum('total_amount'),
-                count=Count('id')
-            ),
-            'this_month': Order.objects.filter(
-                created_at__date__gte=this_month,
-                status__in=['confirmed', 'processing', 'shipped', 'delivered']
-            ).aggregate(
-                total=Sum('total_amount'),
-                count=Count('id')
-            )
-        },
+        'sales': kpis['sales'],
         'products': {
-            'total_active': Product.objects.filter(status='active').count(),
-            'low_stock': Product.objects.filter(
-                variants__stock_quantity__lte=models.F('variants__min_stock_level')
-            ).distinct().count(),
-            'out_of_stock': Product.objects.filter(
-                variants__stock_quantity=0
-            ).distinct().count()
+            'total_active': kpis['products']['total_active'],
+            'low_stock': kpis['products']['low_stock'],
+            'out_of_stock': kpis['products']['out_of_stock'],
         },
         'customers': {
-            'total': User.objects.filter(role='customer').count(),
-            'new_this_month': User.objects.filter(
-                role='customer',
-                created_at__date__gte=this_month
-            ).count()
+            'total': kpis['customers']['total'],
+            'new_this_month': kpis['customers']['new_this_month'],
         },
-        'employees': {
-            'total_active': Employee.objects.filter(employment_status='active').count(),
-            'departments': Department.objects.filter(is_active=True).count()
-        }
+        'employees': kpis['employees'],
+        'computed_at': kpis['computed_at'],
     }
     
     return Response(stats)
@@ -363,10 +300,7 @@ class PermissionMiddleware:
         # Verificar permisos específicos basados en la vista
         if hasattr(view_func, 'required_permission'):
             if request.user.is_authenticated:
-                user_permissions = request.user.get_user_permissions()
-                permission_codenames = [perm.codename for perm in user_permissions]
-                
-                if view_func.required_permission not in permission_codenames:
+                if not request.user.has_permission_codename(view_func.required_permission):
                     return JsonResponse(
                         {'error': 'No tienes permisos para realizar esta acción'}, 
                         status=403
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('products', '0003_product_stock_counters'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='product_variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.productvariant'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product', 'product_variant')},
+        ),
+    ]
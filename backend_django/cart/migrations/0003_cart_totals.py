@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:51
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    total_items = items.annotate(value=Sum('quantity')).values('value')
+    subtotal = items.annotate(value=Sum(ExpressionWrapper(
+        F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    ))).values('value')
+    Cart.objects.update(
+        total_items=Coalesce(Subquery(total_items), Value(0)),
+        subtotal=Coalesce(Subquery(subtotal), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_alter_cartitem_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_cart_totals, migrations.RunPython.noop),
+    ]
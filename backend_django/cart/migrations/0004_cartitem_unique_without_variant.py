@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:43
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Merge variant-less lines duplicated since (cart, product) stopped being
+    unique, keeping the oldest line with the summed quantity
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    duplicates = CartItem.objects.filter(product_variant__isnull=True).values(
+        'cart_id', 'product_id'
+    ).annotate(lines=Count('id'), quantity=Sum('quantity')).filter(lines__gt=1).order_by()
+
+    cart_ids = set()
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(
+            cart_id=duplicate['cart_id'], product_id=duplicate['product_id'], product_variant__isnull=True
+        ).order_by('created_at')
+        keep = items.first()
+        items.exclude(id=keep.id).delete()
+        CartItem.objects.filter(id=keep.id).update(quantity=duplicate['quantity'])
+        cart_ids.add(duplicate['cart_id'])
+
+    for cart in Cart.objects.filter(id__in=cart_ids):
+        items = list(CartItem.objects.filter(cart_id=cart.id))
+        cart.total_items = sum(item.quantity for item in items)
+        cart.subtotal = sum(item.quantity * item.unit_price for item in items)
+        cart.save(update_fields=['total_items', 'subtotal'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_cart_totals'),
+        ('products', '0003_product_stock_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_variant__isnull', True)), fields=('cart', 'product'), name='unique_cart_product_without_variant'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from products.models import Product
+from products.models import Product, ProductVariant
 import uuid
 
 User = get_user_model()
@@ -13,6 +13,9 @@ class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='carts')
     session_id = models.CharField(max_length=255, null=True, blank=True)  # For anonymous users
+    # Totals kept in sync with the items (see cart.totals)
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -26,14 +29,6 @@ class Cart(models.Model):
         if self.user:
             return f"Cart for {self.user.email}"
         return f"Anonymous cart {self.session_id}"
-    
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.items.all())
-    
-    @property
-    def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
 
 
 class CartItem(models.Model):
@@ -43,13 +38,22 @@ class CartItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ('cart', 'product')
+        unique_together = ('cart', 'product', 'product_variant')
+        constraints = [
+            # NULLs are distinct in unique_together: one variant-less line per product
+            models.UniqueConstraint(
+                fields=['cart', 'product'],
+                condition=models.Q(product_variant__isnull=True),
+                name='unique_cart_product_without_variant'
+            ),
+        ]
         indexes = [
             models.Index(fields=['cart']),
             models.Index(fields=['product']),
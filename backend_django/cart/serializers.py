@@ -13,4 +13,5 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['total_items', 'subtotal']
\ No newline at end of file
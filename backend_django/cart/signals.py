@@ -0,0 +1,13 @@
+"""
+Keep cart totals up to date
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import CartItem
+from .totals import schedule_cart_totals
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals_on_item_change(sender, instance, **kwargs):
+    schedule_cart_totals(instance.cart_id)
@@ -0,0 +1,88 @@
+"""
+Cart totals kept on Cart and the per-user cart summary read from them
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Cart, CartItem
+
+_local = threading.local()
+
+
+def refresh_cart_totals(cart_ids):
+    """
+    Recompute total_items and subtotal of the given carts with a single UPDATE
+    """
+    cart_ids = {cart_id for cart_id in cart_ids if cart_id}
+    if not cart_ids:
+        return 0
+
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    total_items = items.annotate(value=Sum('quantity')).values('value')
+    subtotal = items.annotate(value=Sum(ExpressionWrapper(
+        F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    ))).values('value')
+
+    return Cart.objects.filter(id__in=cart_ids).update(
+        total_items=Coalesce(Subquery(total_items), Value(0)),
+        subtotal=Coalesce(Subquery(subtotal), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        updated_at=timezone.now()
+    )
+
+
+def schedule_cart_totals(cart_id):
+    """
+    Recompute a cart's totals now, or once at the end of the enclosing
+    deferred_cart_totals() block
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        refresh_cart_totals([cart_id])
+    else:
+        pending.add(cart_id)
+
+
+@contextmanager
+def deferred_cart_totals():
+    """
+    Collect the carts touched inside the block (e.g. a bulk item delete that
+    fires one signal per item) and recompute each of them once on exit
+    """
+    if getattr(_local, 'pending', None) is not None:
+        # Nested: the outer block recomputes
+        yield
+        return
+
+    _local.pending = set()
+    try:
+        yield
+        cart_ids = _local.pending
+    finally:
+        _local.pending = None
+    refresh_cart_totals(cart_ids)
+
+
+def clear_cart(cart):
+    """
+    Delete all items of the cart with a single totals recompute
+    """
+    with deferred_cart_totals():
+        cart.items.all().delete()
+
+
+def get_cart_summary(user):
+    """
+    Summary of the user's most recent cart (a single-row read of the
+    denormalized totals)
+    """
+    cart = Cart.objects.filter(user=user).order_by('-updated_at').values(
+        'id', 'total_items', 'subtotal'
+    ).first()
+    return {
+        'cart_id': str(cart['id']) if cart else None,
+        'total_items': cart['total_items'] if cart else 0,
+        'subtotal': str(cart['subtotal']) if cart else '0.00',
+    }
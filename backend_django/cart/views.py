@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Cart, CartItem
 from .serializers import CartSerializer, CartItemSerializer
+from .totals import get_cart_summary
 
 
 class CartViewSet(viewsets.ModelViewSet):
@@ -11,7 +12,15 @@ class CartViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).prefetch_related('items')
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Item count and subtotal for the header badge
+        GET /api/cart/summary/
+        """
+        return Response(get_cart_summary(request.user))
 
 
 class CartItemViewSet(viewsets.ModelViewSet):
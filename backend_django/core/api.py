@@ -1,26 +1,54 @@
-from django.http import JsonResponse
-from django.contrib.auth import get_user_model
-
-User = get_user_model()
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from authentication.permissions import IsSuperuserOrAdmin
+from reports.kpis import KPISnapshotService
+from .instrumentation import perf_stats
 
 
+@api_view(['GET'])
+@permission_classes([IsSuperuserOrAdmin])
 def admin_dashboard_stats(request):
-    """Return basic dashboard stats for admin panel (stub implementation)."""
-    try:
-        total_users = User.objects.count()
-    except Exception:
-        total_users = 0
+    """Return dashboard stats for the admin panel from the KPI snapshot (reports.kpis)."""
+    kpis = KPISnapshotService().get_global()
 
-    # In a full implementation you'd aggregate orders, revenue, low-stock products, etc.
     data = {
-        'total_users': total_users,
-        'total_products': 0,
-        'total_orders': 0,
-        'total_revenue': 0.0,
-        'recent_orders': [],
-        'low_stock_products': [],
-        'user_registrations_this_month': 0,
-        'orders_this_month': 0,
+        'total_users': kpis['users']['total'],
+        'total_products': kpis['products']['total'],
+        'total_orders': kpis['orders']['total'],
+        'total_revenue': float(kpis['orders']['revenue'] or 0),
+        'recent_orders': kpis['orders']['recent'],
+        'low_stock_products': kpis['products']['low_stock_list'],
+        'user_registrations_this_month': kpis['users']['new_this_month'],
+        'orders_this_month': kpis['sales']['this_month']['count'],
+        'computed_at': kpis['computed_at'],
     }
 
-    return JsonResponse(data)
+    return Response(data)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsSuperuserOrAdmin])
+def perf_stats_view(request):
+    """
+    Métricas por endpoint del proceso actual (ver core.instrumentation)
+    GET /api/admin/perf/    -> percentiles p50/p95/p99 y consultas duplicadas
+    DELETE /api/admin/perf/ -> reinicia las métricas
+    Parámetros GET: ?sort=latency|queries|db (p95 descendente)
+    """
+    if request.method == 'DELETE':
+        perf_stats.reset()
+        return Response(status=204)
+
+    sort_keys = {'latency': 'latency_ms', 'queries': 'queries', 'db': 'db_ms'}
+    sort_key = sort_keys.get(request.query_params.get('sort'), 'latency_ms')
+    endpoints = sorted(
+        perf_stats.snapshot().items(),
+        key=lambda item: item[1][sort_key]['p95'] or 0,
+        reverse=True
+    )
+    return Response({
+        'sample_rate': getattr(settings, 'PERF_SAMPLE_RATE', 1.0),
+        'window_size': perf_stats.window_size,
+        'endpoints': [{'endpoint': endpoint, **stats} for endpoint, stats in endpoints],
+    })
@@ -0,0 +1,124 @@
+"""
+Métricas de rendimiento por endpoint (latencia, consultas y tiempo de BD)
+
+PerformanceInstrumentationMiddleware mide las solicitudes muestreadas y las
+registra aquí por nombre de URL resuelto. Cada proceso guarda una ventana de
+las últimas PERF_WINDOW_SIZE solicitudes por endpoint, y con ella se calculan
+los percentiles que muestra /api/admin/perf/. Son métricas del proceso que
+atiende la consulta, no del conjunto de workers.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+from django.conf import settings
+
+_NUMBERS = re.compile(r'\b\d+\b')
+_IN_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def query_signature(sql):
+    """
+    SQL sin literales numéricos ni listas IN, para agrupar consultas iguales
+    con distintos parámetros
+    """
+    return _IN_LISTS.sub('(...)', _NUMBERS.sub('N', sql))
+
+
+class QueryRecorder:
+    """
+    execute_wrapper de Django que cuenta las consultas de una solicitud,
+    su tiempo total y cuántas veces se repite cada firma
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.signatures[query_signature(sql)] += 1
+
+    def duplicates(self):
+        return {signature: count for signature, count in self.signatures.items() if count > 1}
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class PerfStats:
+    """
+    Ventana deslizante de muestras por endpoint
+    """
+
+    # Firmas de consultas duplicadas que se conservan por endpoint
+    MAX_DUPLICATE_SIGNATURES = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    @property
+    def window_size(self):
+        return getattr(settings, 'PERF_WINDOW_SIZE', 500)
+
+    def record(self, endpoint, duration, queries, db_duration, duplicates):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0,
+                    'samples': deque(maxlen=self.window_size),
+                    'duplicates': Counter(),
+                }
+            stats['requests'] += 1
+            stats['samples'].append((duration, queries, db_duration))
+            stats['duplicates'].update(duplicates)
+            if len(stats['duplicates']) > self.MAX_DUPLICATE_SIGNATURES * 2:
+                stats['duplicates'] = Counter(dict(stats['duplicates'].most_common(self.MAX_DUPLICATE_SIGNATURES)))
+
+    def snapshot(self):
+        """
+        Resumen por endpoint: percentiles de latencia (ms), consultas y tiempo
+        de BD sobre la ventana, y las consultas duplicadas más frecuentes
+        """
+        with self._lock:
+            endpoints = {
+                endpoint: (stats['requests'], list(stats['samples']), stats['duplicates'].most_common(self.MAX_DUPLICATE_SIGNATURES))
+                for endpoint, stats in self._endpoints.items()
+            }
+
+        result = {}
+        for endpoint, (requests, samples, duplicates) in endpoints.items():
+            durations = sorted(sample[0] * 1000 for sample in samples)
+            queries = sorted(sample[1] for sample in samples)
+            db_durations = sorted(sample[2] * 1000 for sample in samples)
+            result[endpoint] = {
+                'requests': requests,
+                'window': len(samples),
+                'latency_ms': {f'p{p}': round(_percentile(durations, p), 2) for p in (50, 95, 99)},
+                'queries': {f'p{p}': _percentile(queries, p) for p in (50, 95, 99)},
+                'db_ms': {f'p{p}': round(_percentile(db_durations, p), 2) for p in (50, 95, 99)},
+                'max_queries': queries[-1],
+                'duplicate_queries': [
+                    {'sql': signature, 'count': count} for signature, count in duplicates
+                ],
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+perf_stats = PerfStats()
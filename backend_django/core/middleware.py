@@ -1,5 +1,11 @@
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
 from django.utils.deprecation import MiddlewareMixin
 from django.views.decorators.csrf import csrf_exempt
+from .instrumentation import QueryRecorder, perf_stats
 
 
 class DisableCSRFOnAPIMiddleware(MiddlewareMixin):
@@ -11,4 +17,42 @@ class DisableCSRFOnAPIMiddleware(MiddlewareMixin):
         # Disable CSRF for all API endpoints
         if request.path.startswith('/api/'):
             setattr(view_func, 'csrf_exempt', True)
-        return None
\ No newline at end of file
+        return None
+
+class PerformanceInstrumentationMiddleware:
+    """
+    Mide latencia, número de consultas, tiempo de BD y consultas duplicadas
+    de una muestra de las solicitudes (PERF_SAMPLE_RATE). Los registra por
+    nombre de URL en core.instrumentation.perf_stats y los envía en la
+    cabecera Server-Timing.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not getattr(settings, 'PERF_INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+        if random.random() >= getattr(settings, 'PERF_SAMPLE_RATE', 1.0):
+            return self.get_response(request)
+        
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            endpoint = match.view_name or match.route
+            perf_stats.record(endpoint, duration, recorder.count, recorder.duration, recorder.duplicates())
+        
+        app_duration = max(duration - recorder.duration, 0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'app;dur={app_duration * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ])
+        return response
@@ -0,0 +1,40 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre created_at, con id como desempate.
+    No calcula el total ni usa OFFSET creciente: cualquier página cuesta lo
+    mismo que la primera.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    Paginación por número de página (por defecto) que cambia a
+    CreatedAtCursorPagination cuando el cliente envía ?pagination=cursor
+    o un ?cursor= obtenido de una respuesta anterior.
+    """
+    cursor_pagination_class = CreatedAtCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    @classmethod
+    def wants_cursor(cls, request):
+        params = request.query_params
+        return params.get('pagination') == 'cursor' or cls.cursor_pagination_class.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -63,6 +63,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceInstrumentationMiddleware',  # Server-Timing y /api/admin/perf/
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Para servir archivos estáticos
@@ -253,6 +254,63 @@ CSRF_FAILURE_VIEW = 'django.views.csrf.csrf_failure'
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 
+# Machine Learning
+# Cada cuántos segundos el registro de modelos revisa si cambió el MLModel activo
+ML_MODEL_REGISTRY_CHECK_SECONDS = config('ML_MODEL_REGISTRY_CHECK_SECONDS', default=30, cast=int)
+# Entrenamiento en segundo plano: 'process' (pool de procesos dentro de cada worker)
+# o 'db' (los trabajos quedan pendientes y los ejecuta `manage.py run_ml_training_jobs`)
+ML_TRAINING_BACKEND = config('ML_TRAINING_BACKEND', default='process')
+ML_TRAINING_MAX_WORKERS = config('ML_TRAINING_MAX_WORKERS', default=1, cast=int)
+# Segundos que un entrenamiento puede seguir 'pending' antes de que `run_ml_training_jobs`
+# lo tome aunque el backend sea 'process' (el worker que lo encoló pudo reiniciarse)
+ML_TRAINING_PENDING_GRACE_SECONDS = config('ML_TRAINING_PENDING_GRACE_SECONDS', default=600, cast=int)
+# Segundos que un entrenamiento puede seguir 'training' antes de marcarlo como fallido
+ML_TRAINING_TIMEOUT_SECONDS = config('ML_TRAINING_TIMEOUT_SECONDS', default=3600, cast=int)
+# Núcleos que puede usar un entrenamiento (n_jobs de scikit-learn y hilos BLAS)
+ML_TRAINING_N_JOBS = config('ML_TRAINING_N_JOBS', default=1, cast=int)
+
+# Órdenes
+# Números de orden/factura que cada proceso reserva por adelantado (1 = sin reserva)
+DOCUMENT_NUMBER_BLOCK_SIZE = config('DOCUMENT_NUMBER_BLOCK_SIZE', default=1, cast=int)
+# Minutos que una orden online mantiene su stock reservado sin confirmar el pago
+STOCK_RESERVATION_MINUTES = config('STOCK_RESERVATION_MINUTES', default=15, cast=int)
+
+# Permisos
+# Segundos que se cachean los permisos efectivos de cada usuario (la cache puede ser local;
+# la versión vigente se lee de PermissionVersion en cada solicitud)
+PERMISSION_CACHE_SECONDS = config('PERMISSION_CACHE_SECONDS', default=3600, cast=int)
+
+# Reportes
+# Filas máximas de un reporte generado por IA (las siguientes se descartan)
+REPORT_MAX_ROWS = config('REPORT_MAX_ROWS', default=100000, cast=int)
+# Filas que se leen por bloque del cursor del servidor
+REPORT_FETCH_CHUNK_SIZE = config('REPORT_FETCH_CHUNK_SIZE', default=2000, cast=int)
+# statement_timeout (ms) de las consultas de reportes en PostgreSQL
+REPORT_STATEMENT_TIMEOUT_MS = config('REPORT_STATEMENT_TIMEOUT_MS', default=30000, cast=int)
+# Filas máximas que se muestran en la tabla del PDF (del resto solo se informa el total)
+REPORT_PDF_MAX_ROWS = config('REPORT_PDF_MAX_ROWS', default=2000, cast=int)
+# Reportes asíncronos ("async": true): 'process' (pool de procesos dentro de cada worker)
+# o 'db' (los reportes quedan pendientes y los genera `manage.py run_report_jobs`)
+REPORT_JOBS_BACKEND = config('REPORT_JOBS_BACKEND', default='process')
+REPORT_JOBS_MAX_WORKERS = config('REPORT_JOBS_MAX_WORKERS', default=2, cast=int)
+# Segundos que un reporte puede seguir 'pending' antes de que `run_report_jobs` lo tome
+# aunque el backend sea 'process' (el worker que lo encoló pudo reiniciarse)
+REPORT_JOBS_PENDING_GRACE_SECONDS = config('REPORT_JOBS_PENDING_GRACE_SECONDS', default=300, cast=int)
+# Segundos que un reporte puede seguir 'running' antes de marcarlo como fallido
+REPORT_JOBS_TIMEOUT_SECONDS = config('REPORT_JOBS_TIMEOUT_SECONDS', default=1800, cast=int)
+
+# Dashboards
+# Antigüedad máxima (segundos) de una instantánea de KPIs antes de recalcularla al leerla
+# (las invalidadas se sirven hasta entonces; `refresh_dashboard_kpis --interval` las recalcula antes)
+KPI_SNAPSHOT_MAX_AGE_SECONDS = config('KPI_SNAPSHOT_MAX_AGE_SECONDS', default=300, cast=int)
+
+# Instrumentación de rendimiento (core.middleware.PerformanceInstrumentationMiddleware)
+PERF_INSTRUMENTATION_ENABLED = config('PERF_INSTRUMENTATION_ENABLED', default=True, cast=bool)
+# Fracción de solicitudes medidas (0.0 - 1.0)
+PERF_SAMPLE_RATE = config('PERF_SAMPLE_RATE', default=0.1, cast=float)
+# Solicitudes recientes por endpoint usadas para los percentiles
+PERF_WINDOW_SIZE = config('PERF_WINDOW_SIZE', default=500, cast=int)
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -28,6 +28,7 @@ urlpatterns = [
     path('api/cart/', include('cart.urls')),
     path('api/employees/', include('employees.urls')),
     path('api/admin/dashboard-stats/', api.admin_dashboard_stats),
+    path('api/admin/perf/', api.perf_stats_view, name='admin-perf'),
     path('api/reports/', include('reports.urls')),  # Nueva app de reportes
     path('api/permissions/', include('permissions.urls')),
     path('api/orders/', include('orders.urls')),
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     MLModel, Prediction, SalesForecast, ProductRecommendation,
-    CustomerSegment, InventoryAlert, MLTrainingLog
+    CustomerSegment, InventoryAlert, MLTrainingLog,
+    DailySalesRollup, DailyCategorySalesRollup
 )
 
 
@@ -65,6 +66,22 @@ class MLTrainingLogAdmin(admin.ModelAdmin):
     list_display = ['model_type', 'status', 'started_by', 'started_at', 'training_duration_seconds']
     list_filter = ['model_type', 'status', 'started_at']
     search_fields = ['model_type']
-    readonly_fields = ['id', 'started_at', 'completed_at']
+    readonly_fields = ['id', 'started_at', 'training_started_at', 'completed_at']
     ordering = ['-started_at']
 
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'num_orders', 'total_sales', 'total_quantity', 'avg_order_value', 'updated_at']
+    list_filter = ['date']
+    readonly_fields = ['id', 'updated_at']
+    ordering = ['-date']
+
+
+@admin.register(DailyCategorySalesRollup)
+class DailyCategorySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'category_id', 'num_orders', 'total_sales', 'total_quantity']
+    list_filter = ['date']
+    search_fields = ['category_id']
+    readonly_fields = ['id', 'updated_at']
+    ordering = ['-date']
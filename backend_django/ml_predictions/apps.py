@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MlPredictionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ml_predictions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,45 @@
+"""
+Reconstruye la tabla de ventas diarias usada por la predicción de ventas
+"""
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ml_predictions.services.sales_rollup import SalesRollupService
+
+
+class Command(BaseCommand):
+    help = 'Backfill de DailySalesRollup / DailyCategorySalesRollup desde las órdenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Recalcular solo los últimos N días',
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='Fecha inicial (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            help='Fecha final (YYYY-MM-DD), por defecto hoy',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            end_date = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        if options['days']:
+            end_date = end_date or timezone.localdate()
+            start_date = end_date - timedelta(days=options['days'] - 1)
+        elif start_date and not end_date:
+            end_date = timezone.localdate()
+
+        self.stdout.write(self.style.WARNING('📊 Agregando ventas diarias...'))
+        days_with_sales = SalesRollupService().backfill(start_date=start_date, end_date=end_date)
+        self.stdout.write(self.style.SUCCESS(f'✅ {days_with_sales} días con ventas agregados'))
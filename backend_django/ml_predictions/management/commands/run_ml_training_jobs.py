@@ -0,0 +1,54 @@
+"""
+Ejecuta los entrenamientos ML pendientes (backend ML_TRAINING_BACKEND='db')
+
+Con el backend 'process' también conviene correrlo: retoma los pendientes que
+ningún worker web empezó y marca como fallidos los que quedaron colgados.
+"""
+import time
+from django.core.management.base import BaseCommand
+from ml_predictions.services.training_jobs import training_job_runner, run_training_job
+
+
+class Command(BaseCommand):
+    help = 'Procesa los MLTrainingLog pendientes fuera de los workers web'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar los trabajos pendientes y terminar',
+        )
+        parser.add_argument(
+            '--poll-seconds',
+            type=int,
+            default=10,
+            help='Segundos de espera entre consultas cuando no hay trabajos',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('🤖 Esperando entrenamientos pendientes...'))
+
+        while True:
+            reaped = training_job_runner.reap_stale_jobs()
+            if reaped:
+                self.stdout.write(self.style.WARNING(f'⚠️  {reaped} entrenamientos colgados marcados como fallidos'))
+
+            training_log = training_job_runner.claim_next_job()
+
+            if training_log is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_seconds'])
+                continue
+
+            self.stdout.write(f'⏳ Entrenando {training_log.model_type} ({training_log.id})')
+            training_log = run_training_job(training_log.id)
+
+            if training_log.status == 'completed':
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ {training_log.model_type} completado en {training_log.training_duration_seconds}s'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'❌ {training_log.model_type} falló: {training_log.error_message}'
+                ))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:31
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_predictions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField(unique=True)),
+                ('num_orders', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('avg_order_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySalesRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('category_id', models.UUIDField()),
+                ('num_orders', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Category Sales Rollup',
+                'verbose_name_plural': 'Daily Category Sales Rollups',
+                'ordering': ['date'],
+                'unique_together': {('date', 'category_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_predictions', '0002_dailysalesrollup_dailycategorysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mltraininglog',
+            name='parameters',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='mltraininglog',
+            name='progress',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_predictions', '0003_mltraininglog_parameters_mltraininglog_progress'),
+    ]
+
+    # Los ids de authentication.User son enteros: no existe conversión
+    # uuid -> bigint, por lo que la columna se recrea
+    operations = [
+        migrations.RemoveField(
+            model_name='customersegment',
+            name='customer_id',
+        ),
+        migrations.AddField(
+            model_name='customersegment',
+            name='customer_id',
+            field=models.BigIntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+    ]
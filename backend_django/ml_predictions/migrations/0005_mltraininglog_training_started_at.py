@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_predictions', '0004_customersegment_customer_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mltraininglog',
+            name='training_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
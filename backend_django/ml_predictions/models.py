@@ -124,7 +124,7 @@ class CustomerSegment(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     prediction = models.ForeignKey(Prediction, on_delete=models.CASCADE, related_name='customer_segments')
-    customer_id = models.UUIDField()
+    customer_id = models.BigIntegerField(db_index=True)  # id de authentication.User
     segment_type = models.CharField(max_length=20, choices=SEGMENT_TYPES)
     confidence_score = models.FloatField()
     characteristics = models.JSONField(default=dict)  # Características del segmento
@@ -190,6 +190,8 @@ class MLTrainingLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     model_type = models.CharField(max_length=50)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.IntegerField(default=0)  # 0-100
+    parameters = models.JSONField(default=dict, blank=True)  # Parámetros del entrenamiento solicitado
     data_from = models.DateField(null=True, blank=True)
     data_to = models.DateField(null=True, blank=True)
     records_processed = models.IntegerField(default=0)
@@ -197,7 +199,8 @@ class MLTrainingLog(models.Model):
     metrics = models.JSONField(default=dict, blank=True)
     error_message = models.TextField(blank=True, null=True)
     started_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    started_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(auto_now_add=True)  # Fecha de la solicitud
+    training_started_at = models.DateTimeField(null=True, blank=True)  # Cuando un ejecutor lo tomó
     completed_at = models.DateTimeField(null=True, blank=True)
     model_saved = models.ForeignKey(MLModel, on_delete=models.SET_NULL, null=True, blank=True, related_name='training_logs')
     
@@ -208,3 +211,47 @@ class MLTrainingLog(models.Model):
     
     def __str__(self):
         return f"{self.model_type} - {self.status} - {self.started_at}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Ventas diarias agregadas (órdenes entregadas/completadas)
+    Se mantiene incrementalmente desde las señales de Order (ver ml_predictions.signals)
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    date = models.DateField(unique=True)
+    num_orders = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_quantity = models.IntegerField(default=0)  # Unidades vendidas
+    avg_order_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Daily Sales Rollup'
+        verbose_name_plural = 'Daily Sales Rollups'
+    
+    def __str__(self):
+        return f"{self.date}: ${self.total_sales} ({self.num_orders} órdenes)"
+
+
+class DailyCategorySalesRollup(models.Model):
+    """
+    Ventas diarias agregadas por categoría de producto
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    date = models.DateField()
+    category_id = models.UUIDField()
+    num_orders = models.IntegerField(default=0)  # Órdenes con al menos un item de la categoría
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Suma de items
+    total_quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['date']
+        unique_together = ('date', 'category_id')
+        verbose_name = 'Daily Category Sales Rollup'
+        verbose_name_plural = 'Daily Category Sales Rollups'
+    
+    def __str__(self):
+        return f"{self.date} - Category {self.category_id}: ${self.total_sales}"
@@ -67,7 +67,7 @@ class MLTrainingLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = MLTrainingLog
         fields = '__all__'
-        read_only_fields = ['id', 'started_at', 'completed_at']
+        read_only_fields = ['id', 'started_at', 'training_started_at', 'completed_at']
     
     def get_duration_display(self, obj):
         if obj.training_duration_seconds:
@@ -5,10 +5,18 @@ from .sales_forecast import SalesForecastService
 from .product_recommendation import ProductRecommendationService
 from .customer_segmentation import CustomerSegmentationService
 from .inventory_optimization import InventoryOptimizationService
+from .sales_rollup import SalesRollupService
+from .model_registry import ModelRegistry, model_registry
+from .training_jobs import TrainingJobRunner, training_job_runner
 
 __all__ = [
     'SalesForecastService',
     'ProductRecommendationService',
     'CustomerSegmentationService',
     'InventoryOptimizationService',
+    'SalesRollupService',
+    'ModelRegistry',
+    'model_registry',
+    'TrainingJobRunner',
+    'training_job_runner',
 ]
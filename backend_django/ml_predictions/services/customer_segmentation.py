@@ -9,8 +9,10 @@ from sklearn.decomposition import PCA
 from datetime import datetime, timedelta
 import joblib
 import os
+import time
 from django.conf import settings
-from django.db.models import Sum, Count, Avg, F, Max
+from django.db import transaction
+from django.db.models import Sum, Count, Avg, F, Max, Q
 from django.contrib.auth import get_user_model
 from orders.models import Order
 import logging
@@ -25,6 +27,22 @@ class CustomerSegmentationService:
     Segmenta clientes en: VIP, Frecuente, Ocasional, En Riesgo, Nuevo, Inactivo
     """
     
+    # Estados de orden que cuentan como compra
+    SALE_STATUSES = ['delivered', 'completed']
+    
+    # Columnas usadas por el modelo (en orden)
+    FEATURE_COLUMNS = [
+        'recency', 'frequency', 'monetary', 'avg_order_value',
+        'days_since_registration', 'purchase_frequency_monthly'
+    ]
+    
+    # Filas leídas por lote al calcular features / guardar segmentos
+    FEATURES_CHUNK_SIZE = 5000
+    BULK_BATCH_SIZE = 2000
+    
+    # Confianza asignada a cada segmento (placeholder)
+    DEFAULT_CONFIDENCE = 0.85
+    
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
@@ -35,61 +53,15 @@ class CustomerSegmentationService:
         Prepara features de clientes para clustering (RFM + adicionales)
         """
         try:
-            from django.utils import timezone
-            
-            # Obtener clientes con al menos una compra
-            customers = User.objects.filter(
-                role='customer',
-                orders__status__in=['delivered', 'completed']
-            ).annotate(
-                total_orders=Count('orders'),
-                total_spent=Sum('orders__total_amount'),
-                avg_order_value=Avg('orders__total_amount'),
-                last_order_date=Max('orders__created_at')
-            ).filter(total_orders__gt=0)
-            
-            if customers.count() < 5:
+            # Clientes con al menos una compra
+            customers = User.objects.filter(role='customer')
+            df = self._build_customer_frame(customers, only_buyers=True)
+            
+            if len(df) < 5:
                 logger.warning("Muy pocos clientes para segmentación")
-                return None
-            
-            features_list = []
-            customer_ids = []
-            
-            today = timezone.now()
-            
-            for customer in customers:
-                # Calcular Recency (días desde última compra)
-                recency = (today - customer.last_order_date).days if customer.last_order_date else 999
-                
-                # Calcular Frequency (número de compras)
-                frequency = customer.total_orders
-                
-                # Calcular Monetary (total gastado)
-                monetary = float(customer.total_spent or 0)
-                
-                # Features adicionales
-                avg_order = float(customer.avg_order_value or 0)
-                
-                # Días desde registro
-                days_since_registration = (today - customer.date_joined).days if customer.date_joined else 0
-                
-                # Purchase frequency (compras por mes activo)
-                months_active = max(1, days_since_registration / 30)
-                purchase_frequency = frequency / months_active
-                
-                features = {
-                    'recency': recency,
-                    'frequency': frequency,
-                    'monetary': monetary,
-                    'avg_order_value': avg_order,
-                    'days_since_registration': days_since_registration,
-                    'purchase_frequency_monthly': purchase_frequency
-                }
-                
-                features_list.append(features)
-                customer_ids.append(str(customer.id))
+                return None, None
             
-            df = pd.DataFrame(features_list)
+            customer_ids = df.pop('customer_id').tolist()
             
             logger.info(f"Features preparados para {len(df)} clientes")
             
@@ -99,6 +71,52 @@ class CustomerSegmentationService:
             logger.error(f"Error preparando features de clientes: {str(e)}")
             return None, None
     
+    def _build_customer_frame(self, customers, only_buyers=False):
+        """
+        Calcula RFM + antigüedad de los clientes en una sola consulta agregada
+        y lo carga directamente en un DataFrame columnar
+        """
+        from django.utils import timezone
+        
+        sales = Q(orders__status__in=self.SALE_STATUSES)
+        customers = customers.annotate(
+            total_orders=Count('orders', filter=sales),
+            total_spent=Sum('orders__total_amount', filter=sales),
+            avg_order=Avg('orders__total_amount', filter=sales),
+            last_order_date=Max('orders__created_at', filter=sales)
+        )
+        if only_buyers:
+            customers = customers.filter(total_orders__gt=0)
+        
+        rows = customers.values_list(
+            'id', 'date_joined', 'total_orders', 'total_spent', 'avg_order', 'last_order_date'
+        ).order_by().iterator(chunk_size=self.FEATURES_CHUNK_SIZE)
+        
+        raw = pd.DataFrame.from_records(
+            rows,
+            columns=['customer_id', 'date_joined', 'total_orders', 'total_spent', 'avg_order', 'last_order_date']
+        )
+        
+        today = pd.Timestamp(timezone.now())
+        last_order_date = pd.to_datetime(raw['last_order_date'], utc=True)
+        date_joined = pd.to_datetime(raw['date_joined'], utc=True)
+        
+        df = pd.DataFrame({'customer_id': raw['customer_id'].astype(str)})
+        # Recency: días desde la última compra
+        df['recency'] = (today - last_order_date).dt.days.fillna(999).astype(int)
+        # Frequency: número de compras
+        df['frequency'] = raw['total_orders'].fillna(0).astype(int)
+        # Monetary: total gastado
+        df['monetary'] = pd.to_numeric(raw['total_spent'], errors='coerce').fillna(0).astype(float)
+        df['avg_order_value'] = pd.to_numeric(raw['avg_order'], errors='coerce').fillna(0).astype(float)
+        # Días desde registro
+        df['days_since_registration'] = (today - date_joined).dt.days.fillna(0).astype(int)
+        # Purchase frequency (compras por mes activo)
+        months_active = np.maximum(1, df['days_since_registration'] / 30)
+        df['purchase_frequency_monthly'] = df['frequency'] / months_active
+        
+        return df
+    
     def train_model(self, n_clusters=6):
         """
         Entrena el modelo de segmentación con K-Means
@@ -236,26 +254,20 @@ class CustomerSegmentationService:
                 raise ValueError("No hay modelo entrenado")
             
             # Obtener features del cliente
-            customer = User.objects.filter(id=customer_id).annotate(
-                total_orders=Count('orders', filter=Q(orders__status__in=['delivered', 'completed'])),
-                total_spent=Sum('orders__total_amount', filter=Q(orders__status__in=['delivered', 'completed'])),
-                avg_order_value=Avg('orders__total_amount', filter=Q(orders__status__in=['delivered', 'completed'])),
-                last_order_date=Max('orders__created_at', filter=Q(orders__status__in=['delivered', 'completed']))
-            ).first()
-            
-            if not customer:
+            df = self._build_customer_frame(User.objects.filter(id=customer_id))
+            
+            if df.empty:
                 raise ValueError(f"Cliente {customer_id} no encontrado")
             
-            today = datetime.now()
-            recency = (today - customer.last_order_date).days if customer.last_order_date else 999
-            frequency = customer.total_orders or 0
-            monetary = float(customer.total_spent or 0)
-            avg_order = float(customer.avg_order_value or 0)
-            days_since_reg = (today - customer.date_joined).days if customer.date_joined else 0
-            months_active = max(1, days_since_reg / 30)
-            purchase_freq = frequency / months_active
+            customer = df.iloc[0]
+            recency = int(customer['recency'])
+            frequency = int(customer['frequency'])
+            monetary = float(customer['monetary'])
+            avg_order = float(customer['avg_order_value'])
+            days_since_reg = int(customer['days_since_registration'])
+            purchase_freq = float(customer['purchase_frequency_monthly'])
             
-            features = [[recency, frequency, monetary, avg_order, days_since_reg, purchase_freq]]
+            features = df[self.FEATURE_COLUMNS]
             
             # Escalar y predecir
             X_scaled = self.scaler.transform(features)
@@ -300,18 +312,27 @@ class CustomerSegmentationService:
         """
         Determina el tipo de segmento basado en RFM
         """
-        if monetary > 1000 and frequency > 5 and recency < 30:
-            return 'vip'
-        elif frequency > 3 and recency < 60:
-            return 'frequent'
-        elif frequency <= 2 and recency < 90:
-            return 'occasional'
-        elif recency > 180:
-            return 'inactive'
-        elif frequency <= 2 and recency > 60 and recency < 180:
-            return 'at_risk'
-        else:
-            return 'new'
+        return str(self._determine_segment_types(recency, frequency, monetary)[0])
+    
+    @staticmethod
+    def _determine_segment_types(recency, frequency, monetary):
+        """
+        Versión vectorizada: tipo de segmento para arrays de recency/frequency/monetary
+        """
+        recency = np.atleast_1d(np.asarray(recency, dtype=float))
+        frequency = np.atleast_1d(np.asarray(frequency, dtype=float))
+        monetary = np.atleast_1d(np.asarray(monetary, dtype=float))
+        
+        # Mismo orden de prioridad que las reglas originales
+        conditions = [
+            (monetary > 1000) & (frequency > 5) & (recency < 30),
+            (frequency > 3) & (recency < 60),
+            (frequency <= 2) & (recency < 90),
+            recency > 180,
+            (frequency <= 2) & (recency > 60) & (recency < 180),
+        ]
+        choices = ['vip', 'frequent', 'occasional', 'inactive', 'at_risk']
+        return np.select(conditions, choices, default='new')
     
     def _generate_recommendations(self, segment_type, recency, frequency, monetary):
         """
@@ -362,20 +383,31 @@ class CustomerSegmentationService:
         """
         Estima el Customer Lifetime Value
         """
-        if frequency == 0 or days_active == 0:
-            return 0.0
+        return float(self._estimate_lifetime_values(frequency, monetary, days_active)[0])
+    
+    @staticmethod
+    def _estimate_lifetime_values(frequency, monetary, days_active):
+        """
+        Versión vectorizada del Customer Lifetime Value
+        """
+        frequency = np.atleast_1d(np.asarray(frequency, dtype=float))
+        monetary = np.atleast_1d(np.asarray(monetary, dtype=float))
+        days_active = np.atleast_1d(np.asarray(days_active, dtype=float))
         
         # CLV simple = (Average Order Value) × (Purchase Frequency) × (Customer Lifespan)
-        avg_order = monetary / frequency if frequency > 0 else 0
-        purchases_per_month = frequency / (days_active / 30) if days_active > 0 else 0
+        valid = (frequency > 0) & (days_active > 0)
+        safe_frequency = np.where(valid, frequency, 1)
+        safe_days = np.where(valid, days_active, 30)
+        avg_order = monetary / safe_frequency
+        purchases_per_month = frequency / (safe_days / 30)
         estimated_lifespan_months = 24  # Asumir 2 años
         
-        clv = avg_order * purchases_per_month * estimated_lifespan_months
-        return float(clv)
+        return np.where(valid, avg_order * purchases_per_month * estimated_lifespan_months, 0.0)
     
-    def segment_all_customers(self):
+    def segment_all_customers(self, save=False, requested_by=None):
         """
-        Segmenta todos los clientes activos
+        Segmenta todos los clientes activos. Con save=True guarda los
+        resultados en CustomerSegment, reemplazando los de la ejecución anterior
         """
         try:
             if self.model is None:
@@ -384,35 +416,52 @@ class CustomerSegmentationService:
             if self.model is None:
                 raise ValueError("No hay modelo entrenado")
             
+            start_time = time.time()
+            
             df, customer_ids = self.prepare_customer_features()
             
             if df is None:
                 raise ValueError("No se pudieron preparar features")
             
-            X_scaled = self.scaler.transform(df)
+            X_scaled = self.scaler.transform(df[self.FEATURE_COLUMNS])
             clusters = self.model.predict(X_scaled)
             
-            results = []
-            for i, customer_id in enumerate(customer_ids):
-                segment_type = self._determine_segment_type(
-                    df.iloc[i]['recency'],
-                    df.iloc[i]['frequency'],
-                    df.iloc[i]['monetary']
-                )
-                
-                results.append({
+            segment_types = self._determine_segment_types(df['recency'], df['frequency'], df['monetary'])
+            lifetime_values = self._estimate_lifetime_values(
+                df['frequency'], df['monetary'], df['days_since_registration']
+            )
+            
+            characteristics = df[self.FEATURE_COLUMNS].to_dict('records')
+            results = [
+                {
                     'customer_id': customer_id,
-                    'cluster': int(clusters[i]),
-                    'segment_type': segment_type,
-                    'characteristics': df.iloc[i].to_dict()
-                })
+                    'cluster': int(cluster),
+                    'segment_type': str(segment_type),
+                    'characteristics': features
+                }
+                for customer_id, cluster, segment_type, features in zip(
+                    customer_ids, clusters, segment_types, characteristics
+                )
+            ]
             
-            return {
+            unique_types, type_counts = np.unique(segment_types, return_counts=True)
+            summary = {str(k): int(v) for k, v in zip(unique_types, type_counts)}
+            
+            result = {
                 'success': True,
                 'total_customers': len(results),
+                'summary': summary,
                 'segments': results
             }
             
+            if save:
+                result['prediction_id'] = self._save_segments(
+                    results, lifetime_values, summary, requested_by,
+                    execution_time_ms=int((time.time() - start_time) * 1000)
+                )
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Error segmentando todos los clientes: {str(e)}")
             return {
@@ -420,6 +469,62 @@ class CustomerSegmentationService:
                 'error': str(e)
             }
     
+    def _save_segments(self, results, lifetime_values, summary, requested_by=None, execution_time_ms=0):
+        """
+        Registra la predicción y guarda los segmentos con bulk_create. Los
+        segmentos de ejecuciones anteriores se borran en la misma transacción
+        (su resumen queda en el prediction_result de cada Prediction)
+        """
+        from ..models import MLModel, Prediction, CustomerSegment
+        
+        ml_model = MLModel.objects.filter(
+            model_type='customer_segmentation',
+            is_active=True
+        ).order_by('-trained_at').first()
+        
+        if ml_model is None:
+            raise ValueError("No hay un MLModel activo de segmentación para registrar los resultados")
+        
+        recommendations = {
+            segment_type: self._generate_recommendations(segment_type, None, None, None)
+            for segment_type in summary
+        }
+        
+        with transaction.atomic():
+            prediction = Prediction.objects.create(
+                model=ml_model,
+                input_data={'segment_all_customers': True},
+                prediction_result={'total_customers': len(results), 'summary': summary},
+                confidence_score=self.DEFAULT_CONFIDENCE,
+                requested_by=requested_by,
+                execution_time_ms=execution_time_ms
+            )
+            
+            # Solo la última segmentación queda vigente: los conteos por
+            # segmento (dashboard) no acumulan ejecuciones
+            CustomerSegment.objects.all().delete()
+            
+            # Lotes acotados para no materializar todos los objetos a la vez
+            for start in range(0, len(results), self.BULK_BATCH_SIZE):
+                CustomerSegment.objects.bulk_create([
+                    CustomerSegment(
+                        prediction=prediction,
+                        customer_id=row['customer_id'],
+                        segment_type=row['segment_type'],
+                        confidence_score=self.DEFAULT_CONFIDENCE,
+                        characteristics={**row['characteristics'], 'cluster': row['cluster']},
+                        recommendations=recommendations[row['segment_type']],
+                        lifetime_value_prediction=round(float(ltv), 2)
+                    )
+                    for row, ltv in zip(
+                        results[start:start + self.BULK_BATCH_SIZE],
+                        lifetime_values[start:start + self.BULK_BATCH_SIZE]
+                    )
+                ])
+        
+        logger.info(f"{len(results)} segmentos de clientes guardados (predicción {prediction.id})")
+        return str(prediction.id)
+    
     def save_model(self):
         """
         Guarda el modelo y el scaler
@@ -455,5 +560,3 @@ class CustomerSegmentationService:
             logger.error(f"Error cargando modelo: {str(e)}")
             return False
 
-
-from django.db.models import Q
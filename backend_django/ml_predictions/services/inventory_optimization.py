@@ -4,8 +4,8 @@ Servicio de optimización de inventario usando ML
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from django.db.models import Sum, Count, Avg, F, Q
-from products.models import Product, ProductVariant
+from django.db.models import Sum, Count, Avg, Max, F, Q
+from products.models import Product
 from orders.models import OrderItem
 import logging
 
@@ -21,27 +21,159 @@ class InventoryOptimizationService:
     - Sugiere niveles óptimos de stock
     """
     
+    # Estado de los pedidos que cuentan como venta
+    SALE_STATUSES = ['delivered', 'completed']
+    
+    # Reglas de alerta en orden de prioridad: (alert_type, urgency_level)
+    ALERT_RULES = [
+        ('reorder_now', 5),
+        ('low_stock', 4),
+        ('slow_moving', 2),
+        ('overstock', 3),
+        ('high_demand', 4),
+    ]
+    
+    def _build_inventory_frame(self, demand_days=(7, 30), include_last_sale=False):
+        """
+        Construye un DataFrame con una fila por producto activo (stock,
+        demanda por ventana de días, categoría y opcionalmente la fecha de la
+        última venta) usando unas pocas consultas agrupadas, sin importar el
+        tamaño del catálogo
+        """
+        from django.utils import timezone
+        
+        now = timezone.now()
+        
+        # 1. Productos activos con su categoría y stock total (contador de Product)
+        products = pd.DataFrame.from_records(
+            Product.objects.filter(status='active').values('id', 'name', 'price', 'category__name', 'total_stock'),
+            columns=['id', 'name', 'price', 'category__name', 'total_stock']
+        ).rename(columns={'category__name': 'category', 'total_stock': 'current_stock'}).set_index('id')
+        
+        if products.empty:
+            return products
+        
+        products['price'] = products['price'].astype(float)
+        products['current_stock'] = products['current_stock'].astype(int)
+        
+        # 2. Demanda por ventana, en una sola consulta con agregados filtrados
+        windows = {days: now - timedelta(days=days) for days in demand_days}
+        demand = OrderItem.objects.filter(
+            product__status='active',
+            order__status__in=self.SALE_STATUSES,
+            order__created_at__gte=min(windows.values())
+        ).order_by().values('product_id').annotate(**{
+            f'demand_{days}d': Sum('quantity', filter=Q(order__created_at__gte=since))
+            for days, since in windows.items()
+        })
+        demand = pd.DataFrame.from_records(
+            demand, columns=['product_id'] + [f'demand_{days}d' for days in demand_days]
+        ).set_index('product_id')
+        for days in demand_days:
+            column = f'demand_{days}d'
+            products[column] = demand[column].astype('float64').reindex(products.index).fillna(0).astype(int)
+        
+        # 3. Última venta registrada (cualquier estado)
+        if include_last_sale:
+            last_sales = OrderItem.objects.filter(
+                product__status='active'
+            ).order_by().values('product_id').annotate(last_sale_at=Max('order__created_at'))
+            products['last_sale_at'] = pd.Series(
+                {row['product_id']: row['last_sale_at'] for row in last_sales}, dtype='object'
+            ).reindex(products.index)
+        
+        return products
+    
+    def _apply_alert_rules(self, df):
+        """
+        Calcula de forma vectorizada las métricas y la alerta de cada producto
+        """
+        stock = df['current_stock'].to_numpy(dtype=float)
+        demand_30d = df['demand_30d'].to_numpy(dtype=float)
+        demand_7d = df['demand_7d'].to_numpy(dtype=float)
+        
+        # Calcular tasa de venta diaria
+        daily_sales_rate = demand_30d / 30
+        
+        # Predecir días hasta agotamiento
+        days_until_stockout = np.divide(
+            stock, daily_sales_rate, out=np.full(len(df), 999.0), where=daily_sales_rate > 0
+        )
+        
+        # Calcular stock recomendado (30 días de demanda + buffer 20%)
+        recommended_stock = np.where(
+            demand_30d > 0,
+            np.trunc(daily_sales_rate * 30 * 1.2),
+            np.maximum(5, stock)
+        ).astype(int)
+        
+        # Calcular tasa de rotación
+        rotation_rate = np.divide(demand_30d, stock, out=np.zeros(len(df)), where=stock > 0)
+        
+        # Determinar tipo de alerta (la primera regla que se cumple)
+        conditions = [
+            (days_until_stockout < 7) & (stock > 0),
+            days_until_stockout < 14,
+            (rotation_rate < 0.1) & (stock > 10),
+            stock > recommended_stock * 2,
+            # Demanda reciente 50% mayor que promedio
+            demand_7d > daily_sales_rate * 7 * 1.5,
+        ]
+        alert_types = [rule[0] for rule in self.ALERT_RULES]
+        urgency_levels = [rule[1] for rule in self.ALERT_RULES]
+        
+        df = df.copy()
+        df['daily_sales_rate'] = daily_sales_rate
+        df['days_until_stockout'] = days_until_stockout
+        df['recommended_stock'] = recommended_stock
+        df['rotation_rate'] = rotation_rate
+        df['alert_type'] = np.select(conditions, alert_types, default='')
+        df['urgency_level'] = np.select(conditions, urgency_levels, default=0)
+        return df
+    
+    def _serialize_alerts(self, df):
+        """
+        Convierte las filas con alerta al formato de respuesta, ordenadas por urgencia
+        """
+        alerts_df = df[df['alert_type'] != ''].sort_values('urgency_level', ascending=False, kind='stable')
+        today = datetime.now().date()
+        
+        alerts = []
+        for product_id, row in alerts_df.iterrows():
+            days_until_stockout = row['days_until_stockout']
+            has_stockout = days_until_stockout < 999
+            alerts.append({
+                'product_id': str(product_id),
+                'product_name': row['name'],
+                'alert_type': row['alert_type'],
+                'current_stock': int(row['current_stock']),
+                'recommended_stock': int(row['recommended_stock']),
+                'predicted_demand_7days': int(row['demand_7d']),
+                'predicted_demand_30days': int(row['demand_30d']),
+                'daily_sales_rate': round(float(row['daily_sales_rate']), 2),
+                'days_until_stockout': int(days_until_stockout) if has_stockout else None,
+                'estimated_stockout_date': (
+                    (today + timedelta(days=int(days_until_stockout))).isoformat() if has_stockout else None
+                ),
+                'urgency_level': int(row['urgency_level']),
+                'rotation_rate': round(float(row['rotation_rate']), 3),
+                'price': float(row['price']),
+                'category': row['category'] if isinstance(row['category'], str) else None
+            })
+        return alerts
+    
     def analyze_inventory(self):
         """
         Analiza el inventario completo y genera alertas
         """
         try:
-            alerts = []
+            df = self._build_inventory_frame()
             
-            # Obtener todos los productos activos
-            products = Product.objects.filter(status='active')
-            
-            for product in products:
-                alert = self._analyze_product_inventory(product)
-                if alert:
-                    alerts.append(alert)
-            
-            # Ordenar por urgencia
-            alerts.sort(key=lambda x: x['urgency_level'], reverse=True)
+            alerts = self._serialize_alerts(self._apply_alert_rules(df)) if not df.empty else []
             
             return {
                 'success': True,
-                'total_products_analyzed': products.count(),
+                'total_products_analyzed': len(df),
                 'alerts': alerts,
                 'summary': self._generate_summary(alerts)
             }
@@ -53,96 +185,6 @@ class InventoryOptimizationService:
                 'error': str(e)
             }
     
-    def _analyze_product_inventory(self, product):
-        """
-        Analiza un producto individual
-        """
-        try:
-            # Obtener stock total de todas las variantes
-            current_stock = product.total_stock
-            
-            # Calcular demanda histórica (últimos 30 y 7 días)
-            demand_30d = self._calculate_demand(product.id, days=30)
-            demand_7d = self._calculate_demand(product.id, days=7)
-            
-            # Calcular tasa de venta diaria
-            daily_sales_rate = demand_30d / 30 if demand_30d > 0 else 0
-            
-            # Predecir días hasta agotamiento
-            days_until_stockout = (current_stock / daily_sales_rate) if daily_sales_rate > 0 else 999
-            
-            # Calcular stock recomendado (30 días de demanda + buffer 20%)
-            recommended_stock = int((demand_30d / 30) * 30 * 1.2) if demand_30d > 0 else max(5, current_stock)
-            
-            # Calcular tasa de rotación
-            rotation_rate = (demand_30d / current_stock) if current_stock > 0 else 0
-            
-            # Determinar tipo de alerta
-            alert_type = None
-            urgency_level = 0
-            
-            if days_until_stockout < 7 and current_stock > 0:
-                alert_type = 'reorder_now'
-                urgency_level = 5
-            elif days_until_stockout < 14:
-                alert_type = 'low_stock'
-                urgency_level = 4
-            elif rotation_rate < 0.1 and current_stock > 10:
-                alert_type = 'slow_moving'
-                urgency_level = 2
-            elif current_stock > recommended_stock * 2:
-                alert_type = 'overstock'
-                urgency_level = 3
-            elif demand_7d > demand_30d / 30 * 7 * 1.5:
-                # Demanda reciente 50% mayor que promedio
-                alert_type = 'high_demand'
-                urgency_level = 4
-            
-            if alert_type:
-                estimated_stockout_date = datetime.now().date() + timedelta(days=int(days_until_stockout))
-                
-                return {
-                    'product_id': str(product.id),
-                    'product_name': product.name,
-                    'alert_type': alert_type,
-                    'current_stock': current_stock,
-                    'recommended_stock': recommended_stock,
-                    'predicted_demand_7days': int(demand_7d),
-                    'predicted_demand_30days': int(demand_30d),
-                    'daily_sales_rate': round(daily_sales_rate, 2),
-                    'days_until_stockout': int(days_until_stockout) if days_until_stockout < 999 else None,
-                    'estimated_stockout_date': estimated_stockout_date.isoformat() if days_until_stockout < 999 else None,
-                    'urgency_level': urgency_level,
-                    'rotation_rate': round(rotation_rate, 3),
-                    'price': float(product.price),
-                    'category': product.category.name if product.category else None
-                }
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error analizando producto {product.id}: {str(e)}")
-            return None
-    
-    def _calculate_demand(self, product_id, days=30):
-        """
-        Calcula la demanda histórica de un producto
-        """
-        try:
-            start_date = datetime.now() - timedelta(days=days)
-            
-            demand = OrderItem.objects.filter(
-                product_id=product_id,
-                order__status__in=['delivered', 'completed'],
-                order__created_at__gte=start_date
-            ).aggregate(total_quantity=Sum('quantity'))['total_quantity']
-            
-            return demand or 0
-            
-        except Exception as e:
-            logger.error(f"Error calculando demanda: {str(e)}")
-            return 0
-    
     def _generate_summary(self, alerts):
         """
         Genera resumen de las alertas
@@ -174,55 +216,63 @@ class InventoryOptimizationService:
         Obtiene recomendaciones específicas de reorden
         """
         try:
-            recommendations = []
+            df = self._build_inventory_frame(demand_days=(30,))
             
-            products = Product.objects.filter(status='active')
+            if df.empty:
+                return {
+                    'success': True,
+                    'recommendations': [],
+                    'total_recommendations': 0,
+                    'estimated_total_cost': 0
+                }
             
-            for product in products:
-                current_stock = product.total_stock
-                demand_30d = self._calculate_demand(product.id, days=30)
-                
-                # Lead time (días que toma reabastecer) - por ahora fijo
-                lead_time_days = 7
-                
-                # Safety stock (stock de seguridad)
-                daily_demand = demand_30d / 30 if demand_30d > 0 else 0
-                safety_stock = daily_demand * lead_time_days * 0.5  # 50% extra
-                
-                # Reorder point
-                reorder_point = (daily_demand * lead_time_days) + safety_stock
-                
-                # Economic Order Quantity (EOQ) - simplificado
-                # EOQ = sqrt((2 * D * S) / H)
-                # D = demanda anual, S = costo de orden, H = costo de mantenimiento
-                annual_demand = demand_30d * 12
-                order_cost = 50  # Costo fijo por orden
-                holding_cost_rate = 0.2  # 20% del precio
-                holding_cost = float(product.price) * holding_cost_rate
-                
-                if holding_cost > 0 and annual_demand > 0:
-                    eoq = np.sqrt((2 * annual_demand * order_cost) / holding_cost)
-                else:
-                    eoq = daily_demand * 30  # 1 mes de inventario
-                
-                # Determinar si se debe reordenar
-                should_reorder = current_stock <= reorder_point
-                
-                if should_reorder:
-                    recommended_quantity = max(int(eoq), int(reorder_point - current_stock))
-                    
-                    recommendations.append({
-                        'product_id': str(product.id),
-                        'product_name': product.name,
-                        'current_stock': current_stock,
-                        'reorder_point': int(reorder_point),
-                        'recommended_order_quantity': recommended_quantity,
-                        'safety_stock': int(safety_stock),
-                        'daily_demand': round(daily_demand, 2),
-                        'lead_time_days': lead_time_days,
-                        'estimated_cost': recommended_quantity * float(product.price) * 0.6,  # 60% costo
-                        'priority': 'high' if current_stock < safety_stock else 'medium'
-                    })
+            stock = df['current_stock'].to_numpy(dtype=float)
+            demand_30d = df['demand_30d'].to_numpy(dtype=float)
+            price = df['price'].to_numpy(dtype=float)
+            
+            # Lead time (días que toma reabastecer) - por ahora fijo
+            lead_time_days = 7
+            
+            # Safety stock (stock de seguridad)
+            daily_demand = demand_30d / 30
+            safety_stock = daily_demand * lead_time_days * 0.5  # 50% extra
+            
+            # Reorder point
+            reorder_point = (daily_demand * lead_time_days) + safety_stock
+            
+            # Economic Order Quantity (EOQ) - simplificado
+            # EOQ = sqrt((2 * D * S) / H)
+            # D = demanda anual, S = costo de orden, H = costo de mantenimiento
+            annual_demand = demand_30d * 12
+            order_cost = 50  # Costo fijo por orden
+            holding_cost_rate = 0.2  # 20% del precio
+            holding_cost = price * holding_cost_rate
+            
+            has_eoq = (holding_cost > 0) & (annual_demand > 0)
+            eoq = np.where(
+                has_eoq,
+                np.sqrt(np.divide(2 * annual_demand * order_cost, holding_cost, out=np.zeros(len(df)), where=has_eoq)),
+                daily_demand * 30  # 1 mes de inventario
+            )
+            
+            # Determinar si se debe reordenar
+            should_reorder = stock <= reorder_point
+            recommended_quantity = np.maximum(np.trunc(eoq), np.trunc(reorder_point - stock)).astype(int)
+            
+            recommendations = []
+            for i in np.flatnonzero(should_reorder):
+                recommendations.append({
+                    'product_id': str(df.index[i]),
+                    'product_name': df['name'].iat[i],
+                    'current_stock': int(stock[i]),
+                    'reorder_point': int(reorder_point[i]),
+                    'recommended_order_quantity': int(recommended_quantity[i]),
+                    'safety_stock': int(safety_stock[i]),
+                    'daily_demand': round(float(daily_demand[i]), 2),
+                    'lead_time_days': lead_time_days,
+                    'estimated_cost': int(recommended_quantity[i]) * float(price[i]) * 0.6,  # 60% costo
+                    'priority': 'high' if stock[i] < safety_stock[i] else 'medium'
+                })
             
             # Ordenar por prioridad
             recommendations.sort(key=lambda x: (x['priority'] == 'high', x['current_stock']))
@@ -247,35 +297,28 @@ class InventoryOptimizationService:
         """
         try:
             from django.utils import timezone
-            slow_products = []
             
-            products = Product.objects.filter(status='active')
+            df = self._build_inventory_frame(demand_days=(threshold_days,), include_last_sale=True)
             
-            for product in products:
-                # Solo analizar si tiene stock
-                if product.total_stock <= 0:
-                    continue
-                    
-                demand_60d = self._calculate_demand(product.id, days=threshold_days)
+            slow_products = []
+            if not df.empty:
+                # Con stock y sin ventas en los últimos threshold_days días
+                slow_df = df[(df['current_stock'] > 0) & (df[f'demand_{threshold_days}d'] == 0)]
+                now = timezone.now()
                 
-                # Si no se ha vendido nada en los últimos 60 días
-                if demand_60d == 0:
-                    # Verificar último movimiento
-                    last_sale = OrderItem.objects.filter(
-                        product_id=product.id
-                    ).order_by('-order__created_at').first()
-                    
+                for product_id, row in slow_df.iterrows():
+                    last_sale_at = row['last_sale_at']
                     days_since_last_sale = 999
-                    if last_sale:
-                        days_since_last_sale = (timezone.now() - last_sale.order.created_at).days
+                    if isinstance(last_sale_at, datetime):
+                        days_since_last_sale = (now - last_sale_at).days
                     
                     slow_products.append({
-                        'product_id': str(product.id),
-                        'product_name': product.name,
-                        'current_stock': product.total_stock,
+                        'product_id': str(product_id),
+                        'product_name': row['name'],
+                        'current_stock': int(row['current_stock']),
                         'days_since_last_sale': days_since_last_sale,
-                        'stock_value': product.total_stock * float(product.price),
-                        'category': product.category.name if product.category else None,
+                        'stock_value': int(row['current_stock']) * float(row['price']),
+                        'category': row['category'] if isinstance(row['category'], str) else None,
                         'recommendation': 'Considerar descuento o promoción'
                     })
             
@@ -301,29 +344,18 @@ class InventoryOptimizationService:
         Calcula un score general de salud del inventario
         """
         try:
-            products = Product.objects.filter(status='active')
-            total_products = products.count()
+            df = self._build_inventory_frame()
+            total_products = len(df)
             
             if total_products == 0:
                 return {'success': True, 'health_score': 100, 'status': 'healthy'}
             
             # Métricas
-            low_stock_count = 0
-            overstock_count = 0
-            slow_moving_count = 0
-            optimal_count = 0
-            
-            for product in products:
-                analysis = self._analyze_product_inventory(product)
-                if analysis:
-                    if analysis['alert_type'] in ['low_stock', 'reorder_now']:
-                        low_stock_count += 1
-                    elif analysis['alert_type'] == 'overstock':
-                        overstock_count += 1
-                    elif analysis['alert_type'] == 'slow_moving':
-                        slow_moving_count += 1
-                else:
-                    optimal_count += 1
+            alert_counts = self._apply_alert_rules(df)['alert_type'].value_counts()
+            low_stock_count = int(alert_counts.get('low_stock', 0) + alert_counts.get('reorder_now', 0))
+            overstock_count = int(alert_counts.get('overstock', 0))
+            slow_moving_count = int(alert_counts.get('slow_moving', 0))
+            optimal_count = int(alert_counts.get('', 0))
             
             # Calcular score (0-100)
             # Penalizar problemas
@@ -0,0 +1,154 @@
+"""
+Registro de modelos ML cargados en memoria (uno por proceso/worker)
+"""
+import os
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from .sales_forecast import SalesForecastService
+from .product_recommendation import ProductRecommendationService
+from .customer_segmentation import CustomerSegmentationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Mantiene una instancia "caliente" de cada servicio ML por worker, de modo
+    que el .pkl se deserializa una sola vez y no en cada request.
+
+    El modelo se recarga automáticamente cuando cambia la fecha de
+    modificación del archivo o el registro MLModel activo de su tipo.
+    Las instancias entregadas son de solo lectura: para entrenar se debe
+    crear un servicio nuevo y luego llamar a invalidate().
+    """
+
+    SERVICES = {
+        'sales_forecast': SalesForecastService,
+        'product_recommendation': ProductRecommendationService,
+        'customer_segmentation': CustomerSegmentationService,
+    }
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        """Segundos entre consultas al MLModel activo (el mtime se revisa siempre)"""
+        return getattr(settings, 'ML_MODEL_REGISTRY_CHECK_SECONDS', 30)
+
+    def get_service(self, model_type):
+        """
+        Retorna el servicio con su modelo cargado para model_type
+        """
+        if model_type not in self.SERVICES:
+            raise ValueError(f"Tipo de modelo no soportado: {model_type}")
+
+        entry = self._entries.get(model_type)
+        if entry is not None and not self._is_stale(model_type, entry):
+            entry['hits'] += 1
+            return entry['service']
+
+        with self._lock:
+            # Otro hilo pudo haberlo recargado mientras esperábamos
+            entry = self._entries.get(model_type)
+            if entry is not None and not self._is_stale(model_type, entry):
+                entry['hits'] += 1
+                return entry['service']
+            return self._load(model_type, entry)['service']
+
+    def invalidate(self, model_type=None):
+        """
+        Fuerza la recarga en el próximo acceso (todos los modelos si model_type es None)
+        """
+        with self._lock:
+            if model_type is None:
+                for entry in self._entries.values():
+                    entry['stale'] = True
+            elif model_type in self._entries:
+                self._entries[model_type]['stale'] = True
+
+    def stats(self):
+        """
+        Estadísticas de carga y uso por modelo en este worker
+        """
+        return {
+            model_type: {
+                'loaded': entry['loaded'],
+                'active_model_id': entry['active_model_id'],
+                'file_mtime': entry['file_mtime'],
+                'loaded_at': entry['loaded_at'].isoformat(),
+                'load_time_ms': entry['load_time_ms'],
+                'loads': entry['loads'],
+                'hits': entry['hits'],
+            }
+            for model_type, entry in self._entries.items()
+        }
+
+    def _load(self, model_type, previous=None):
+        service = self.SERVICES[model_type]()
+
+        start_time = time.time()
+        loaded = service.load_model()
+        load_time_ms = int((time.time() - start_time) * 1000)
+
+        entry = {
+            'service': service,
+            'loaded': bool(loaded),
+            'file_mtime': self._file_mtime(service.model_path),
+            'active_model_id': self._active_model_id(model_type),
+            'checked_at': time.monotonic(),
+            'loaded_at': timezone.now(),
+            'load_time_ms': load_time_ms,
+            'loads': (previous['loads'] if previous else 0) + 1,
+            'hits': previous['hits'] if previous else 0,
+            'stale': False,
+        }
+        self._entries[model_type] = entry
+
+        logger.info(f"Modelo {model_type} cargado en registro ({load_time_ms} ms, cargado={entry['loaded']})")
+        return entry
+
+    def _is_stale(self, model_type, entry):
+        if entry['stale']:
+            return True
+
+        if self._file_mtime(entry['service'].model_path) != entry['file_mtime']:
+            return True
+
+        # Consultar el MLModel activo como máximo una vez por intervalo
+        now = time.monotonic()
+        if now - entry['checked_at'] >= self.check_interval:
+            entry['checked_at'] = now
+            if self._active_model_id(model_type) != entry['active_model_id']:
+                return True
+
+        return False
+
+    @staticmethod
+    def _file_mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _active_model_id(model_type):
+        from ..models import MLModel
+
+        try:
+            model_id = MLModel.objects.filter(
+                model_type=model_type,
+                is_active=True
+            ).order_by('-trained_at').values_list('id', flat=True).first()
+            return str(model_id) if model_id else None
+        except Exception as e:
+            logger.warning(f"No se pudo consultar el modelo activo de {model_type}: {str(e)}")
+            return None
+
+
+# Instancia única por proceso
+model_registry = ModelRegistry()
@@ -3,8 +3,8 @@ Servicio de recomendación de productos usando Scikit-learn
 """
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
+from scipy import sparse
+from sklearn.preprocessing import StandardScaler, normalize
 from collections import defaultdict
 import joblib
 import os
@@ -23,10 +23,26 @@ class ProductRecommendationService:
     Usa collaborative filtering y content-based filtering
     """
     
+    # Tamaño de lote al leer los pares (orden, producto) para la co-compra
+    PAIRS_CHUNK_SIZE = 10000
+    # Vecinos más similares que se guardan por producto
+    TOP_K_NEIGHBORS = 50
+    # Filas de la matriz de similitud que se materializan a la vez al entrenar
+    SIMILARITY_BLOCK_SIZE = 512
+    # Campos que se leen para mostrar un producto recomendado
+    PRODUCT_CARD_FIELDS = ('id', 'name', 'price', 'images')
+    
     def __init__(self):
         self.model_path = os.path.join(settings.BASE_DIR, 'ml_predictions', 'ml_models', 'product_recommendation.pkl')
-        self.similarity_matrix = None
+        # Los arreglos de vecinos se guardan como .npy junto al .pkl y se abren
+        # con mmap para que todos los workers compartan la misma copia en memoria
+        base_path = os.path.splitext(self.model_path)[0]
+        self.neighbor_indices_path = f'{base_path}_neighbor_indices.npy'
+        self.neighbor_scores_path = f'{base_path}_neighbor_scores.npy'
+        self.neighbor_indices = None  # int32 (n_productos, k), ordenado por score descendente
+        self.neighbor_scores = None  # float32 (n_productos, k)
         self.product_ids = []
+        self.product_index = {}  # product_id -> fila en los arreglos de vecinos
         
     def train_model(self):
         """
@@ -40,30 +56,36 @@ class ProductRecommendationService:
             # 1. COLLABORATIVE FILTERING - Productos comprados juntos
             co_purchase_matrix = self._build_co_purchase_matrix()
             
-            # 2. CONTENT-BASED - Similitud por atributos
-            content_similarity = self._build_content_similarity()
-            
-            # 3. Combinar ambas matrices (híbrido)
-            if co_purchase_matrix is not None and content_similarity is not None:
-                # Pesos: 70% collaborative, 30% content-based
-                combined_similarity = 0.7 * co_purchase_matrix + 0.3 * content_similarity
-            elif co_purchase_matrix is not None:
-                combined_similarity = co_purchase_matrix
-            elif content_similarity is not None:
-                combined_similarity = content_similarity
-            else:
+            # 2. CONTENT-BASED - Vectores de atributos normalizados
+            content_features = self._build_content_features()
+            
+            if co_purchase_matrix is None and content_features is None:
                 raise ValueError("No se pudo construir ninguna matriz de similitud")
             
-            self.similarity_matrix = combined_similarity
+            # 3. Combinar ambas matrices (híbrido) por bloques de filas y
+            #    conservar solo los top-K vecinos de cada producto
+            def similarity_block(start, stop):
+                if content_features is None:
+                    return co_purchase_matrix[start:stop].toarray()
+                # Similitud coseno: los vectores ya están normalizados (L2)
+                block = content_features[start:stop] @ content_features.T
+                if co_purchase_matrix is not None:
+                    # Pesos: 70% collaborative, 30% content-based
+                    block = 0.3 * block + 0.7 * co_purchase_matrix[start:stop].toarray()
+                return block
+            
+            avg_similarity = self._build_top_k_index(similarity_block)
             
             # Guardar modelo
             self.save_model()
             
+            n_products = len(self.product_ids)
             metrics = {
-                'total_products': len(self.product_ids),
-                'matrix_shape': self.similarity_matrix.shape,
-                'avg_similarity': float(np.mean(self.similarity_matrix)),
-                'method': 'hybrid' if co_purchase_matrix is not None and content_similarity is not None else 'single'
+                'total_products': n_products,
+                'matrix_shape': (n_products, n_products),
+                'top_k': int(self.neighbor_indices.shape[1]),
+                'avg_similarity': avg_similarity,
+                'method': 'hybrid' if co_purchase_matrix is not None and content_features is not None else 'single'
             }
             
             logger.info(f"Modelo de recomendaciones entrenado exitosamente: {metrics}")
@@ -83,6 +105,12 @@ class ProductRecommendationService:
     def _build_co_purchase_matrix(self):
         """
         Construye matriz de co-compra (qué productos se compran juntos)
+
+        Se arma una matriz dispersa de incidencia orden x producto (X) a partir
+        de los pares (order_id, product_id) y la co-ocurrencia se obtiene como
+        X^T * X, por lo que el costo escala con el número de items vendidos y
+        no con productos^2. Retorna una matriz scipy.sparse CSR normalizada
+        por fila.
         """
         try:
             # Obtener todos los productos activos
@@ -96,52 +124,56 @@ class ProductRecommendationService:
             n_products = len(products)
             
             # Crear diccionario producto -> índice
-            product_to_idx = {str(pid): idx for idx, pid in enumerate(products)}
-            
-            # Matriz de co-ocurrencia
-            co_occurrence = np.zeros((n_products, n_products))
-            
-            # Obtener órdenes completadas
-            orders = Order.objects.filter(
-                status__in=['delivered', 'completed']
-            ).prefetch_related('items__product')
-            
-            order_count = 0
-            for order in orders:
-                items = order.items.all()
-                product_ids_in_order = [str(item.product_id) for item in items if str(item.product_id) in product_to_idx]
-                
-                # Incrementar co-ocurrencia para cada par de productos
-                for i, pid1 in enumerate(product_ids_in_order):
-                    for pid2 in product_ids_in_order[i:]:
-                        idx1 = product_to_idx[pid1]
-                        idx2 = product_to_idx[pid2]
-                        co_occurrence[idx1][idx2] += 1
-                        if idx1 != idx2:
-                            co_occurrence[idx2][idx1] += 1
-                
-                order_count += 1
-            
+            product_to_idx = {pid: idx for idx, pid in enumerate(products)}
+            
+            # Pares (orden, producto) de órdenes completadas, leídos como stream plano
+            pairs = OrderItem.objects.filter(
+                order__status__in=['delivered', 'completed'],
+                product__status='active'
+            ).order_by().values_list('order_id', 'product_id').iterator(chunk_size=self.PAIRS_CHUNK_SIZE)
+            
+            order_to_idx = {}
+            rows = []
+            cols = []
+            for order_id, product_id in pairs:
+                rows.append(order_to_idx.setdefault(order_id, len(order_to_idx)))
+                cols.append(product_to_idx[product_id])
+            
+            order_count = len(order_to_idx)
             if order_count == 0:
                 logger.warning("No hay órdenes para construir matriz de co-compra")
                 return None
             
-            # Normalizar a similitud (cosine-like)
+            # Matriz de incidencia binaria orden x producto
+            incidence = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+                shape=(order_count, n_products)
+            )
+            incidence.data[:] = 1  # Un producto repetido en la misma orden cuenta una vez
+            
+            # Matriz de co-ocurrencia
+            co_occurrence = (incidence.T @ incidence).tocsr()
+            
+            # Normalizar a similitud (cosine-like) sobre la estructura dispersa
             # Evitar división por cero
-            row_sums = co_occurrence.sum(axis=1, keepdims=True)
+            row_sums = np.asarray(co_occurrence.sum(axis=1)).ravel()
             row_sums[row_sums == 0] = 1
-            similarity = co_occurrence / row_sums
+            similarity = sparse.diags(1.0 / row_sums) @ co_occurrence
             
-            logger.info(f"Matriz de co-compra creada: {similarity.shape}, órdenes analizadas: {order_count}")
-            return similarity
+            logger.info(
+                f"Matriz de co-compra creada: {similarity.shape}, nnz: {similarity.nnz}, "
+                f"órdenes analizadas: {order_count}"
+            )
+            return similarity.tocsr()
             
         except Exception as e:
             logger.error(f"Error construyendo matriz de co-compra: {str(e)}")
             return None
     
-    def _build_content_similarity(self):
+    def _build_content_features(self):
         """
-        Construye matriz de similitud basada en atributos de productos
+        Construye los vectores de atributos de productos, normalizados (L2)
+        para que su producto punto sea la similitud coseno
         """
         try:
             # Obtener productos con sus atributos
@@ -176,65 +208,99 @@ class ProductRecommendationService:
             if 'price' in df_encoded.columns:
                 df_encoded['price'] = scaler.fit_transform(df_encoded[['price']])
             
-            # Calcular similitud coseno
-            similarity = cosine_similarity(df_encoded)
+            # Normalizar para calcular similitud coseno por bloques
+            features = normalize(df_encoded.to_numpy(dtype=np.float64))
             
             self.product_ids = product_ids_list
             
-            logger.info(f"Matriz de similitud por contenido creada: {similarity.shape}")
-            return similarity
+            logger.info(f"Vectores de contenido creados: {features.shape}")
+            return features
             
         except Exception as e:
             logger.error(f"Error construyendo similitud por contenido: {str(e)}")
             return None
     
+    def _build_top_k_index(self, similarity_block):
+        """
+        Calcula los top-K vecinos de cada producto recorriendo la matriz de
+        similitud por bloques de filas, sin materializarla completa.
+        similarity_block(start, stop) debe retornar un ndarray denso con las
+        filas [start, stop). Retorna la similitud promedio de la matriz.
+        """
+        n_products = len(self.product_ids)
+        k = min(self.TOP_K_NEIGHBORS, n_products - 1)
+        
+        neighbor_indices = np.empty((n_products, k), dtype=np.int32)
+        neighbor_scores = np.empty((n_products, k), dtype=np.float32)
+        similarity_sum = 0.0
+        
+        for start in range(0, n_products, self.SIMILARITY_BLOCK_SIZE):
+            stop = min(start + self.SIMILARITY_BLOCK_SIZE, n_products)
+            block = np.array(similarity_block(start, stop), dtype=np.float64)
+            similarity_sum += float(block.sum())
+            
+            # Excluir el mismo producto
+            rows = np.arange(stop - start)
+            block[rows, rows + start] = -np.inf
+            
+            # Seleccionar top-K sin ordenar toda la fila y ordenar solo esos K
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            neighbor_indices[start:stop] = np.take_along_axis(top, order, axis=1)
+            neighbor_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        
+        self.neighbor_indices = neighbor_indices
+        self.neighbor_scores = neighbor_scores
+        self.product_index = {pid: idx for idx, pid in enumerate(self.product_ids)}
+        
+        logger.info(f"Índice top-{k} de vecinos creado para {n_products} productos")
+        return similarity_sum / (n_products * n_products)
+    
     def get_recommendations(self, product_id, top_n=10):
         """
         Obtiene recomendaciones para un producto específico
         """
         try:
-            if self.similarity_matrix is None:
+            if self.neighbor_indices is None:
                 self.load_model()
             
-            if self.similarity_matrix is None:
+            if self.neighbor_indices is None:
                 raise ValueError("No hay modelo entrenado. Por favor entrena el modelo primero.")
             
             product_id_str = str(product_id)
             
-            if product_id_str not in self.product_ids:
-                logger.warning(f"Producto {product_id} no encontrado en el modelo")
-                return self._get_popular_products(top_n)
-            
             # Obtener índice del producto
-            idx = self.product_ids.index(product_id_str)
+            idx = self.product_index.get(product_id_str)
             
-            # Obtener similitudes
-            similarities = self.similarity_matrix[idx]
+            if idx is None:
+                logger.warning(f"Producto {product_id} no encontrado en el modelo")
+                return self._get_popular_products(top_n)
             
-            # Ordenar por similitud (excluyendo el mismo producto)
-            similar_indices = np.argsort(similarities)[::-1]
-            similar_indices = [i for i in similar_indices if i != idx][:top_n]
+            # Vecinos precalculados, ya ordenados por similitud (sin el mismo producto).
+            # Se hidratan todos los candidatos en una sola consulta para poder
+            # saltar los que ya no estén activos sin volver a la base de datos
+            candidate_ids = [self.product_ids[i] for i in self.neighbor_indices[idx]]
+            candidate_scores = self.neighbor_scores[idx]
+            cards = self._get_product_cards(candidate_ids)
             
-            # Obtener productos recomendados
+            # Obtener productos recomendados, conservando el orden de similitud
             recommendations = []
-            for i, similar_idx in enumerate(similar_indices):
-                rec_product_id = self.product_ids[similar_idx]
-                similarity_score = float(similarities[similar_idx])
-                
-                try:
-                    product = Product.objects.get(id=rec_product_id, status='active')
-                    # Obtener primera imagen del campo JSONField
-                    image_url = product.images[0] if product.images and len(product.images) > 0 else None
-                    recommendations.append({
-                        'product_id': rec_product_id,
-                        'product_name': product.name,
-                        'similarity_score': similarity_score,
-                        'price': float(product.price),
-                        'image_url': image_url,
-                        'rank': i + 1
-                    })
-                except Product.DoesNotExist:
+            for rec_product_id, score in zip(candidate_ids, candidate_scores):
+                card = cards.get(rec_product_id)
+                if card is None:
                     continue
+                
+                recommendations.append({
+                    'product_id': rec_product_id,
+                    'product_name': card['name'],
+                    'similarity_score': float(score),
+                    'price': card['price'],
+                    'image_url': card['image_url'],
+                    'rank': len(recommendations) + 1
+                })
+                if len(recommendations) >= top_n:
+                    break
             
             return {
                 'success': True,
@@ -256,18 +322,17 @@ class ProductRecommendationService:
         try:
             popular = Product.objects.filter(status='active').annotate(
                 order_count=Count('orderitem')
-            ).order_by('-order_count')[:top_n]
+            ).order_by('-order_count').values(*self.PRODUCT_CARD_FIELDS)[:top_n]
             
             recommendations = []
             for i, product in enumerate(popular):
-                # Obtener primera imagen del campo JSONField
-                image_url = product.images[0] if product.images and len(product.images) > 0 else None
+                card = self._product_card(product)
                 recommendations.append({
-                    'product_id': str(product.id),
-                    'product_name': product.name,
+                    'product_id': str(product['id']),
+                    'product_name': card['name'],
                     'similarity_score': 0.5,  # Score neutro
-                    'price': float(product.price),
-                    'image_url': image_url,
+                    'price': card['price'],
+                    'image_url': card['image_url'],
                     'rank': i + 1,
                     'reason': 'popular_product'
                 })
@@ -284,38 +349,69 @@ class ProductRecommendationService:
                 'error': str(e)
             }
     
+    def _get_product_cards(self, product_ids):
+        """
+        Obtiene la ficha compacta (nombre, precio, primera imagen) de varios
+        productos activos en una sola consulta. Retorna {product_id: ficha}
+        """
+        products = Product.objects.filter(
+            id__in=list(product_ids),
+            status='active'
+        ).order_by().values(*self.PRODUCT_CARD_FIELDS)
+        return {str(product['id']): self._product_card(product) for product in products}
+    
+    @staticmethod
+    def _product_card(product):
+        # Obtener primera imagen del campo JSONField
+        images = product['images']
+        return {
+            'name': product['name'],
+            'price': float(product['price']),
+            'image_url': images[0] if images else None
+        }
+    
     def get_cross_sell_opportunities(self):
         """
         Identifica oportunidades de venta cruzada
         """
         try:
-            if self.similarity_matrix is None:
+            if self.neighbor_indices is None:
                 self.load_model()
             
-            if self.similarity_matrix is None:
+            if self.neighbor_indices is None:
                 raise ValueError("No hay modelo entrenado")
             
-            opportunities = []
+            # Para cada producto, sus 3 mejores complementos sobre el umbral de similitud
+            top_indices = self.neighbor_indices[:, :3]
+            top_scores = self.neighbor_scores[:, :3]
+            rows, cols = np.nonzero(top_scores > 0.3)
+            scores = top_scores[rows, cols]
             
-            # Para cada producto, encontrar los mejores complementos
-            for idx, product_id in enumerate(self.product_ids):
-                similarities = self.similarity_matrix[idx]
-                top_complementary_idx = np.argsort(similarities)[::-1][1:4]  # Top 3, excluyendo él mismo
-                
-                for comp_idx in top_complementary_idx:
-                    if similarities[comp_idx] > 0.3:  # Umbral de similitud
-                        opportunities.append({
-                            'product_a': product_id,
-                            'product_b': self.product_ids[comp_idx],
-                            'score': float(similarities[comp_idx])
-                        })
+            # Ordenar por score, Top 50
+            best = np.argsort(-scores, kind='stable')[:50]
+            pairs = [
+                (self.product_ids[rows[i]], self.product_ids[top_indices[rows[i], cols[i]]], float(scores[i]))
+                for i in best
+            ]
+            
+            # Nombres de ambos productos en una sola consulta
+            cards = self._get_product_cards({pid for pair in pairs for pid in pair[:2]})
             
-            # Ordenar por score
-            opportunities.sort(key=lambda x: x['score'], reverse=True)
+            opportunities = []
+            for product_a, product_b, score in pairs:
+                if product_a not in cards or product_b not in cards:
+                    continue
+                opportunities.append({
+                    'product_a': product_a,
+                    'product_a_name': cards[product_a]['name'],
+                    'product_b': product_b,
+                    'product_b_name': cards[product_b]['name'],
+                    'score': score
+                })
             
             return {
                 'success': True,
-                'opportunities': opportunities[:50]  # Top 50
+                'opportunities': opportunities
             }
             
         except Exception as e:
@@ -331,17 +427,35 @@ class ProductRecommendationService:
         """
         try:
             os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+            
+            # Los .npy se escriben antes que el .pkl: un cambio en el .pkl indica
+            # que el modelo completo ya está disponible
+            self._atomic_write(self.neighbor_indices_path, lambda f: np.save(f, self.neighbor_indices))
+            self._atomic_write(self.neighbor_scores_path, lambda f: np.save(f, self.neighbor_scores))
+            
             model_data = {
-                'similarity_matrix': self.similarity_matrix,
-                'product_ids': self.product_ids
+                'format': 'npy',
+                'product_ids': self.product_ids,
+                'product_index': self.product_index
             }
-            joblib.dump(model_data, self.model_path)
+            self._atomic_write(self.model_path, lambda f: joblib.dump(model_data, f))
             logger.info(f"Modelo de recomendaciones guardado en {self.model_path}")
             return True
         except Exception as e:
             logger.error(f"Error guardando modelo: {str(e)}")
             return False
     
+    @staticmethod
+    def _atomic_write(path, write):
+        """
+        Escribe en un archivo temporal y lo reemplaza de forma atómica, para
+        no truncar un archivo que otro worker tenga mapeado en memoria
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    
     def load_model(self):
         """
         Carga el modelo desde archivo
@@ -349,8 +463,20 @@ class ProductRecommendationService:
         try:
             if os.path.exists(self.model_path):
                 model_data = joblib.load(self.model_path)
-                self.similarity_matrix = model_data['similarity_matrix']
                 self.product_ids = model_data['product_ids']
+                if model_data.get('format') == 'npy':
+                    # Solo lectura y compartido entre procesos vía page cache
+                    self.neighbor_indices = np.load(self.neighbor_indices_path, mmap_mode='r')
+                    self.neighbor_scores = np.load(self.neighbor_scores_path, mmap_mode='r')
+                    self.product_index = model_data['product_index']
+                elif 'neighbor_indices' in model_data:
+                    self.neighbor_indices = model_data['neighbor_indices']
+                    self.neighbor_scores = model_data['neighbor_scores']
+                    self.product_index = {pid: idx for idx, pid in enumerate(self.product_ids)}
+                else:
+                    # Formato anterior: matriz de similitud completa
+                    similarity_matrix = model_data['similarity_matrix']
+                    self._build_top_k_index(lambda start, stop: similarity_matrix[start:stop])
                 logger.info("Modelo de recomendaciones cargado exitosamente")
                 return True
             else:
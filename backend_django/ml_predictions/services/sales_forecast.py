@@ -15,6 +15,7 @@ from django.conf import settings
 from django.db.models import Sum, Count, Avg, F
 from orders.models import Order, OrderItem
 from products.models import Product, Category
+from ..models import DailySalesRollup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +26,14 @@ class SalesForecastService:
     Servicio para predicción de ventas
     """
     
+    # Características usadas para entrenar y predecir (en este orden)
+    FEATURE_COLUMNS = [
+        'month', 'day', 'day_of_week', 'day_of_year', 'week_of_year',
+        'is_weekend', 'quarter', 'num_orders', 'avg_order_value',
+        'sales_7d_avg', 'sales_30d_avg', 'sales_7d_std',
+        'sales_lag_1', 'sales_lag_7', 'sales_lag_30'
+    ]
+    
     def __init__(self):
         self.model = None
         self.model_path = os.path.join(settings.BASE_DIR, 'ml_predictions', 'ml_models', 'sales_forecast.pkl')
@@ -37,25 +46,12 @@ class SalesForecastService:
         try:
             # Obtener fecha límite
             from django.utils import timezone
-            from django.db.models.functions import TruncDate
             
-            end_date = timezone.now()
+            end_date = timezone.localdate()
             start_date = end_date - timedelta(days=months_back * 30)
             
-            # Obtener ventas históricas agregadas por día
-            orders = Order.objects.filter(
-                created_at__gte=start_date,
-                status__in=['delivered', 'completed']
-            ).annotate(
-                date=TruncDate('created_at')
-            ).values('date').annotate(
-                total_sales=Sum('total_amount'),
-                total_quantity=Sum('items__quantity'),
-                num_orders=Count('id'),
-                avg_order_value=Avg('total_amount')
-            ).order_by('date')
-            
-            orders_list = list(orders)
+            # Obtener ventas históricas agregadas por día (tabla DailySalesRollup)
+            orders_list = self._get_daily_sales(start_date, end_date)
             
             if len(orders_list) < 30:
                 logger.warning(f"Datos insuficientes: solo {len(orders_list)} días con ventas")
@@ -63,6 +59,7 @@ class SalesForecastService:
             
             # Convertir a DataFrame
             df = pd.DataFrame(orders_list)
+            df[['total_sales', 'avg_order_value']] = df[['total_sales', 'avg_order_value']].astype(float)
             
             # Ingeniería de características
             df['date'] = pd.to_datetime(df['date'])
@@ -95,6 +92,25 @@ class SalesForecastService:
             logger.error(f"Error preparando datos de entrenamiento: {str(e)}")
             return None
     
+    def _get_daily_sales(self, start_date, end_date):
+        """
+        Lee las ventas diarias agregadas entre start_date y end_date.
+        La tabla se construye con `manage.py backfill_sales_rollup`, no aquí
+        """
+        rollups = DailySalesRollup.objects.filter(
+            date__range=(start_date, end_date)
+        ).values(
+            'date', 'total_sales', 'total_quantity', 'num_orders', 'avg_order_value'
+        ).order_by('date')
+        
+        daily_sales = list(rollups)
+        if not daily_sales and not DailySalesRollup.objects.exists():
+            logger.warning(
+                "Tabla de ventas diarias vacía; ejecuta `python manage.py backfill_sales_rollup`"
+            )
+        
+        return daily_sales
+    
     def train_model(self, df=None, model_type='random_forest'):
         """
         Entrena el modelo de predicción de ventas
@@ -107,12 +123,7 @@ class SalesForecastService:
                 raise ValueError("Datos insuficientes para entrenar el modelo (mínimo 30 registros)")
             
             # Seleccionar características
-            feature_columns = [
-                'month', 'day', 'day_of_week', 'day_of_year', 'week_of_year',
-                'is_weekend', 'quarter', 'num_orders', 'avg_order_value',
-                'sales_7d_avg', 'sales_30d_avg', 'sales_7d_std',
-                'sales_lag_1', 'sales_lag_7', 'sales_lag_30'
-            ]
+            feature_columns = self.FEATURE_COLUMNS
             
             X = df[feature_columns]
             y = df['total_sales']
@@ -129,7 +140,7 @@ class SalesForecastService:
                     max_depth=10,
                     min_samples_split=5,
                     random_state=42,
-                    n_jobs=-1
+                    n_jobs=getattr(settings, 'ML_TRAINING_N_JOBS', 1)
                 )
             elif model_type == 'gradient_boosting':
                 self.model = GradientBoostingRegressor(
@@ -199,13 +210,16 @@ class SalesForecastService:
                 'error': str(e)
             }
     
-    def predict_future_sales(self, days_ahead=30):
+    def predict_future_sales(self, days_ahead=30, recursive=False):
         """
         Predice ventas futuras para los próximos N días
+        
+        Por defecto arma la matriz de características de todo el horizonte y
+        predice en una sola llamada. Con recursive=True cada predicción se
+        agrega al histórico y alimenta los lags/promedios del día siguiente.
         """
         try:
             from django.utils import timezone
-            from django.db.models.functions import TruncDate
             
             if self.model is None:
                 self.load_model()
@@ -214,94 +228,92 @@ class SalesForecastService:
                 raise ValueError("No hay modelo entrenado. Por favor entrena el modelo primero.")
             
             # Obtener datos históricos recientes para crear lag features
-            sixty_days_ago = timezone.now() - timedelta(days=60)
-            
-            recent_sales = Order.objects.filter(
-                status__in=['delivered', 'completed'],
-                created_at__gte=sixty_days_ago
-            ).annotate(
-                date=TruncDate('created_at')
-            ).values('date').annotate(
-                total_sales=Sum('total_amount'),
-                num_orders=Count('id'),
-                avg_order_value=Avg('total_amount')
-            ).order_by('date')
-            
-            recent_df = pd.DataFrame(list(recent_sales))
-            
-            predictions = []
-            start_date = timezone.now().date()
+            today = timezone.localdate()
+            recent_sales = self._get_daily_sales(today - timedelta(days=60), today)
             
-            for i in range(days_ahead):
-                pred_date = start_date + timedelta(days=i)
-                
-                # Calcular características para el día a predecir
-                features = {
-                    'month': pred_date.month,
-                    'day': pred_date.day,
-                    'day_of_week': pred_date.weekday(),
-                    'day_of_year': pred_date.timetuple().tm_yday,
-                    'week_of_year': pred_date.isocalendar()[1],
-                    'is_weekend': 1 if pred_date.weekday() >= 5 else 0,
-                    'quarter': (pred_date.month - 1) // 3 + 1,
+            recent_df = pd.DataFrame(recent_sales)
+            
+            start_date = timezone.now().date()
+            dates = pd.date_range(start=start_date, periods=days_ahead, freq='D')
+            
+            # Características de calendario para todo el horizonte
+            X_pred = pd.DataFrame({
+                'month': dates.month,
+                'day': dates.day,
+                'day_of_week': dates.dayofweek,
+                'day_of_year': dates.dayofyear,
+                'week_of_year': dates.isocalendar().week.to_numpy(dtype=int),
+                'is_weekend': (dates.dayofweek >= 5).astype(int),
+                'quarter': dates.quarter,
+            })
+            
+            # Características basadas en histórico (se calculan una sola vez)
+            if len(recent_df) > 0:
+                # Convertir Decimal a float para evitar errores
+                sales_history = recent_df['total_sales'].astype(float).tolist()
+                history_features = {
+                    'num_orders': float(recent_df['num_orders'].mean()),
+                    'avg_order_value': float(recent_df['avg_order_value'].astype(float).mean()),
+                    **self._sales_history_features(sales_history, sales_30d_window=None)
+                }
+            else:
+                # Valores por defecto si no hay histórico
+                sales_history = []
+                history_features = {
+                    'num_orders': 5,
+                    'avg_order_value': 100.0,
+                    'sales_7d_avg': 500.0,
+                    'sales_30d_avg': 500.0,
+                    'sales_7d_std': 50.0,
+                    'sales_lag_1': 500.0,
+                    'sales_lag_7': 500.0,
+                    'sales_lag_30': 500.0
                 }
-                
-                # Características basadas en histórico
-                if len(recent_df) > 0:
-                    features['num_orders'] = float(recent_df['num_orders'].mean())
-                    features['avg_order_value'] = float(recent_df['avg_order_value'].mean())
-                    # Convertir Decimal a float para evitar errores
-                    total_sales_series = recent_df['total_sales'].astype(float)
-                    features['sales_7d_avg'] = float(total_sales_series.tail(7).mean())
-                    features['sales_30d_avg'] = float(total_sales_series.mean())
-                    features['sales_7d_std'] = float(total_sales_series.tail(7).std() or 0)
-                    features['sales_lag_1'] = float(total_sales_series.iloc[-1] if len(recent_df) >= 1 else 0)
-                    features['sales_lag_7'] = float(total_sales_series.iloc[-7] if len(recent_df) >= 7 else 0)
-                    features['sales_lag_30'] = float(total_sales_series.iloc[-30] if len(recent_df) >= 30 else 0)
-                else:
-                    # Valores por defecto si no hay histórico
-                    features.update({
-                        'num_orders': 5,
-                        'avg_order_value': 100.0,
-                        'sales_7d_avg': 500.0,
-                        'sales_30d_avg': 500.0,
-                        'sales_7d_std': 50.0,
-                        'sales_lag_1': 500.0,
-                        'sales_lag_7': 500.0,
-                        'sales_lag_30': 500.0
-                    })
-                
-                # Predecir
-                X_pred = pd.DataFrame([features])
-                predicted_sales = self.model.predict(X_pred)[0]
-                
-                # Asegurar que la predicción no sea negativa
-                predicted_sales = max(0, predicted_sales)
-                
-                # Estimar cantidad (basado en avg_order_value)
-                predicted_quantity = int(predicted_sales / features['avg_order_value']) if features['avg_order_value'] > 0 else 0
-                
-                # Calcular intervalos de confianza (aproximado)
-                confidence_margin = predicted_sales * 0.15  # 15% de margen
-                
-                predictions.append({
-                    'date': pred_date.isoformat(),
-                    'predicted_sales': float(predicted_sales),
-                    'predicted_quantity': predicted_quantity,
-                    'confidence_lower': float(max(0, predicted_sales - confidence_margin)),
-                    'confidence_upper': float(predicted_sales + confidence_margin),
+            for column, value in history_features.items():
+                X_pred[column] = value
+            X_pred = X_pred[self.FEATURE_COLUMNS]
+            
+            # Predecir
+            if recursive and sales_history:
+                predicted = self._predict_recursive(X_pred, sales_history)
+            else:
+                predicted = self.model.predict(X_pred)
+            
+            # Asegurar que la predicción no sea negativa
+            predicted = np.maximum(0, predicted)
+            
+            # Estimar cantidad (basado en avg_order_value)
+            avg_order_value = X_pred['avg_order_value'].to_numpy(dtype=float)
+            predicted_quantity = np.floor(
+                np.divide(predicted, avg_order_value, out=np.zeros(days_ahead), where=avg_order_value > 0)
+            ).astype(int)
+            
+            # Calcular intervalos de confianza (aproximado)
+            confidence_margin = predicted * 0.15  # 15% de margen
+            confidence_lower = np.maximum(0, predicted - confidence_margin)
+            confidence_upper = predicted + confidence_margin
+            
+            predictions = [
+                {
+                    'date': pred_date.date().isoformat(),
+                    'predicted_sales': float(predicted[i]),
+                    'predicted_quantity': int(predicted_quantity[i]),
+                    'confidence_lower': float(confidence_lower[i]),
+                    'confidence_upper': float(confidence_upper[i]),
                     'features': features
-                })
+                }
+                for i, (pred_date, features) in enumerate(zip(dates, X_pred.to_dict('records')))
+            ]
             
-            logger.info(f"Predicciones generadas para {days_ahead} días")
+            logger.info(f"Predicciones generadas para {days_ahead} días (recursivo={recursive})")
             
             return {
                 'success': True,
                 'predictions': predictions,
                 'summary': {
-                    'total_predicted_sales': sum(p['predicted_sales'] for p in predictions),
-                    'avg_daily_sales': sum(p['predicted_sales'] for p in predictions) / days_ahead,
-                    'total_predicted_quantity': sum(p['predicted_quantity'] for p in predictions)
+                    'total_predicted_sales': float(predicted.sum()),
+                    'avg_daily_sales': float(predicted.sum()) / days_ahead,
+                    'total_predicted_quantity': int(predicted_quantity.sum())
                 }
             }
             
@@ -312,6 +324,43 @@ class SalesForecastService:
                 'error': str(e)
             }
     
+    @staticmethod
+    def _sales_history_features(sales_history, sales_30d_window=30):
+        """
+        Promedios y lags de ventas a partir de la serie diaria (la más reciente al final).
+        sales_30d_window=None promedia toda la serie disponible
+        """
+        series = pd.Series(sales_history, dtype=float)
+        last_30 = series if sales_30d_window is None else series.tail(sales_30d_window)
+        return {
+            'sales_7d_avg': float(series.tail(7).mean()),
+            'sales_30d_avg': float(last_30.mean()),
+            'sales_7d_std': float(series.tail(7).std() or 0),
+            'sales_lag_1': float(series.iloc[-1] if len(series) >= 1 else 0),
+            'sales_lag_7': float(series.iloc[-7] if len(series) >= 7 else 0),
+            'sales_lag_30': float(series.iloc[-30] if len(series) >= 30 else 0),
+        }
+    
+    def _predict_recursive(self, X_pred, sales_history):
+        """
+        Predice día a día realimentando cada predicción en las características
+        de tendencia y lag (modifica X_pred con los valores usados). Todos los
+        días, incluido el primero, usan las mismas ventanas que el
+        entrenamiento (rolling de 7 y 30 días)
+        """
+        history = list(sales_history)
+        trend_columns = list(self._sales_history_features(history).keys())
+        column_positions = [X_pred.columns.get_loc(column) for column in trend_columns]
+        predicted = np.empty(len(X_pred))
+        
+        for i in range(len(X_pred)):
+            features = self._sales_history_features(history)
+            X_pred.iloc[i, column_positions] = [features[column] for column in trend_columns]
+            predicted[i] = max(0.0, self.model.predict(X_pred.iloc[i:i + 1])[0])
+            history.append(predicted[i])
+        
+        return predicted
+    
     def save_model(self):
         """
         Guarda el modelo entrenado
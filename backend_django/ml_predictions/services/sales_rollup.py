@@ -0,0 +1,196 @@
+"""
+Servicio de agregación diaria de ventas (tabla de hechos para predicción)
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from ..models import DailySalesRollup, DailyCategorySalesRollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SalesRollupService:
+    """
+    Mantiene DailySalesRollup y DailyCategorySalesRollup
+    - refresh_dates recalcula días puntuales
+    - refresh_dates_on_commit lo difiere hasta confirmar la transacción en
+      curso (uso incremental desde señales), para agregar con la orden ya
+      visible para las demás conexiones
+    - backfill recalcula un rango completo por lotes
+    """
+
+    # Estados de orden que cuentan como venta
+    SALE_STATUSES = ['delivered', 'completed']
+
+    # Días que se recalculan por lote durante el backfill
+    BACKFILL_BATCH_DAYS = 31
+
+    def refresh_dates(self, dates):
+        """
+        Recalcula las filas de los días indicados a partir de las órdenes
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+
+        orders = Order.objects.filter(
+            status__in=self.SALE_STATUSES,
+            created_at__date__in=dates
+        )
+        items = OrderItem.objects.filter(
+            order__status__in=self.SALE_STATUSES,
+            order__created_at__date__in=dates
+        )
+        return self._refresh(dates, orders, items)
+
+    def refresh_dates_on_commit(self, dates):
+        """
+        Recalcula los días indicados al confirmar la transacción en curso, sin
+        propagar errores (la orden ya quedó guardada; el backfill los corrige)
+        """
+        dates = set(dates)
+        if not dates:
+            return
+
+        def refresh():
+            try:
+                self.refresh_dates(dates)
+            except Exception as e:
+                logger.error(f"Error actualizando ventas diarias para {sorted(dates)}: {str(e)}")
+
+        transaction.on_commit(refresh)
+
+    def backfill(self, start_date=None, end_date=None):
+        """
+        Reconstruye la tabla para [start_date, end_date] (por defecto todo el histórico)
+        """
+        sales = Order.objects.filter(status__in=self.SALE_STATUSES)
+
+        if start_date is None or end_date is None:
+            first_order = sales.order_by('created_at').values_list('created_at', flat=True).first()
+            if first_order is None:
+                logger.info("No hay ventas para agregar")
+                return 0
+            start_date = start_date or timezone.localdate(first_order)
+            end_date = end_date or timezone.localdate()
+
+        total_rows = 0
+        batch_start = start_date
+        while batch_start <= end_date:
+            batch_end = min(batch_start + timedelta(days=self.BACKFILL_BATCH_DAYS - 1), end_date)
+            dates = [batch_start + timedelta(days=i) for i in range((batch_end - batch_start).days + 1)]
+
+            orders = sales.filter(created_at__date__range=(batch_start, batch_end))
+            items = OrderItem.objects.filter(
+                order__status__in=self.SALE_STATUSES,
+                order__created_at__date__range=(batch_start, batch_end)
+            )
+            total_rows += self._refresh(dates, orders, items)
+            batch_start = batch_end + timedelta(days=1)
+
+        logger.info(f"Backfill de ventas diarias completado: {total_rows} días con ventas ({start_date} a {end_date})")
+        return total_rows
+
+    def _refresh(self, dates, orders, items):
+        with transaction.atomic():
+            self._lock_days(dates)
+            return self._write(dates, *self._aggregate(orders, items))
+
+    @staticmethod
+    def _lock_days(dates):
+        """
+        Bloquea las filas de los días antes de agregar, creándolas vacías si no
+        existen: dos recálculos concurrentes del mismo día se serializan y el
+        segundo agrega con las órdenes que confirmó el primero (las filas que
+        queden sin ventas se borran al escribir)
+        """
+        DailySalesRollup.objects.bulk_create(
+            [DailySalesRollup(date=date) for date in dates], ignore_conflicts=True
+        )
+        list(DailySalesRollup.objects.select_for_update().filter(date__in=dates).values_list('id', flat=True))
+
+    @staticmethod
+    def _aggregate(orders, items):
+        # Totales por día: órdenes e items se agregan por separado para no
+        # duplicar total_amount por cada item de la orden
+        daily = {
+            row['date']: row
+            for row in orders.annotate(date=TruncDate('created_at')).values('date').annotate(
+                num_orders=Count('id'),
+                total_sales=Sum('total_amount')
+            ).order_by()
+        }
+        quantities = {
+            row['date']: row['total_quantity']
+            for row in items.annotate(date=TruncDate('order__created_at')).values('date').annotate(
+                total_quantity=Sum('quantity')
+            ).order_by()
+        }
+        by_category = items.filter(product__category__isnull=False).annotate(
+            date=TruncDate('order__created_at')
+        ).values('date', 'product__category_id').annotate(
+            num_orders=Count('order_id', distinct=True),
+            total_sales=Sum('total_price'),
+            total_quantity=Sum('quantity')
+        ).order_by()
+
+        return daily, quantities, list(by_category)
+
+    @staticmethod
+    def _write(dates, daily, quantities, by_category):
+        now = timezone.now()
+        rollups = []
+        for date, row in daily.items():
+            total_sales = row['total_sales'] or Decimal('0')
+            rollups.append(DailySalesRollup(
+                date=date,
+                num_orders=row['num_orders'],
+                total_sales=total_sales,
+                total_quantity=quantities.get(date) or 0,
+                avg_order_value=(total_sales / row['num_orders']).quantize(Decimal('0.01')),
+                updated_at=now
+            ))
+        category_rollups = [
+            DailyCategorySalesRollup(
+                date=row['date'],
+                category_id=row['product__category_id'],
+                num_orders=row['num_orders'],
+                total_sales=row['total_sales'] or 0,
+                total_quantity=row['total_quantity'] or 0,
+                updated_at=now
+            )
+            for row in by_category
+        ]
+
+        # Días/categorías que ya no tienen ventas
+        DailySalesRollup.objects.filter(date__in=dates).exclude(date__in=list(daily)).delete()
+        current_keys = {(rollup.date, rollup.category_id) for rollup in category_rollups}
+        stale_ids = [
+            rollup_id
+            for rollup_id, date, category_id in DailyCategorySalesRollup.objects.filter(
+                date__in=dates
+            ).values_list('id', 'date', 'category_id')
+            if (date, category_id) not in current_keys
+        ]
+        if stale_ids:
+            DailyCategorySalesRollup.objects.filter(id__in=stale_ids).delete()
+
+        DailySalesRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['num_orders', 'total_sales', 'total_quantity', 'avg_order_value', 'updated_at']
+        )
+        DailyCategorySalesRollup.objects.bulk_create(
+            category_rollups,
+            update_conflicts=True,
+            unique_fields=['date', 'category_id'],
+            update_fields=['num_orders', 'total_sales', 'total_quantity', 'updated_at']
+        )
+
+        return len(rollups)
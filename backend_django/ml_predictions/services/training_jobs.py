@@ -0,0 +1,302 @@
+"""
+Ejecución de entrenamientos ML en segundo plano
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .sales_forecast import SalesForecastService
+from .product_recommendation import ProductRecommendationService
+from .customer_segmentation import CustomerSegmentationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _train_sales_forecast(training_log):
+    model_type = training_log.parameters.get('model_type', 'random_forest')
+    service = SalesForecastService()
+    result = service.train_model(model_type=model_type)
+    if not result['success']:
+        return result, None
+
+    return result, {
+        'name': f"Sales Forecast {model_type}",
+        'file_path': service.model_path,
+        'accuracy_score': result['metrics'].get('test_r2', 0),
+        'training_data_size': result['training_data_size'],
+    }
+
+
+def _train_product_recommendation(training_log):
+    service = ProductRecommendationService()
+    result = service.train_model()
+    if not result['success']:
+        return result, None
+
+    return result, {
+        'name': "Product Recommendation System",
+        'file_path': service.model_path,
+        'training_data_size': result['metrics']['total_products'],
+    }
+
+
+def _train_customer_segmentation(training_log):
+    n_clusters = int(training_log.parameters.get('n_clusters', 6))
+    service = CustomerSegmentationService()
+    result = service.train_model(n_clusters=n_clusters)
+    if not result['success']:
+        return result, None
+
+    return result, {
+        'name': f"Customer Segmentation ({n_clusters} clusters)",
+        'file_path': service.model_path,
+        'parameters': {'n_clusters': n_clusters},
+        'training_data_size': result['metrics']['n_customers'],
+    }
+
+
+TRAINERS = {
+    'sales_forecast': _train_sales_forecast,
+    'product_recommendation': _train_product_recommendation,
+    'customer_segmentation': _train_customer_segmentation,
+}
+
+
+def run_training_job(training_log_id):
+    """
+    Ejecuta un entrenamiento registrado en MLTrainingLog y guarda el MLModel
+    resultante. El trabajo ya debe estar tomado ('training', ver
+    TrainingJobRunner.claim). Se puede llamar en el proceso actual o en un
+    proceso hijo.
+    """
+    from threadpoolctl import threadpool_limits
+    from ..models import MLModel, MLTrainingLog
+
+    training_log = MLTrainingLog.objects.select_related('started_by').get(id=training_log_id)
+
+    start_time = time.time()
+    try:
+        trainer = TRAINERS[training_log.model_type]
+
+        # Limitar hilos de BLAS/OpenMP al mismo presupuesto que n_jobs
+        with threadpool_limits(limits=getattr(settings, 'ML_TRAINING_N_JOBS', 1)):
+            result, model_fields = trainer(training_log)
+
+        duration = int(time.time() - start_time)
+
+        if result['success']:
+            training_log.progress = 90
+            training_log.save(update_fields=['progress'])
+
+            # Guardar modelo en DB
+            ml_model = MLModel.objects.create(
+                model_type=training_log.model_type,
+                version=datetime.now().strftime('%Y%m%d_%H%M%S'),
+                metrics=result['metrics'],
+                trained_by=training_log.started_by,
+                **model_fields
+            )
+
+            # Actualizar log
+            training_log.status = 'completed'
+            training_log.progress = 100
+            training_log.training_duration_seconds = duration
+            training_log.metrics = result['metrics']
+            training_log.records_processed = model_fields['training_data_size']
+            training_log.completed_at = timezone.now()
+            training_log.model_saved = ml_model
+            training_log.save()
+        else:
+            # Error en entrenamiento
+            training_log.status = 'failed'
+            training_log.error_message = result.get('error', 'Unknown error')
+            training_log.training_duration_seconds = duration
+            training_log.completed_at = timezone.now()
+            training_log.save()
+
+    except Exception as e:
+        logger.error(f"Error ejecutando entrenamiento {training_log_id}: {str(e)}")
+        training_log.status = 'failed'
+        training_log.error_message = str(e)
+        training_log.training_duration_seconds = int(time.time() - start_time)
+        training_log.completed_at = timezone.now()
+        training_log.save()
+
+    return training_log
+
+
+def _run_training_job_in_child(training_log_id):
+    """
+    Punto de entrada del proceso hijo del pool
+    """
+    try:
+        if not training_job_runner.claim(training_log_id):
+            # Ya lo tomó `run_ml_training_jobs` mientras esperaba en el pool
+            logger.info(f"Entrenamiento {training_log_id} ya fue tomado por otro ejecutor")
+            return None
+        return str(run_training_job(training_log_id).id)
+    finally:
+        connections.close_all()
+
+
+def _init_training_process():
+    """
+    Inicializa Django en el proceso hijo con prioridad de CPU reducida
+    """
+    import django
+    django.setup()
+
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+class TrainingJobRunner:
+    """
+    Cola de entrenamientos ML.
+    - backend 'process': cada worker web mantiene un pool de procesos
+      (ML_TRAINING_MAX_WORKERS) y el request retorna apenas se encola
+    - backend 'db': el trabajo queda 'pending' y lo ejecuta el comando
+      `run_ml_training_jobs` en un proceso aparte
+
+    Con cualquier backend, `run_ml_training_jobs` también toma los pendientes
+    que llevan más de ML_TRAINING_PENDING_GRACE_SECONDS sin empezar (p. ej. si
+    el worker web que los encoló se reinició) y marca como fallidos los que
+    llevan más de ML_TRAINING_TIMEOUT_SECONDS entrenando (reap_stale_jobs).
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return getattr(settings, 'ML_TRAINING_BACKEND', 'process')
+
+    def submit(self, model_type, parameters=None, user=None, wait=False):
+        """
+        Registra el entrenamiento y lo encola. Con wait=True se ejecuta en el
+        proceso actual y se retorna el log ya finalizado.
+        """
+        from ..models import MLTrainingLog
+
+        if model_type not in TRAINERS:
+            raise ValueError(f"Tipo de modelo no soportado: {model_type}")
+
+        training_log = MLTrainingLog.objects.create(
+            model_type=model_type,
+            status='pending',
+            parameters=parameters or {},
+            started_by=user
+        )
+
+        if wait:
+            self.claim(training_log.id)
+            return run_training_job(training_log.id)
+
+        if self.backend == 'process':
+            training_log_id = str(training_log.id)
+            transaction.on_commit(lambda: self._submit_to_pool(training_log_id))
+
+        return training_log
+
+    def claim_next_job(self):
+        """
+        Toma el siguiente trabajo pendiente, evitando que dos ejecutores tomen
+        el mismo. Con el backend 'process' solo toma los que el pool no empezó
+        dentro de ML_TRAINING_PENDING_GRACE_SECONDS
+        """
+        from ..models import MLTrainingLog
+
+        pending = MLTrainingLog.objects.filter(status='pending')
+        if self.backend != 'db':
+            grace = timedelta(seconds=getattr(settings, 'ML_TRAINING_PENDING_GRACE_SECONDS', 600))
+            pending = pending.filter(started_at__lt=timezone.now() - grace)
+
+        with transaction.atomic():
+            training_log = pending.select_for_update(skip_locked=True).order_by('started_at').first()
+            if training_log is None:
+                return None
+            training_log.status = 'training'
+            training_log.progress = 10
+            training_log.training_started_at = timezone.now()
+            training_log.save(update_fields=['status', 'progress', 'training_started_at'])
+        return training_log
+
+    def claim(self, training_log_id):
+        """
+        Toma un trabajo pendiente concreto. Retorna False si otro ejecutor ya
+        lo tomó
+        """
+        from ..models import MLTrainingLog
+
+        return MLTrainingLog.objects.filter(id=training_log_id, status='pending').update(
+            status='training',
+            progress=10,
+            training_started_at=timezone.now()
+        ) == 1
+
+    def reap_stale_jobs(self):
+        """
+        Marca como fallidos los entrenamientos que llevan más de
+        ML_TRAINING_TIMEOUT_SECONDS en curso (su proceso murió o se colgó).
+        Retorna cuántos se marcaron
+        """
+        from ..models import MLTrainingLog
+
+        timeout = getattr(settings, 'ML_TRAINING_TIMEOUT_SECONDS', 3600)
+        now = timezone.now()
+        reaped = MLTrainingLog.objects.filter(
+            status='training',
+            training_started_at__lt=now - timedelta(seconds=timeout)
+        ).update(
+            status='failed',
+            error_message=f'Tiempo de entrenamiento agotado ({timeout}s)',
+            completed_at=now
+        )
+        if reaped:
+            logger.warning(f"{reaped} entrenamientos marcados como fallidos por tiempo agotado")
+        return reaped
+
+    def _submit_to_pool(self, training_log_id):
+        future = self._get_executor().submit(_run_training_job_in_child, training_log_id)
+        future.add_done_callback(lambda f: self._on_job_done(training_log_id, f))
+
+    def _on_job_done(self, training_log_id, future):
+        error = future.exception()
+        if error is None:
+            logger.info(f"Entrenamiento {training_log_id} finalizado")
+            return
+
+        # El proceso hijo murió antes de registrar el resultado
+        from ..models import MLTrainingLog
+
+        logger.error(f"Entrenamiento {training_log_id} abortado: {str(error)}")
+        MLTrainingLog.objects.filter(id=training_log_id, status__in=['pending', 'training']).update(
+            status='failed',
+            error_message=str(error),
+            completed_at=timezone.now()
+        )
+        with self._lock:
+            self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'ML_TRAINING_MAX_WORKERS', 1),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_training_process
+                )
+            return self._executor
+
+
+# Instancia única por proceso
+training_job_runner = TrainingJobRunner()
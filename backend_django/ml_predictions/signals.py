@@ -0,0 +1,47 @@
+"""
+Señales para mantener actualizada la agregación diaria de ventas
+
+Solo las transiciones que cambian qué órdenes cuentan como venta (entrar o
+salir de SALE_STATUSES, cambiar de día o borrarse siendo venta) recalculan
+el día, y siempre al confirmar la transacción. Otros cambios sobre ventas ya
+registradas (items, montos) se corrigen con `manage.py backfill_sales_rollup`.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from orders.models import Order
+from .services.sales_rollup import SalesRollupService
+
+
+def _refresh_order_days(*created_ats):
+    SalesRollupService().refresh_dates_on_commit(
+        timezone.localdate(created_at) for created_at in created_ats if created_at
+    )
+
+
+@receiver(post_init, sender=Order)
+def remember_order_sale_state(sender, instance, **kwargs):
+    # Estado con el que se cargó la orden, para detectar transiciones al guardar.
+    # Se lee de __dict__ para no disparar consultas en campos diferidos (only/defer)
+    instance._rollup_state = (instance.__dict__.get('status'), instance.__dict__.get('created_at'))
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup_on_order_save(sender, instance, created, **kwargs):
+    previous_status, previous_created_at = getattr(instance, '_rollup_state', (None, None))
+    is_sale = instance.status in SalesRollupService.SALE_STATUSES
+    was_sale = previous_status in SalesRollupService.SALE_STATUSES and not created
+
+    if is_sale != was_sale:
+        _refresh_order_days(instance.created_at, previous_created_at if was_sale else None)
+    elif is_sale and previous_created_at and previous_created_at != instance.created_at:
+        # Venta movida de día
+        _refresh_order_days(instance.created_at, previous_created_at)
+
+    instance._rollup_state = (instance.status, instance.created_at)
+
+
+@receiver(post_delete, sender=Order)
+def update_sales_rollup_on_order_delete(sender, instance, **kwargs):
+    if instance.status in SalesRollupService.SALE_STATUSES:
+        _refresh_order_days(instance.created_at)
@@ -24,7 +24,8 @@ urlpatterns = [
     
     # Customer Segmentation
     path('train-customer-segmentation/', views.train_customer_segmentation_model, name='train-customer-segmentation'),
-    path('customer-segment/<uuid:customer_id>/', views.get_customer_segment, name='customer-segment'),
+    path('customer-segment/<int:customer_id>/', views.get_customer_segment, name='customer-segment'),
+    path('segment-all-customers/', views.segment_all_customers, name='segment-all-customers'),
     
     # Inventory Optimization
     path('inventory-analysis/', views.analyze_inventory, name='inventory-analysis'),
@@ -33,4 +34,5 @@ urlpatterns = [
     
     # Dashboard
     path('dashboard-summary/', views.ml_dashboard_summary, name='dashboard-summary'),
+    path('model-registry/', views.model_registry_status, name='model-registry'),
 ]
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db import models
 from datetime import datetime, timedelta
+import os
 import time
 import logging
 
@@ -21,7 +22,9 @@ from .services import (
     SalesForecastService,
     ProductRecommendationService,
     CustomerSegmentationService,
-    InventoryOptimizationService
+    InventoryOptimizationService,
+    model_registry,
+    training_job_runner
 )
 from authentication.permissions import IsSuperuserOrAdmin
 
@@ -101,74 +104,63 @@ class MLTrainingLogViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== API ENDPOINTS ====================
 
+def _start_training(request, model_type, parameters, success_message):
+    """
+    Encola el entrenamiento y retorna 202 con el id del trabajo. Con
+    "async": false en el body entrena dentro del request (comportamiento anterior).
+    """
+    run_async = str(request.data.get('async', True)).lower() != 'false'
+
+    if run_async:
+        training_log = training_job_runner.submit(model_type, parameters, user=request.user)
+        return Response({
+            'success': True,
+            'message': 'Entrenamiento encolado',
+            'job_id': str(training_log.id),
+            'status': training_log.status,
+            'status_url': f"/api/ml/training-logs/{training_log.id}/"
+        }, status=status.HTTP_202_ACCEPTED)
+
+    training_log = training_job_runner.submit(model_type, parameters, user=request.user, wait=True)
+
+    if training_log.status == 'completed':
+        # Recargar el modelo en el registro de este worker
+        model_registry.invalidate(model_type)
+
+        return Response({
+            'success': True,
+            'message': success_message,
+            'job_id': str(training_log.id),
+            'model_id': str(training_log.model_saved_id),
+            'metrics': training_log.metrics,
+            'duration_seconds': training_log.training_duration_seconds
+        }, status=status.HTTP_201_CREATED)
+
+    return Response({
+        'success': False,
+        'job_id': str(training_log.id),
+        'error': training_log.error_message or 'Error desconocido'
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
 def train_sales_forecast_model(request):
     """
-    Entrena el modelo de predicción de ventas
+    Entrena el modelo de predicción de ventas en segundo plano
     POST /api/ml/train-sales-forecast/
     Body: {
-        "model_type": "random_forest" (opcional: random_forest, gradient_boosting, linear)
+        "model_type": "random_forest" (opcional: random_forest, gradient_boosting, linear),
+        "async": true (opcional, false para entrenar dentro del request)
     }
+    El progreso se consulta en GET /api/ml/training-logs/<job_id>/
     """
     try:
-        # Crear log de entrenamiento
-        training_log = MLTrainingLog.objects.create(
-            model_type='sales_forecast',
-            status='training',
-            started_by=request.user
-        )
-        
-        start_time = time.time()
-        
-        # Entrenar modelo
         model_type = request.data.get('model_type', 'random_forest')
-        service = SalesForecastService()
-        result = service.train_model(model_type=model_type)
-        
-        duration = int(time.time() - start_time)
-        
-        if result['success']:
-            # Guardar modelo en DB
-            ml_model = MLModel.objects.create(
-                name=f"Sales Forecast {model_type}",
-                model_type='sales_forecast',
-                version=datetime.now().strftime('%Y%m%d_%H%M%S'),
-                file_path=service.model_path,
-                accuracy_score=result['metrics'].get('test_r2', 0),
-                metrics=result['metrics'],
-                training_data_size=result['training_data_size'],
-                trained_by=request.user
-            )
-            
-            # Actualizar log
-            training_log.status = 'completed'
-            training_log.training_duration_seconds = duration
-            training_log.metrics = result['metrics']
-            training_log.records_processed = result['training_data_size']
-            training_log.completed_at = timezone.now()
-            training_log.model_saved = ml_model
-            training_log.save()
-            
-            return Response({
-                'success': True,
-                'message': 'Modelo entrenado exitosamente',
-                'model_id': str(ml_model.id),
-                'metrics': result['metrics'],
-                'duration_seconds': duration
-            }, status=status.HTTP_201_CREATED)
-        else:
-            # Error en entrenamiento
-            training_log.status = 'failed'
-            training_log.error_message = result.get('error', 'Unknown error')
-            training_log.training_duration_seconds = duration
-            training_log.completed_at = timezone.now()
-            training_log.save()
-            
-            return Response({
-                'success': False,
-                'error': result.get('error', 'Error desconocido')
-            }, status=status.HTTP_400_BAD_REQUEST)
+        return _start_training(
+            request, 'sales_forecast', {'model_type': model_type},
+            'Modelo entrenado exitosamente'
+        )
         
     except Exception as e:
         logger.error(f"Error entrenando modelo: {str(e)}")
@@ -185,11 +177,13 @@ def predict_sales(request):
     Predice ventas futuras
     POST /api/ml/predict-sales/
     Body: {
-        "days_ahead": 30 (opcional, default: 30)
+        "days_ahead": 30 (opcional, default: 30),
+        "recursive": false (opcional, realimenta las predicciones en los lags)
     }
     """
     try:
         days_ahead = int(request.data.get('days_ahead', 30))
+        recursive = str(request.data.get('recursive', 'false')).lower() == 'true'
         
         if days_ahead < 1 or days_ahead > 365:
             return Response({
@@ -198,8 +192,8 @@ def predict_sales(request):
         
         start_time = time.time()
         
-        service = SalesForecastService()
-        result = service.predict_future_sales(days_ahead=days_ahead)
+        service = model_registry.get_service('sales_forecast')
+        result = service.predict_future_sales(days_ahead=days_ahead, recursive=recursive)
         
         execution_time = int((time.time() - start_time) * 1000)  # ms
         
@@ -213,7 +207,7 @@ def predict_sales(request):
             if ml_model:
                 prediction = Prediction.objects.create(
                     model=ml_model,
-                    input_data={'days_ahead': days_ahead},
+                    input_data={'days_ahead': days_ahead, 'recursive': recursive},
                     prediction_result=result,
                     requested_by=request.user,
                     execution_time_ms=execution_time
@@ -258,60 +252,18 @@ def predict_sales(request):
 @permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
 def train_product_recommendation_model(request):
     """
-    Entrena el modelo de recomendación de productos
+    Entrena el modelo de recomendación de productos en segundo plano
     POST /api/ml/train-product-recommendation/
+    Body: {
+        "async": true (opcional, false para entrenar dentro del request)
+    }
     """
     try:
-        training_log = MLTrainingLog.objects.create(
-            model_type='product_recommendation',
-            status='training',
-            started_by=request.user
+        return _start_training(
+            request, 'product_recommendation', {},
+            'Modelo de recomendaciones entrenado exitosamente'
         )
         
-        start_time = time.time()
-        
-        service = ProductRecommendationService()
-        result = service.train_model()
-        
-        duration = int(time.time() - start_time)
-        
-        if result['success']:
-            ml_model = MLModel.objects.create(
-                name="Product Recommendation System",
-                model_type='product_recommendation',
-                version=datetime.now().strftime('%Y%m%d_%H%M%S'),
-                file_path=service.model_path,
-                metrics=result['metrics'],
-                training_data_size=result['metrics']['total_products'],
-                trained_by=request.user
-            )
-            
-            training_log.status = 'completed'
-            training_log.training_duration_seconds = duration
-            training_log.metrics = result['metrics']
-            training_log.completed_at = timezone.now()
-            training_log.model_saved = ml_model
-            training_log.save()
-            
-            return Response({
-                'success': True,
-                'message': 'Modelo de recomendaciones entrenado exitosamente',
-                'model_id': str(ml_model.id),
-                'metrics': result['metrics'],
-                'duration_seconds': duration
-            }, status=status.HTTP_201_CREATED)
-        else:
-            training_log.status = 'failed'
-            training_log.error_message = result.get('error')
-            training_log.training_duration_seconds = duration
-            training_log.completed_at = timezone.now()
-            training_log.save()
-            
-            return Response({
-                'success': False,
-                'error': result.get('error')
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
     except Exception as e:
         logger.error(f"Error entrenando modelo de recomendaciones: {str(e)}")
         return Response({
@@ -330,7 +282,7 @@ def get_product_recommendations(request, product_id):
     try:
         top_n = int(request.query_params.get('top_n', 10))
         
-        service = ProductRecommendationService()
+        service = model_registry.get_service('product_recommendation')
         result = service.get_recommendations(product_id, top_n=top_n)
         
         if result['success']:
@@ -353,66 +305,19 @@ def get_product_recommendations(request, product_id):
 @permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
 def train_customer_segmentation_model(request):
     """
-    Entrena el modelo de segmentación de clientes
+    Entrena el modelo de segmentación de clientes en segundo plano
     POST /api/ml/train-customer-segmentation/
     Body: {
-        "n_clusters": 6 (opcional, default: 6)
+        "n_clusters": 6 (opcional, default: 6),
+        "async": true (opcional, false para entrenar dentro del request)
     }
     """
     try:
-        training_log = MLTrainingLog.objects.create(
-            model_type='customer_segmentation',
-            status='training',
-            started_by=request.user
-        )
-        
-        start_time = time.time()
-        
         n_clusters = int(request.data.get('n_clusters', 6))
-        
-        service = CustomerSegmentationService()
-        result = service.train_model(n_clusters=n_clusters)
-        
-        duration = int(time.time() - start_time)
-        
-        if result['success']:
-            ml_model = MLModel.objects.create(
-                name=f"Customer Segmentation ({n_clusters} clusters)",
-                model_type='customer_segmentation',
-                version=datetime.now().strftime('%Y%m%d_%H%M%S'),
-                file_path=service.model_path,
-                metrics=result['metrics'],
-                parameters={'n_clusters': n_clusters},
-                training_data_size=result['metrics']['n_customers'],
-                trained_by=request.user
-            )
-            
-            training_log.status = 'completed'
-            training_log.training_duration_seconds = duration
-            training_log.metrics = result['metrics']
-            training_log.records_processed = result['metrics']['n_customers']
-            training_log.completed_at = timezone.now()
-            training_log.model_saved = ml_model
-            training_log.save()
-            
-            return Response({
-                'success': True,
-                'message': 'Modelo de segmentación entrenado exitosamente',
-                'model_id': str(ml_model.id),
-                'metrics': result['metrics'],
-                'duration_seconds': duration
-            }, status=status.HTTP_201_CREATED)
-        else:
-            training_log.status = 'failed'
-            training_log.error_message = result.get('error')
-            training_log.training_duration_seconds = duration
-            training_log.completed_at = timezone.now()
-            training_log.save()
-            
-            return Response({
-                'success': False,
-                'error': result.get('error')
-            }, status=status.HTTP_400_BAD_REQUEST)
+        return _start_training(
+            request, 'customer_segmentation', {'n_clusters': n_clusters},
+            'Modelo de segmentación entrenado exitosamente'
+        )
         
     except Exception as e:
         logger.error(f"Error entrenando modelo de segmentación: {str(e)}")
@@ -430,7 +335,7 @@ def get_customer_segment(request, customer_id):
     GET /api/ml/customer-segment/<customer_id>/
     """
     try:
-        service = CustomerSegmentationService()
+        service = model_registry.get_service('customer_segmentation')
         result = service.predict_customer_segment(customer_id)
         
         if result['success']:
@@ -449,6 +354,42 @@ def get_customer_segment(request, customer_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
+def segment_all_customers(request):
+    """
+    Segmenta a todos los clientes en lote y guarda los resultados
+    POST /api/ml/segment-all-customers/
+    Body: {
+        "save": true (opcional, reemplaza los segmentos guardados en CustomerSegment),
+        "include_segments": false (opcional, incluye el detalle por cliente)
+    }
+    """
+    try:
+        save = str(request.data.get('save', 'true')).lower() != 'false'
+        include_segments = str(request.data.get('include_segments', 'false')).lower() == 'true'
+        
+        service = model_registry.get_service('customer_segmentation')
+        result = service.segment_all_customers(save=save, requested_by=request.user)
+        
+        if result['success']:
+            if not include_segments:
+                result.pop('segments')
+            return Response(result, status=status.HTTP_201_CREATED if save else status.HTTP_200_OK)
+        else:
+            return Response({
+                'success': False,
+                'error': result.get('error')
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+    except Exception as e:
+        logger.error(f"Error segmentando clientes: {str(e)}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
 def analyze_inventory(request):
@@ -540,8 +481,8 @@ def ml_dashboard_summary(request):
     try:
         # Obtener predicción de ventas reciente
         try:
-            sales_forecast_service = SalesForecastService()
-            sales_prediction = sales_forecast_service.predict(days_ahead=30)
+            sales_forecast_service = model_registry.get_service('sales_forecast')
+            sales_prediction = sales_forecast_service.predict_future_sales(days_ahead=30)
             
             # Calcular totales
             next_7_days = sum([p['predicted_sales'] for p in sales_prediction['predictions'][:7]])
@@ -581,10 +522,9 @@ def ml_dashboard_summary(request):
         
         # Obtener información de clientes
         try:
-            segmentation_service = CustomerSegmentationService()
             total_segments = CustomerSegment.objects.values('segment_type').distinct().count()
-            vip_customers = CustomerSegment.objects.filter(segment_type='VIP').count()
-            at_risk_customers = CustomerSegment.objects.filter(segment_type='At Risk').count()
+            vip_customers = CustomerSegment.objects.filter(segment_type='vip').count()
+            at_risk_customers = CustomerSegment.objects.filter(segment_type='at_risk').count()
             
             customers_summary = {
                 'total_segments': total_segments,
@@ -633,3 +573,15 @@ def ml_dashboard_summary(request):
             'recommendations': {'total_products': 0, 'avg_similarity': 0}
         }, status=status.HTTP_200_OK)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsSuperuserOrAdmin])
+def model_registry_status(request):
+    """
+    Estado de los modelos cargados en memoria en este worker
+    GET /api/ml/model-registry/
+    """
+    return Response({
+        'pid': os.getpid(),
+        'models': model_registry.stats()
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,234 @@
+"""
+Creación masiva de órdenes (ventas en tienda, importaciones)
+
+Todas las órdenes de una solicitud se crean en una sola transacción con un
+número fijo de consultas, sin importar cuántas líneas tengan:
+- una consulta para las variantes (con producto, talla y color), otra para
+  los clientes y otra para los métodos de pago
+- un rango de números de orden reservado de una vez
+- un único UPDATE condicional que descuenta el stock de todas las variantes
+  (igual que orders.reservations)
+- bulk_create de Order, OrderItem, Payment y StockMovement
+
+bulk_create no ejecuta save() ni señales, por lo que aquí se completan los
+campos que calcula OrderItem.save() y se actualizan explícitamente los
+contadores de stock de Product y la agregación diaria de ventas (esta al
+confirmar la transacción).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from products.models import ProductVariant
+from products.stock import refresh_product_stock
+from .models import Order, OrderItem, Payment, PaymentMethod, StockMovement
+from .numbering import allocate_document_numbers
+from .reservations import InsufficientStockError, quantity_case, variant_details
+import logging
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class BulkOrderError(Exception):
+    """
+    La solicitud hace referencia a clientes, variantes o métodos de pago
+    inexistentes o inactivos
+    """
+
+
+class BulkOrderService:
+    """
+    Crea varias órdenes ya confirmadas (el stock se descuenta como venta).
+    Cada orden es un dict con la forma validada por BulkOrderSerializer.
+    """
+
+    BULK_BATCH_SIZE = 1000
+
+    def create_orders(self, orders_data, user=None):
+        """
+        Crea las órdenes y retorna la lista de Order creadas
+        """
+        variants = self._load_variants(orders_data)
+        self._check_customers(orders_data)
+        payment_methods = self._check_payment_methods(orders_data)
+
+        now = timezone.now()
+        orders, items, payments = [], [], []
+        quantities = defaultdict(int)
+
+        for data in orders_data:
+            order = Order(
+                customer_id=data['customer_id'],
+                order_type=data.get('order_type', 'in_store'),
+                status=data.get('status', 'confirmed'),
+                tax_amount=data.get('tax_amount', Decimal('0')),
+                discount_amount=data.get('discount_amount', Decimal('0')),
+                shipping_cost=data.get('shipping_cost', Decimal('0')),
+                shipping_address=data.get('shipping_address') or {},
+                billing_address=data.get('billing_address') or {},
+                notes=data.get('notes'),
+                processed_by=user,
+                confirmed_at=now,
+                delivered_at=now if data.get('status') == 'delivered' else None
+            )
+
+            subtotal = Decimal('0')
+            for line in data['items']:
+                variant = variants[line['product_variant_id']]
+                unit_price = line.get('unit_price')
+                if unit_price is None:
+                    unit_price = variant.product.price + variant.price_adjustment
+                total_price = unit_price * line['quantity']
+                subtotal += total_price
+                quantities[variant.id] += line['quantity']
+                items.append(OrderItem(
+                    order=order,
+                    product=variant.product,
+                    product_variant=variant,
+                    quantity=line['quantity'],
+                    unit_price=unit_price,
+                    total_price=total_price,
+                    product_name=variant.product.name,
+                    product_sku=variant.product.sku,
+                    variant_details=variant_details(variant)
+                ))
+
+            order.subtotal = subtotal
+            order.total_amount = subtotal + order.tax_amount + order.shipping_cost - order.discount_amount
+
+            for payment in data.get('payments', []):
+                payment_status = payment.get('status', 'completed')
+                payments.append(Payment(
+                    order=order,
+                    payment_method=payment_methods[payment['payment_method_id']],
+                    amount=payment.get('amount', order.total_amount),
+                    status=payment_status,
+                    transaction_id=payment.get('transaction_id'),
+                    reference_number=payment.get('reference_number'),
+                    processed_at=now if payment_status == 'completed' else None,
+                    processed_by=user
+                ))
+            orders.append(order)
+
+        # Fuera de la transacción: el contador del día no queda bloqueado
+        # mientras se insertan las órdenes (ver orders.numbering)
+        for order, number in zip(orders, allocate_document_numbers('ORD', len(orders))):
+            order.order_number = number
+
+        with transaction.atomic():
+            self._discount_stock(quantities, variants)
+
+            Order.objects.bulk_create(orders, batch_size=self.BULK_BATCH_SIZE)
+            OrderItem.objects.bulk_create(items, batch_size=self.BULK_BATCH_SIZE)
+            Payment.objects.bulk_create(payments, batch_size=self.BULK_BATCH_SIZE)
+            StockMovement.objects.bulk_create(
+                self._stock_movements(orders, items, user), batch_size=self.BULK_BATCH_SIZE
+            )
+
+            refresh_product_stock({variant.product_id for variant in variants.values()})
+            self._refresh_sales_rollup(orders)
+
+        logger.info(f"{len(orders)} órdenes creadas en bloque ({len(items)} líneas)")
+        return orders
+
+    def _load_variants(self, orders_data):
+        variant_ids = {line['product_variant_id'] for data in orders_data for line in data['items']}
+        variants = ProductVariant.objects.select_related('product', 'size', 'color').in_bulk(variant_ids)
+
+        missing = [str(variant_id) for variant_id in variant_ids if variant_id not in variants]
+        if missing:
+            raise BulkOrderError(f"Variantes no encontradas: {', '.join(sorted(missing))}")
+        inactive = [variant.sku_variant for variant in variants.values() if not variant.is_active]
+        if inactive:
+            raise BulkOrderError(f"Variantes inactivas: {', '.join(sorted(inactive))}")
+        return variants
+
+    def _check_customers(self, orders_data):
+        customer_ids = {data['customer_id'] for data in orders_data}
+        found = set(User.objects.filter(id__in=customer_ids).values_list('id', flat=True))
+        missing = customer_ids - found
+        if missing:
+            raise BulkOrderError(f"Clientes no encontrados: {', '.join(str(i) for i in sorted(missing))}")
+
+    def _check_payment_methods(self, orders_data):
+        method_ids = {
+            payment['payment_method_id'] for data in orders_data for payment in data.get('payments', [])
+        }
+        if not method_ids:
+            return {}
+        methods = PaymentMethod.objects.filter(is_active=True).in_bulk(method_ids)
+        missing = [str(method_id) for method_id in method_ids if method_id not in methods]
+        if missing:
+            raise BulkOrderError(f"Métodos de pago no encontrados o inactivos: {', '.join(sorted(missing))}")
+        return methods
+
+    def _discount_stock(self, quantities, variants):
+        """
+        Descuenta el stock de todas las variantes con un solo UPDATE; sin
+        tocar el stock ya reservado por otras órdenes
+        """
+        requested = quantity_case(quantities)
+        updated = ProductVariant.objects.filter(
+            id__in=quantities,
+            is_active=True,
+            stock_quantity__gte=F('reserved_quantity') + requested
+        ).update(stock_quantity=F('stock_quantity') - requested)
+
+        if updated != len(quantities):
+            shortages = [
+                {
+                    'product_variant_id': str(variant.id),
+                    'sku_variant': variant.sku_variant,
+                    'requested': quantities[variant.id],
+                    'available': variant.available_stock if variant.is_active else 0,
+                }
+                for variant in ProductVariant.objects.filter(id__in=quantities)
+                if not variant.is_active or variant.available_stock < quantities[variant.id]
+            ]
+            raise InsufficientStockError(shortages)
+
+        # Stock final de cada variante (filas ya bloqueadas por el UPDATE)
+        for variant_id, stock_quantity in ProductVariant.objects.filter(
+            id__in=quantities
+        ).values_list('id', 'stock_quantity'):
+            variants[variant_id].stock_quantity = stock_quantity
+
+    @staticmethod
+    def _stock_movements(orders, items, user):
+        """
+        Un movimiento de venta por línea. previous/new_stock se reconstruyen
+        desde el stock final, recorriendo las líneas en orden
+        """
+        stock = {item.product_variant_id: item.product_variant.stock_quantity for item in items}
+        for item in items:
+            stock[item.product_variant_id] += item.quantity
+
+        movements = []
+        for item in items:
+            previous_stock = stock[item.product_variant_id]
+            stock[item.product_variant_id] = previous_stock - item.quantity
+            movements.append(StockMovement(
+                product_variant_id=item.product_variant_id,
+                movement_type='sale',
+                quantity=-item.quantity,
+                previous_stock=previous_stock,
+                new_stock=previous_stock - item.quantity,
+                order_id=item.order.id,
+                reference_number=item.order.order_number,
+                created_by=user
+            ))
+        return movements
+
+    @staticmethod
+    def _refresh_sales_rollup(orders):
+        # bulk_create no dispara las señales de ml_predictions
+        from ml_predictions.services.sales_rollup import SalesRollupService
+
+        SalesRollupService().refresh_dates_on_commit(
+            timezone.localdate(order.created_at)
+            for order in orders if order.status in SalesRollupService.SALE_STATUSES
+        )
@@ -0,0 +1,35 @@
+"""
+Libera el stock reservado por órdenes online que no se confirmaron a tiempo
+"""
+import time
+from django.core.management.base import BaseCommand
+from orders.reservations import StockReservationService
+
+
+class Command(BaseCommand):
+    help = 'Cancela las órdenes pendientes con reserva vencida y libera su stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar las reservas vencidas y terminar',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Segundos entre revisiones',
+        )
+
+    def handle(self, *args, **options):
+        service = StockReservationService()
+
+        while True:
+            expired = service.expire_reservations()
+            if expired:
+                self.stdout.write(self.style.SUCCESS(f'✅ {expired} reservas vencidas liberadas'))
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
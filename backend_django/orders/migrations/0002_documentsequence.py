@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:43
+
+from datetime import datetime
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """
+    Inicializa los contadores con los números ya emitidos, para no repetir
+    números si la migración se aplica a mitad del día
+    """
+    DocumentSequence = apps.get_model('orders', 'DocumentSequence')
+    sources = [
+        ('ORD', apps.get_model('orders', 'Order'), 'order_number'),
+        ('FAC', apps.get_model('orders', 'Invoice'), 'invoice_number'),
+        ('OC', apps.get_model('orders', 'PurchaseOrder'), 'po_number'),
+    ]
+
+    last_values = {}
+    for prefix, model, field in sources:
+        numbers = model.objects.filter(**{f'{field}__startswith': f'{prefix}-'}).values_list(field, flat=True)
+        for number in numbers.iterator():
+            parts = number.split('-')
+            if len(parts) != 3 or not parts[2].isdigit():
+                continue
+            try:
+                date = datetime.strptime(parts[1], '%Y%m%d').date()
+            except ValueError:
+                continue
+            key = (prefix, date)
+            last_values[key] = max(last_values.get(key, 0), int(parts[2]))
+
+    DocumentSequence.objects.bulk_create([
+        DocumentSequence(prefix=prefix, date=date, last_value=last_value)
+        for (prefix, date), last_value in last_values.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Documentos',
+                'verbose_name_plural': 'Secuencias de Documentos',
+                'unique_together': {('prefix', 'date')},
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_documentsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at'], name='orders_invo_created_aa77cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at'], name='orders_paym_created_4b0957_idx'),
+        ),
+    ]
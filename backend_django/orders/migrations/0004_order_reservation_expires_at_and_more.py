@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_invoice_orders_invo_created_aa77cc_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reservation_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'reservation_expires_at'], name='orders_orde_status_adb568_idx'),
+        ),
+    ]
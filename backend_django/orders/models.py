@@ -85,6 +85,8 @@ class Order(models.Model):
     confirmed_at = models.DateTimeField(null=True, blank=True)
     shipped_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
+    # Mientras tenga valor, la orden mantiene stock reservado (ver orders.reservations)
+    reservation_expires_at = models.DateTimeField(null=True, blank=True)
     
     # Usuario que procesó la orden (para ventas en tienda)
     processed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='processed_orders')
@@ -96,6 +98,7 @@ class Order(models.Model):
             models.Index(fields=['customer']),
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'reservation_expires_at']),
         ]
     
     def __str__(self):
@@ -103,16 +106,9 @@ class Order(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number
-            from django.utils import timezone
-            date_str = timezone.now().strftime('%Y%m%d')
-            last_order = Order.objects.filter(order_number__startswith=f'ORD-{date_str}').order_by('-order_number').first()
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.order_number = f'ORD-{date_str}-{new_number:04d}'
+            # Número diario sin consultar el último emitido
+            from .numbering import next_document_number
+            self.order_number = next_document_number('ORD')
         super().save(*args, **kwargs)
 
 
@@ -203,6 +199,7 @@ class Payment(models.Model):
             models.Index(fields=['order']),
             models.Index(fields=['status']),
             models.Index(fields=['transaction_id']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
@@ -259,6 +256,7 @@ class Invoice(models.Model):
             models.Index(fields=['customer']),
             models.Index(fields=['status']),
             models.Index(fields=['due_date']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
@@ -266,16 +264,9 @@ class Invoice(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Generate invoice number
-            from django.utils import timezone
-            date_str = timezone.now().strftime('%Y%m%d')
-            last_invoice = Invoice.objects.filter(invoice_number__startswith=f'FAC-{date_str}').order_by('-invoice_number').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.invoice_number = f'FAC-{date_str}-{new_number:04d}'
+            # Número diario sin consultar el último emitido
+            from .numbering import next_document_number
+            self.invoice_number = next_document_number('FAC')
         super().save(*args, **kwargs)
 
 
@@ -327,16 +318,9 @@ class PurchaseOrder(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.po_number:
-            # Generate PO number
-            from django.utils import timezone
-            date_str = timezone.now().strftime('%Y%m%d')
-            last_po = PurchaseOrder.objects.filter(po_number__startswith=f'OC-{date_str}').order_by('-po_number').first()
-            if last_po:
-                last_number = int(last_po.po_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.po_number = f'OC-{date_str}-{new_number:04d}'
+            # Número diario sin consultar el último emitido
+            from .numbering import next_document_number
+            self.po_number = next_document_number('OC')
         super().save(*args, **kwargs)
 
 
@@ -421,4 +405,23 @@ class StockMovement(models.Model):
     
     def __str__(self):
         direction = "Entrada" if self.quantity > 0 else "Salida"
-        return f"{direction} - {self.product_variant} - {abs(self.quantity)} unidades"
\ No newline at end of file
+        return f"{direction} - {self.product_variant} - {abs(self.quantity)} unidades"
+
+
+class DocumentSequence(models.Model):
+    """
+    Contadores diarios para numerar órdenes, facturas y órdenes de compra
+    (ORD-YYYYMMDD-NNNN, FAC-..., OC-...). Se incrementan con orders.numbering
+    """
+    prefix = models.CharField(max_length=10)
+    date = models.DateField()
+    last_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['prefix', 'date']
+        verbose_name = 'Secuencia de Documentos'
+        verbose_name_plural = 'Secuencias de Documentos'
+    
+    def __str__(self):
+        return f"{self.prefix}-{self.date:%Y%m%d}: {self.last_value}"
@@ -0,0 +1,93 @@
+"""
+Asignación de números de documento (ORD-YYYYMMDD-NNNN, FAC-..., OC-...)
+
+Cada número sale de un contador diario en DocumentSequence que se incrementa
+con una sola sentencia INSERT ... ON CONFLICT DO UPDATE ... RETURNING, sin
+consultar el último documento emitido ni reintentar por claves duplicadas.
+
+El contador se incrementa en la conexión del llamador, dentro de su propio
+atomic(): si el llamador está en una transacción, la fila del día queda
+bloqueada hasta que esta termine y, si se revierte, el número vuelve a estar
+disponible. Por eso el checkout y las órdenes en bloque piden sus números
+antes de abrir su transacción: el incremento se confirma solo, la fila queda
+bloqueada únicamente durante esa sentencia y, si la orden falla, el número
+queda como hueco.
+
+Con DOCUMENT_NUMBER_BLOCK_SIZE > 1 cada proceso reserva bloques de números
+(solo fuera de transacciones) y los entrega desde memoria; los números
+reservados y no usados quedan como huecos.
+"""
+import threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def next_document_number(prefix):
+    """
+    Retorna el siguiente número de documento para prefix (p. ej. 'ORD')
+    """
+    return allocate_document_numbers(prefix, 1)[0]
+
+
+def allocate_document_numbers(prefix, count):
+    """
+    Reserva count números consecutivos del día para prefix
+    """
+    date = timezone.now().date()
+    block_size = getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 1)
+    connection = connections[DEFAULT_DB_ALIAS]
+
+    # Un bloque reservado en la transacción del llamador podría revertirse,
+    # así que solo se guardan bloques obtenidos en autocommit
+    if block_size <= 1 or count >= block_size or connection.in_atomic_block:
+        end = _increment(connection, prefix, date, count)
+        return _format_range(prefix, date, end - count + 1, end)
+
+    key = (prefix, date)
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block is None or block[1] - block[0] + 1 < count:
+            end = _increment(connection, prefix, date, block_size)
+            block = [end - block_size + 1, end]
+            # Descartar bloques de días anteriores
+            for stale_key in [k for k in _blocks if k[0] == prefix and k[1] != date]:
+                del _blocks[stale_key]
+        start = block[0]
+        block[0] += count
+        _blocks[key] = block
+
+    return _format_range(prefix, date, start, start + count - 1)
+
+
+def _format_range(prefix, date, start, end):
+    date_str = date.strftime('%Y%m%d')
+    return [f'{prefix}-{date_str}-{number:04d}' for number in range(start, end + 1)]
+
+
+def _increment(connection, prefix, date, count):
+    """
+    Suma count al contador del día y retorna el nuevo último valor
+    """
+    from .models import DocumentSequence
+
+    qn = connection.ops.quote_name
+    table = qn(DocumentSequence._meta.db_table)
+    sql = (
+        f'INSERT INTO {table} ({qn("prefix")}, {qn("date")}, {qn("last_value")}, {qn("updated_at")}) '
+        f'VALUES (%s, %s, %s, %s) '
+        f'ON CONFLICT ({qn("prefix")}, {qn("date")}) DO UPDATE SET '
+        f'{qn("last_value")} = {table}.{qn("last_value")} + EXCLUDED.{qn("last_value")}, '
+        f'{qn("updated_at")} = EXCLUDED.{qn("updated_at")} '
+        f'RETURNING {qn("last_value")}'
+    )
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(sql, [prefix, date, count, timezone.now()])
+        return cursor.fetchone()[0]
+
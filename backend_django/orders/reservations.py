@@ -0,0 +1,320 @@
+"""
+Reserva atómica de stock para el checkout
+
+El stock de cada variante se reserva con un único UPDATE condicional para
+todas las líneas de la orden:
+
+    UPDATE variant SET reserved_quantity = reserved_quantity + <n>
+    WHERE id IN (...) AND stock_quantity - reserved_quantity >= <n>
+
+(<n> es un CASE por variante). Si alguna línea no tiene stock se actualizan
+menos filas de las esperadas y toda la transacción se revierte, por lo que
+nunca se vende por encima del stock disponible aunque haya checkouts
+concurrentes de la misma variante.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from cart.totals import clear_cart
+from products.models import ProductVariant
+from products.stock import refresh_product_stock
+from .models import Order, OrderItem, StockMovement
+from .numbering import next_document_number
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationError(Exception):
+    """
+    La orden no se puede reservar, confirmar o liberar
+    """
+
+
+class InsufficientStockError(ReservationError):
+    """
+    Una o más variantes no tienen stock disponible suficiente
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__('Stock insuficiente para: ' + ', '.join(line['sku_variant'] for line in lines))
+
+
+def quantity_case(quantities):
+    """
+    Expresión CASE con la cantidad de cada variante ({variant_id: n}), para
+    actualizar varias variantes con un solo UPDATE
+    """
+    return Case(
+        *[When(id=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def variant_details(variant):
+    """
+    Talla, color y SKU de la variante para el histórico de OrderItem
+    """
+    return {
+        'size': str(variant.size) if variant.size else None,
+        'color': str(variant.color) if variant.color else None,
+        'sku_variant': variant.sku_variant
+    }
+
+
+class StockReservationService:
+    """
+    Convierte carritos en órdenes con stock reservado y administra el ciclo
+    de vida de la reserva:
+    - reserve_cart: crea la orden 'pending' y reserva el stock
+    - confirm_order: descuenta el stock reservado (venta) y registra StockMovement
+    - release_order: cancela la orden y libera la reserva
+    - expire_reservations: libera las reservas vencidas (proceso en segundo plano)
+    """
+
+    # Órdenes vencidas que se liberan por lote
+    EXPIRE_BATCH_SIZE = 500
+
+    @property
+    def reservation_minutes(self):
+        return getattr(settings, 'STOCK_RESERVATION_MINUTES', 15)
+
+    def reserve_cart(self, cart, user, shipping_address=None, billing_address=None, notes=None, shipping_cost=0):
+        """
+        Crea una orden con las líneas del carrito y reserva su stock
+        """
+        cart_items = list(cart.items.select_related('product', 'product_variant'))
+        if not cart_items:
+            raise ReservationError('El carrito está vacío')
+
+        variants = self._resolve_variants(cart_items)
+
+        lines = []
+        for item in cart_items:
+            variant = variants[item.id]
+            unit_price = item.unit_price + variant.price_adjustment
+            lines.append({
+                'product': item.product,
+                'variant': variant,
+                'quantity': item.quantity,
+                'unit_price': unit_price,
+                'total_price': unit_price * item.quantity,
+            })
+
+        subtotal = sum((line['total_price'] for line in lines), Decimal('0'))
+        shipping_cost = Decimal(str(shipping_cost or 0))
+
+        # Fuera de la transacción: el contador del día no queda bloqueado
+        # durante todo el checkout (ver orders.numbering)
+        order_number = next_document_number('ORD')
+
+        with transaction.atomic():
+            self._reserve(self._quantities(lines))
+
+            order = Order.objects.create(
+                order_number=order_number,
+                customer=user,
+                order_type='online',
+                status='pending',
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                total_amount=subtotal + shipping_cost,
+                shipping_address=shipping_address or {},
+                billing_address=billing_address or {},
+                notes=notes,
+                reservation_expires_at=timezone.now() + timedelta(minutes=self.reservation_minutes)
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=line['product'],
+                    product_variant=line['variant'],
+                    quantity=line['quantity'],
+                    unit_price=line['unit_price'],
+                    total_price=line['total_price'],
+                    product_name=line['product'].name,
+                    product_sku=line['product'].sku,
+                    variant_details=variant_details(line['variant'])
+                )
+                for line in lines
+            ])
+
+            clear_cart(cart)
+            refresh_product_stock({line['product'].id for line in lines})
+
+        logger.info(f"Orden {order.order_number} creada con stock reservado hasta {order.reservation_expires_at}")
+        return order
+
+    def confirm_order(self, order, user=None):
+        """
+        Convierte la reserva en venta: descuenta stock y reservado y registra
+        los movimientos de inventario
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            claimed = Order.objects.filter(
+                id=order.id, status='pending', reservation_expires_at__isnull=False
+            ).update(status='confirmed', confirmed_at=now, reservation_expires_at=None, updated_at=now)
+            if not claimed:
+                raise ReservationError(f'La orden {order.order_number} no tiene una reserva activa')
+
+            quantities = self._order_quantities([order.id])
+            requested = quantity_case(quantities)
+            updated = ProductVariant.objects.filter(
+                id__in=quantities,
+                reserved_quantity__gte=requested,
+                stock_quantity__gte=requested
+            ).update(
+                stock_quantity=F('stock_quantity') - requested,
+                reserved_quantity=F('reserved_quantity') - requested
+            )
+            if updated != len(quantities):
+                raise ReservationError(f'La reserva de la orden {order.order_number} no coincide con el stock')
+
+            variants = ProductVariant.objects.filter(id__in=quantities).values_list('id', 'product_id', 'stock_quantity')
+            movements = []
+            product_ids = set()
+            for variant_id, product_id, new_stock in variants:
+                product_ids.add(product_id)
+                movements.append(StockMovement(
+                    product_variant_id=variant_id,
+                    movement_type='sale',
+                    quantity=-quantities[variant_id],
+                    previous_stock=new_stock + quantities[variant_id],
+                    new_stock=new_stock,
+                    order_id=order.id,
+                    reference_number=order.order_number,
+                    created_by=user
+                ))
+            StockMovement.objects.bulk_create(movements)
+            refresh_product_stock(product_ids)
+
+        order.status = 'confirmed'
+        order.confirmed_at = now
+        order.reservation_expires_at = None
+        return order
+
+    def release_order(self, order, reason=None):
+        """
+        Cancela una orden pendiente y libera su stock reservado
+        """
+        with transaction.atomic():
+            claimed = Order.objects.filter(
+                id=order.id, status='pending', reservation_expires_at__isnull=False
+            ).update(status='cancelled', reservation_expires_at=None, updated_at=timezone.now())
+            if not claimed:
+                raise ReservationError(f'La orden {order.order_number} no tiene una reserva activa')
+            self._release(self._order_quantities([order.id]))
+
+        if reason:
+            logger.info(f"Reserva de la orden {order.order_number} liberada: {reason}")
+        order.status = 'cancelled'
+        order.reservation_expires_at = None
+        return order
+
+    def expire_reservations(self):
+        """
+        Libera las reservas vencidas por lotes. Retorna el número de órdenes
+        canceladas. Seguro con varios procesos ejecutándose a la vez.
+        """
+        total = 0
+        while True:
+            with transaction.atomic():
+                order_ids = list(Order.objects.select_for_update(skip_locked=True).filter(
+                    status='pending',
+                    reservation_expires_at__lt=timezone.now()
+                ).order_by('reservation_expires_at').values_list('id', flat=True)[:self.EXPIRE_BATCH_SIZE])
+                if not order_ids:
+                    break
+
+                Order.objects.filter(id__in=order_ids).update(
+                    status='cancelled', reservation_expires_at=None, updated_at=timezone.now()
+                )
+                self._release(self._order_quantities(order_ids))
+            total += len(order_ids)
+
+        if total:
+            logger.info(f"{total} reservas de stock vencidas liberadas")
+        return total
+
+    def _reserve(self, quantities):
+        requested = quantity_case(quantities)
+        updated = ProductVariant.objects.filter(
+            id__in=quantities,
+            is_active=True,
+            stock_quantity__gte=F('reserved_quantity') + requested
+        ).update(reserved_quantity=F('reserved_quantity') + requested)
+
+        if updated != len(quantities):
+            shortages = [
+                {
+                    'product_variant_id': str(variant.id),
+                    'sku_variant': variant.sku_variant,
+                    'requested': quantities[variant.id],
+                    'available': variant.available_stock if variant.is_active else 0,
+                }
+                for variant in ProductVariant.objects.filter(id__in=quantities)
+                if not variant.is_active or variant.available_stock < quantities[variant.id]
+            ]
+            raise InsufficientStockError(shortages)
+
+    def _release(self, quantities):
+        if not quantities:
+            return
+        requested = quantity_case(quantities)
+        ProductVariant.objects.filter(id__in=quantities).update(
+            reserved_quantity=Greatest(F('reserved_quantity') - requested, Value(0))
+        )
+        refresh_product_stock(
+            ProductVariant.objects.filter(id__in=quantities).values_list('product_id', flat=True).distinct()
+        )
+
+    @staticmethod
+    def _quantities(lines):
+        quantities = {}
+        for line in lines:
+            quantities[line['variant'].id] = quantities.get(line['variant'].id, 0) + line['quantity']
+        return quantities
+
+    @staticmethod
+    def _order_quantities(order_ids):
+        return {
+            row['product_variant']: row['quantity']
+            for row in OrderItem.objects.filter(
+                order_id__in=order_ids, product_variant__isnull=False
+            ).values('product_variant').annotate(quantity=Sum('quantity')).order_by()
+        }
+
+    @staticmethod
+    def _resolve_variants(cart_items):
+        """
+        Variante de cada línea: la elegida en el carrito o, si el producto
+        tiene una sola variante activa, esa
+        """
+        pending = {item.product_id for item in cart_items if item.product_variant_id is None}
+        single_variants = {}
+        if pending:
+            by_product = {}
+            for variant in ProductVariant.objects.filter(product_id__in=pending, is_active=True):
+                by_product.setdefault(variant.product_id, []).append(variant)
+            single_variants = {
+                product_id: variants[0] for product_id, variants in by_product.items() if len(variants) == 1
+            }
+
+        variants = {}
+        for item in cart_items:
+            variant = item.product_variant or single_variants.get(item.product_id)
+            if variant is None:
+                raise ReservationError(f'Seleccione talla/color para {item.product.name}')
+            variants[item.id] = variant
+
+        # Tallas/colores para el histórico de la orden
+        related = ProductVariant.objects.select_related('size', 'color').in_bulk(
+            {variant.id for variant in variants.values()}
+        )
+        return {item_id: related[variant.id] for item_id, variant in variants.items()}
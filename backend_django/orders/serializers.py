@@ -20,6 +20,8 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        # La reserva solo la administra orders.reservations
+        read_only_fields = ['reservation_expires_at']
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -33,4 +35,41 @@ class PaymentSerializer(serializers.ModelSerializer):
 class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class BulkOrderItemSerializer(serializers.Serializer):
+    product_variant_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1)
+    # Por defecto: precio del producto + ajuste de la variante
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+
+
+class BulkPaymentSerializer(serializers.Serializer):
+    payment_method_id = serializers.UUIDField()
+    # Por defecto: total de la orden
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    status = serializers.ChoiceField(choices=['pending', 'completed'], default='completed')
+    transaction_id = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    reference_number = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    """
+    Una orden de la creación masiva (ver orders.bulk_orders). Las órdenes se
+    crean confirmadas, por eso no se aceptan los estados pending/cancelled/refunded.
+    """
+    customer_id = serializers.IntegerField()
+    order_type = serializers.ChoiceField(choices=Order.ORDER_TYPES, default='in_store')
+    status = serializers.ChoiceField(choices=['confirmed', 'processing', 'shipped', 'delivered'], default='confirmed')
+    tax_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    shipping_cost = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    shipping_address = serializers.JSONField(required=False)
+    billing_address = serializers.JSONField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    items = BulkOrderItemSerializer(many=True, allow_empty=False, max_length=500)
+    payments = BulkPaymentSerializer(many=True, required=False, max_length=10)
+
+
+class BulkOrderCreateSerializer(serializers.Serializer):
+    orders = BulkOrderSerializer(many=True, allow_empty=False, max_length=100)
@@ -7,4 +7,7 @@ router.register(r'orders', views.OrderViewSet)
 router.register(r'payments', views.PaymentViewSet)
 router.register(r'invoices', views.InvoiceViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('checkout/', views.checkout, name='checkout'),
+    path('bulk/', views.bulk_create_orders, name='bulk-create-orders'),
+] + router.urls
@@ -1,21 +1,166 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import render
+from cart.models import Cart
 from .models import Order, Payment, Invoice
-from .serializers import OrderSerializer, PaymentSerializer, InvoiceSerializer
+from .serializers import OrderSerializer, PaymentSerializer, InvoiceSerializer, BulkOrderCreateSerializer
+from .reservations import StockReservationService, ReservationError, InsufficientStockError
+from .bulk_orders import BulkOrderService, BulkOrderError
+from core.pagination import OptInCursorPagination
+
+STAFF_ROLES = ('admin', 'manager', 'employee')
+
+
+def is_staff_user(user):
+    return user.is_superuser or user.role in STAFF_ROLES
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = OptInCursorPagination
+    
+    @staticmethod
+    def _has_active_reservation(order):
+        return order.status == 'pending' and order.reservation_expires_at is not None
+    
+    def update(self, request, *args, **kwargs):
+        # El estado de una orden con stock reservado solo cambia con confirm/ o
+        # cancel/, que descuentan o liberan la reserva
+        order = self.get_object()
+        if self._has_active_reservation(order) and request.data.get('status', order.status) != order.status:
+            return Response(
+                {'error': 'La orden tiene stock reservado: usa confirm/ o cancel/ para cambiar su estado'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return super().update(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if self._has_active_reservation(instance):
+                try:
+                    StockReservationService().release_order(instance, reason='orden eliminada')
+                except ReservationError:
+                    # Ya liberada (vencida o cancelada) por otro proceso
+                    pass
+            instance.delete()
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """
+        Confirma el pago: el stock reservado se descuenta como venta
+        POST /api/orders/orders/<id>/confirm/
+        """
+        if not is_staff_user(request.user):
+            return Response({'error': 'Solo el personal puede confirmar órdenes'}, status=status.HTTP_403_FORBIDDEN)
+        
+        order = self.get_object()
+        try:
+            StockReservationService().confirm_order(order, user=request.user)
+        except ReservationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(order).data)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Cancela una orden pendiente y libera su stock reservado
+        POST /api/orders/orders/<id>/cancel/
+        """
+        order = self.get_object()
+        if order.customer_id != request.user.id and not is_staff_user(request.user):
+            return Response({'error': 'No puede cancelar esta orden'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            StockReservationService().release_order(order, reason=request.data.get('reason'))
+        except ReservationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(order).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def checkout(request):
+    """
+    Convierte el carrito del usuario en una orden con stock reservado
+    POST /api/orders/checkout/
+    Body: {
+        "cart_id": "<uuid>" (opcional, por defecto el carrito más reciente),
+        "shipping_address": {...}, "billing_address": {...},
+        "notes": "...", "shipping_cost": 0
+    }
+    La reserva vence a los STOCK_RESERVATION_MINUTES si no se confirma.
+    """
+    carts = Cart.objects.filter(user=request.user)
+    cart_id = request.data.get('cart_id')
+    cart = carts.filter(id=cart_id).first() if cart_id else carts.order_by('-updated_at').first()
+    if cart is None:
+        return Response({'error': 'Carrito no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        order = StockReservationService().reserve_cart(
+            cart,
+            request.user,
+            shipping_address=request.data.get('shipping_address'),
+            billing_address=request.data.get('billing_address'),
+            notes=request.data.get('notes'),
+            shipping_cost=request.data.get('shipping_cost', 0)
+        )
+    except InsufficientStockError as e:
+        return Response({'error': str(e), 'lines': e.lines}, status=status.HTTP_409_CONFLICT)
+    except ReservationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_orders(request):
+    """
+    Crea varias órdenes confirmadas en una sola transacción (ventas en
+    tienda, importaciones). Solo personal.
+    POST /api/orders/bulk/
+    Body: {
+        "orders": [{
+            "customer_id": 1, "order_type": "in_store", "status": "confirmed",
+            "items": [{"product_variant_id": "<uuid>", "quantity": 2, "unit_price": 10.5}],
+            "payments": [{"payment_method_id": "<uuid>", "amount": 21.0}]
+        }]
+    }
+    """
+    if not is_staff_user(request.user):
+        return Response({'error': 'Solo el personal puede crear órdenes en bloque'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = BulkOrderCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    try:
+        orders = BulkOrderService().create_orders(serializer.validated_data['orders'], user=request.user)
+    except InsufficientStockError as e:
+        return Response({'error': str(e), 'lines': e.lines}, status=status.HTTP_409_CONFLICT)
+    except BulkOrderError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'created': len(orders),
+        'orders': [
+            {'id': str(order.id), 'order_number': order.order_number, 'total_amount': order.total_amount}
+            for order in orders
+        ]
+    }, status=status.HTTP_201_CREATED)
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = OptInCursorPagination
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
-    serializer_class = InvoiceSerializer
\ No newline at end of file
+    serializer_class = InvoiceSerializer
+    pagination_class = OptInCursorPagination
\ No newline at end of file
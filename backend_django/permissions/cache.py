@@ -0,0 +1,98 @@
+"""
+Permisos efectivos por usuario, cacheados como frozenset de codenames
+
+Los permisos efectivos de un usuario son los permisos activos de sus roles
+activos más sus permisos directos activos (PermissionUserRole). Se resuelven
+con una sola consulta y se guardan en cache bajo una clave versionada:
+
+    perms:<versión global>:<user_id>:<versión del usuario>
+
+- Cambios en Role, Permission o en los permisos de un rol cambian la versión
+  global (afectan a cualquier usuario)
+- Cambios en UserRole o PermissionUserRole cambian la versión del usuario
+
+Las versiones viven en la base de datos (PermissionVersion) y se incrementan
+en la misma transacción que el cambio (ver permissions.signals). Cada lectura
+consulta las versiones, así que la cache puede ser local a cada proceso: un
+worker nunca usa una clave anterior a un cambio ya confirmado.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+GLOBAL_SCOPE = 'global'
+
+
+def _user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def query_effective_permissions(user):
+    """
+    Permisos efectivos (Permission) del usuario en una sola consulta
+    """
+    from .models import Permission
+
+    return Permission.objects.filter(is_active=True).filter(
+        Q(roles__is_active=True, roles__user_roles__user=user, roles__user_roles__is_active=True) |
+        Q(direct_user_permissions__user=user, direct_user_permissions__is_active=True)
+    ).distinct()
+
+
+def get_effective_permissions(user):
+    """
+    frozenset con los codenames de los permisos efectivos del usuario. Se
+    memoriza también en la instancia, para que varias comprobaciones en la
+    misma solicitud no vuelvan a consultar la cache.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    codenames = getattr(user, '_effective_permissions', None)
+    if codenames is not None:
+        return codenames
+
+    from .models import PermissionVersion
+
+    versions = dict(PermissionVersion.objects.filter(
+        scope__in=[GLOBAL_SCOPE, _user_scope(user.pk)]
+    ).values_list('scope', 'version'))
+    key = f'perms:{versions.get(GLOBAL_SCOPE, 0)}:{user.pk}:{versions.get(_user_scope(user.pk), 0)}'
+    codenames = cache.get(key)
+    if codenames is None:
+        codenames = frozenset(query_effective_permissions(user).values_list('codename', flat=True))
+        cache.set(key, codenames, getattr(settings, 'PERMISSION_CACHE_SECONDS', 3600))
+
+    user._effective_permissions = codenames
+    return codenames
+
+
+def _bump(scope):
+    """
+    Incrementa la versión dentro de la transacción en curso (la fila queda
+    bloqueada hasta confirmarla, así dos cambios concurrentes no se pisan)
+    """
+    from .models import PermissionVersion
+
+    with transaction.atomic():
+        if PermissionVersion.objects.filter(scope=scope).update(version=F('version') + 1):
+            return
+        _, created = PermissionVersion.objects.get_or_create(scope=scope, defaults={'version': 1})
+        if not created:
+            # Otro proceso la creó entre el UPDATE y el INSERT
+            PermissionVersion.objects.filter(scope=scope).update(version=F('version') + 1)
+
+
+def invalidate_user_permissions(user_id):
+    """
+    Invalida los permisos cacheados de un usuario
+    """
+    _bump(_user_scope(user_id))
+
+
+def invalidate_all_permissions():
+    """
+    Invalida los permisos cacheados de todos los usuarios
+    """
+    _bump(GLOBAL_SCOPE)
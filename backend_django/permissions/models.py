@@ -129,3 +129,15 @@ class PermissionUserRole(models.Model):
     
     def __str__(self):
         return f"{self.user.email} - {self.permission.name}"
+
+
+class PermissionVersion(models.Model):
+    """
+    Versión de los permisos efectivos cacheados (ver permissions.cache).
+    scope: 'global' (roles y permisos) o 'user:<id>' (asignaciones del usuario)
+    """
+    scope = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.scope} - v{self.version}"
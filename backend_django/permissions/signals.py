@@ -0,0 +1,29 @@
+"""
+Señales que invalidan los permisos efectivos cacheados (ver permissions.cache)
+"""
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .cache import invalidate_all_permissions, invalidate_user_permissions
+from .models import Permission, Role, UserRole, PermissionUserRole
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+@receiver(post_save, sender=PermissionUserRole)
+@receiver(post_delete, sender=PermissionUserRole)
+def invalidate_user_permissions_on_assignment_change(sender, instance, **kwargs):
+    invalidate_user_permissions(instance.user_id)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permissions_on_role_change(sender, **kwargs):
+    invalidate_all_permissions()
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def invalidate_permissions_on_role_permissions_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_all_permissions()
@@ -0,0 +1,52 @@
+"""
+Corrige diferencias entre los contadores de stock de Product y sus variantes
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from products.models import Product
+from products.stock import stock_expressions, refresh_product_stock
+
+
+class Command(BaseCommand):
+    help = 'Recalcula total_stock / available_stock de los productos con diferencias'
+
+    BATCH_SIZE = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reportar las diferencias, sin corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        total, available = stock_expressions()
+        drifted = Product.objects.annotate(
+            expected_total=total,
+            expected_available=available
+        ).filter(
+            ~Q(total_stock=F('expected_total')) | ~Q(available_stock=F('expected_available'))
+        ).order_by()
+
+        self.stdout.write(self.style.WARNING('📦 Buscando diferencias de stock...'))
+
+        product_ids = []
+        for row in drifted.values('id', 'sku', 'total_stock', 'expected_total', 'available_stock', 'expected_available').iterator():
+            product_ids.append(row['id'])
+            self.stdout.write(
+                f"  {row['sku']}: total {row['total_stock']} -> {row['expected_total']}, "
+                f"disponible {row['available_stock']} -> {row['expected_available']}"
+            )
+
+        if not product_ids:
+            self.stdout.write(self.style.SUCCESS('✅ Sin diferencias'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'⚠️ {len(product_ids)} productos con diferencias (sin cambios)'))
+            return
+
+        for start in range(0, len(product_ids), self.BATCH_SIZE):
+            refresh_product_stock(product_ids[start:start + self.BATCH_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(product_ids)} productos corregidos'))
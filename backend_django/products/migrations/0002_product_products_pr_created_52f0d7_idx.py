@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at'], name='products_pr_created_52f0d7_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_stock_counters(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+
+    variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    total = variants.annotate(value=Sum('stock_quantity')).values('value')
+    available = variants.annotate(
+        value=Sum(Greatest(F('stock_quantity') - F('reserved_quantity'), Value(0)))
+    ).values('value')
+    Product.objects.update(
+        total_stock=Coalesce(Subquery(total), Value(0)),
+        available_stock=Coalesce(Subquery(available), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_products_pr_created_52f0d7_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_stock',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['total_stock'], name='products_pr_total_s_768f00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available_stock'], name='products_pr_availab_737724_idx'),
+        ),
+        migrations.RunPython(populate_stock_counters, migrations.RunPython.noop),
+    ]
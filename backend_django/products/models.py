@@ -116,6 +116,8 @@ class Product(models.Model):
         ('kids', 'Niños'),
     ]
     
+    STOCK_COUNTER_FIELDS = ('total_stock', 'available_stock')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -137,6 +139,10 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     is_featured = models.BooleanField(default=False)
     is_on_sale = models.BooleanField(default=False)
+    # Stock agregado de las variantes, mantenido por products.stock
+    # (save() no los escribe al actualizar)
+    total_stock = models.IntegerField(default=0)
+    available_stock = models.IntegerField(default=0)  # Total - reservado
     season = models.CharField(max_length=20, blank=True, null=True)
     meta_title = models.CharField(max_length=255, blank=True, null=True)
     meta_description = models.TextField(blank=True, null=True)
@@ -153,16 +159,14 @@ class Product(models.Model):
             models.Index(fields=['brand']),
             models.Index(fields=['is_featured']),
             models.Index(fields=['target_gender']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['total_stock']),
+            models.Index(fields=['available_stock']),
         ]
     
     def __str__(self):
         return f"{self.name} - {self.sku}"
     
-    @property
-    def total_stock(self):
-        """Obtener stock total de todas las variantes"""
-        return sum(variant.stock_quantity for variant in self.variants.all())
-    
     @property
     def is_in_stock(self):
         return self.total_stock > 0
@@ -178,6 +182,18 @@ class Product(models.Model):
         if not self.sku:
             # Auto-generate SKU if not provided
             self.sku = f"PROD-{uuid.uuid4().hex[:8].upper()}"
+        if not self._state.adding:
+            # Los contadores de stock solo los escribe
+            # products.stock.refresh_product_stock: un save() con valores
+            # cargados antes de un checkout no debe pisarlos
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields if not field.primary_key
+                ]
+            kwargs['update_fields'] = [
+                name for name in update_fields if name not in self.STOCK_COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
 
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Product, Category, Brand, Size, Color, ProductVariant, Supplier
 
@@ -35,7 +36,10 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(serializers.ModelSerializer):
+    """
+    Producto completo (categoría, marca, tallas, colores y variantes)
+    """
     category = CategorySerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
     sizes = SizeSerializer(many=True, read_only=True)
@@ -45,6 +49,56 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['total_stock', 'available_stock']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Carga todo el árbol en un número fijo de consultas
+        """
+        return queryset.select_related('category', 'brand').prefetch_related(
+            'sizes',
+            'colors',
+            Prefetch('variants', queryset=ProductVariant.objects.select_related('size', 'color'))
+        )
+
+
+class ProductCardSerializer(serializers.ModelSerializer):
+    """
+    Tarjeta de producto para listados (sin relaciones anidadas)
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    brand_name = serializers.CharField(source='brand.name', read_only=True, default=None)
+    image = serializers.SerializerMethodField()
+    is_in_stock = serializers.BooleanField(read_only=True)
+    discount_percentage = serializers.IntegerField(read_only=True)
+    
+    # Columnas de Product que necesita la tarjeta
+    CARD_FIELDS = (
+        'id', 'name', 'sku', 'price', 'compare_at_price', 'images', 'status',
+        'is_featured', 'is_on_sale', 'target_gender', 'total_stock', 'available_stock', 'created_at',
+        'category', 'category__name', 'brand', 'brand__name',
+    )
+    
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'sku', 'price', 'compare_at_price', 'discount_percentage',
+            'category', 'category_name', 'brand_name', 'image', 'status',
+            'is_featured', 'is_on_sale', 'target_gender', 'total_stock',
+            'available_stock', 'is_in_stock', 'created_at',
+        ]
+    
+    def get_image(self, obj):
+        return obj.images[0] if obj.images else None
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Una sola consulta leyendo solo las columnas usadas (el stock viene de
+        los contadores de Product)
+        """
+        return queryset.select_related('category', 'brand').only(*cls.CARD_FIELDS)
 
 
 class SupplierSerializer(serializers.ModelSerializer):
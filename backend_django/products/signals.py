@@ -0,0 +1,24 @@
+"""
+Señales para mantener los contadores de stock de Product
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from orders.models import StockMovement
+from .models import ProductVariant
+from .stock import refresh_product_stock
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def update_product_stock_on_variant_change(sender, instance, **kwargs):
+    refresh_product_stock([instance.product_id])
+
+
+@receiver(post_save, sender=StockMovement)
+def update_product_stock_on_movement(sender, instance, created, **kwargs):
+    # Cubre cambios de stock hechos con update() sobre las variantes
+    if created:
+        product_ids = ProductVariant.objects.filter(
+            id=instance.product_variant_id
+        ).values_list('product_id', flat=True)
+        refresh_product_stock(product_ids)
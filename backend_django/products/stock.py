@@ -0,0 +1,46 @@
+"""
+Contadores de stock agregados en Product (total_stock / available_stock)
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Product, ProductVariant
+
+# Se envía cada vez que cambian los contadores de stock (product_ids=[...]),
+# incluidos los cambios hechos con update()/bulk_create en los servicios
+stock_changed = Signal()
+
+
+def stock_expressions():
+    """
+    Expresiones (total, disponible) calculadas desde las variantes de cada
+    producto, para usar en update() o annotate() sobre Product
+    """
+    variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    total = variants.annotate(value=Sum('stock_quantity')).values('value')
+    available = variants.annotate(
+        value=Sum(Greatest(F('stock_quantity') - F('reserved_quantity'), Value(0)))
+    ).values('value')
+    return Coalesce(Subquery(total), Value(0)), Coalesce(Subquery(available), Value(0))
+
+
+def refresh_product_stock(product_ids):
+    """
+    Recalcula total_stock y available_stock de los productos indicados con un
+    solo UPDATE. Las filas de Product se bloquean antes (en orden, para evitar
+    deadlocks) de modo que dos transacciones que cambian variantes del mismo
+    producto no se pisen el resultado.
+    """
+    product_ids = sorted({product_id for product_id in product_ids if product_id}, key=str)
+    if not product_ids:
+        return 0
+
+    total, available = stock_expressions()
+    with transaction.atomic():
+        products = Product.objects.filter(id__in=product_ids)
+        list(products.select_for_update().order_by('id').values_list('id', flat=True))
+        updated = products.update(total_stock=total, available_stock=available)
+
+    stock_changed.send(sender=Product, product_ids=product_ids)
+    return updated
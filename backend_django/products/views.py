@@ -2,9 +2,11 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from core.pagination import OptInCursorPagination
 from .models import Product, Category, Brand, ProductVariant, Supplier
 from .serializers import (
-    ProductSerializer, 
+    ProductDetailSerializer,
+    ProductCardSerializer,
     CategorySerializer, 
     BrandSerializer, 
     ProductVariantSerializer,
@@ -13,15 +15,32 @@ from .serializers import (
 
 
 class ProductViewSet(viewsets.ModelViewSet):
+    """
+    Productos. El listado acepta ?view=card para tarjetas planas
+    (ProductCardSerializer); por defecto retorna el árbol completo.
+    ?pagination=cursor activa la paginación por cursor sobre created_at.
+    """
     queryset = Product.objects.all()
-    serializer_class = ProductSerializer
+    serializer_class = ProductDetailSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    
+    def is_card_view(self):
+        return self.action == 'list' and self.request.query_params.get('view') == 'card'
+    
+    def get_serializer_class(self):
+        if self.is_card_view():
+            return ProductCardSerializer
+        return ProductDetailSerializer
     
     def get_queryset(self):
         queryset = Product.objects.all()
         category = self.request.query_params.get('category', None)
         if category:
             queryset = queryset.filter(category__name__icontains=category)
+        if self.action in ('list', 'retrieve'):
+            # Consultas constantes por página, sin N+1 en las relaciones
+            queryset = self.get_serializer_class().setup_eager_loading(queryset)
         return queryset
 
 
@@ -4,10 +4,10 @@ from .models import ReportLog
 
 @admin.register(ReportLog)
 class ReportLogAdmin(admin.ModelAdmin):
-    list_display = ['user', 'report_type', 'input_type', 'results_count', 'success', 'created_at']
-    list_filter = ['report_type', 'input_type', 'success', 'created_at']
+    list_display = ['user', 'report_type', 'input_type', 'results_count', 'status', 'success', 'created_at']
+    list_filter = ['report_type', 'input_type', 'status', 'success', 'created_at']
     search_fields = ['user__email', 'original_prompt', 'transcription']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
     
     fieldsets = (
         ('Usuario', {
@@ -20,9 +20,9 @@ class ReportLogAdmin(admin.ModelAdmin):
             'fields': ('generated_sql', 'sql_params')
         }),
         ('Resultados', {
-            'fields': ('report_type', 'results_count', 'export_format', 'file_path')
+            'fields': ('report_type', 'results_count', 'export_format', 'include_chart', 'file_path')
         }),
         ('Metadata', {
-            'fields': ('execution_time', 'tokens_used', 'success', 'error_message', 'created_at')
+            'fields': ('status', 'execution_time', 'stage_timings', 'tokens_used', 'success', 'error_message', 'created_at', 'started_at', 'completed_at')
         }),
     )
@@ -318,9 +318,12 @@ Responde SOLO con el JSON, sin texto adicional."""
         
         return True
     
-    def generate_report_summary(self, prompt: str, results: List[Dict]) -> str:
+    def generate_report_summary(self, prompt: str, results: List[Dict], total_count: Optional[int] = None) -> str:
         """
         Genera un resumen narrativo del reporte usando IA
+        
+        results pueden ser solo las primeras filas; total_count es el total
+        del reporte si se conoce (None = más filas que las recibidas)
         """
         
         system_message = """Eres un analista de datos experto. 
@@ -329,10 +332,13 @@ Responde SOLO con el JSON, sin texto adicional."""
         Usa un tono profesional pero accesible."""
         
         results_preview = results[:10] if len(results) > 10 else results
+        if total_count is None and len(results) <= len(results_preview):
+            total_count = len(results)
+        total_text = f"{total_count} total" if total_count is not None else f"más de {len(results)}"
         
         user_message = f"""Prompt original: "{prompt}"
 
-Resultados (primeros {len(results_preview)} de {len(results)} total):
+Resultados (primeros {len(results_preview)} de {total_text}):
 {json.dumps(results_preview, indent=2, default=str)}
 
 Genera un resumen ejecutivo."""
@@ -351,4 +357,4 @@ Genera un resumen ejecutivo."""
             return chat_completion.choices[0].message.content
             
         except Exception as e:
-            return f"Reporte generado con {len(results)} resultados."
+            return f"Reporte generado con {total_count if total_count is not None else len(results)} resultados."
@@ -3,11 +3,19 @@ Servicios para exportar reportes a PDF y Excel
 """
 
 import os
-from typing import List, Dict, Any
-from datetime import datetime
+import json
+import uuid
+import tempfile
+from concurrent.futures import Future
+from typing import List, Dict, Any, Iterable, BinaryIO
+from datetime import date, datetime
+from itertools import chain, islice
 import pandas as pd
 from io import BytesIO
 
+from django.conf import settings
+from django.utils import timezone
+
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -26,131 +34,213 @@ class ReportExporter:
     Clase para exportar reportes a diferentes formatos
     """
     
+    # Filas usadas para estimar el ancho de las columnas del Excel
+    EXCEL_WIDTH_SAMPLE_ROWS = 200
+    
+    # Tamaño a partir del cual los archivos temporales pasan de memoria a disco
+    SPOOL_MAX_BYTES = 5 * 1024 * 1024
+    
+    # Filas por bloque de la tabla del PDF (aprox. una página en A4 horizontal)
+    PDF_TABLE_CHUNK_ROWS = 40
+    
+    @staticmethod
+    def _cell_value(value):
+        """
+        Valor compatible con Excel (sin zona horaria, sin UUID ni JSON)
+        """
+        if isinstance(value, datetime) and timezone.is_aware(value):
+            return timezone.make_naive(value)
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str, ensure_ascii=False)
+        return value
+    
     @staticmethod
-    def to_excel(data: List[Dict], filename: str, report_metadata: Dict = None) -> BytesIO:
+    def _resolve_metadata(report_metadata):
+        """
+        Metadata con los valores diferidos ya resueltos: un valor puede ser un
+        Future (p. ej. el resumen de IA que se genera en paralelo) y solo se
+        espera cuando el exportador lo necesita
+        """
+        if not report_metadata:
+            return report_metadata
+        return {
+            key: value.result() if isinstance(value, Future) else value
+            for key, value in report_metadata.items()
+        }
+    
+    @staticmethod
+    def _excel_styles(workbook):
+        """
+        Estilos con nombre del Excel (se registran una vez por libro y cada
+        celda solo guarda la referencia)
+        """
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+        
+        # Estilo de celdas
+        cell_border = Border(
+            left=Side(style='thin', color='CCCCCC'),
+            right=Side(style='thin', color='CCCCCC'),
+            top=Side(style='thin', color='CCCCCC'),
+            bottom=Side(style='thin', color='CCCCCC')
+        )
+        body_alignment = Alignment(horizontal="left", vertical="center")
+        
+        styles = {
+            'header': NamedStyle(
+                name='report_header',
+                fill=PatternFill(start_color="4A5568", end_color="4A5568", fill_type="solid"),
+                font=Font(bold=True, color="FFFFFF", size=11),
+                alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+                border=cell_border
+            ),
+            'odd': NamedStyle(name='report_row', border=cell_border, alignment=body_alignment),
+            # Alternar colores de filas
+            'even': NamedStyle(
+                name='report_row_alt',
+                fill=PatternFill(start_color="F7FAFC", end_color="F7FAFC", fill_type="solid"),
+                border=cell_border,
+                alignment=body_alignment
+            ),
+        }
+        for style in styles.values():
+            workbook.add_named_style(style)
+        return styles
+    
+    @staticmethod
+    def to_excel(data: Iterable[Dict], filename: str, report_metadata: Dict = None, output: BinaryIO = None) -> BinaryIO:
         """
         Exporta datos a Excel con formato profesional
         
+        El libro se escribe en modo write_only: cada fila se escribe ya con su
+        estilo y no se mantiene en memoria, y el ancho de las columnas se
+        estima con las primeras EXCEL_WIDTH_SAMPLE_ROWS filas.
+        
         Args:
-            data: Lista de diccionarios con los datos
+            data: Filas (dicts); puede ser un generador, se recorre una sola vez
             filename: Nombre sugerido para el archivo
-            report_metadata: Información adicional del reporte
+            report_metadata: Información adicional del reporte (admite valores Future)
+            output: Archivo destino (por defecto un archivo temporal)
             
         Returns:
-            BytesIO con el archivo Excel
+            Archivo con el Excel, posicionado al inicio
         """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment
+        from openpyxl.utils import get_column_letter
         
-        # Crear DataFrame
-        df = pd.DataFrame(data)
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=ReportExporter.SPOOL_MAX_BYTES)
         
-        # Crear archivo en memoria
-        output = BytesIO()
+        workbook = Workbook(write_only=True)
+        styles = ReportExporter._excel_styles(workbook)
+        worksheet = workbook.create_sheet('Datos')
         
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Escribir datos
-            df.to_excel(writer, sheet_name='Datos', index=False, startrow=0)
-            
-            # Obtener workbook y worksheet para formato
-            workbook = writer.book
-            worksheet = writer.sheets['Datos']
-            
-            # Estilo del encabezado
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            
-            header_fill = PatternFill(start_color="4A5568", end_color="4A5568", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            
-            # Estilo de celdas
-            cell_border = Border(
-                left=Side(style='thin', color='CCCCCC'),
-                right=Side(style='thin', color='CCCCCC'),
-                top=Side(style='thin', color='CCCCCC'),
-                bottom=Side(style='thin', color='CCCCCC')
+        rows_iter = iter(data)
+        sample = list(islice(rows_iter, ReportExporter.EXCEL_WIDTH_SAMPLE_ROWS))
+        columns = list(sample[0].keys()) if sample else []
+        
+        # Ajustar ancho de columnas con la muestra (antes de escribir filas)
+        for index, column in enumerate(columns, start=1):
+            max_length = max(
+                [len(str(column))] + [len(str(row.get(column))) for row in sample if row.get(column) is not None]
             )
+            # Ancho mínimo de 12, máximo de 60
+            worksheet.column_dimensions[get_column_letter(index)].width = min(max(max_length + 3, 12), 60)
+        
+        def styled_row(values, style):
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.style = style
+                # El estilo con nombre reemplaza el formato de fecha que asigna openpyxl
+                if isinstance(value, datetime):
+                    cell.number_format = 'yyyy-mm-dd hh:mm:ss'
+                elif isinstance(value, date):
+                    cell.number_format = 'yyyy-mm-dd'
+                cells.append(cell)
+            return cells
+        
+        total_rows = 0
+        if columns:
+            worksheet.append(styled_row(columns, 'report_header'))
+            for row in chain(sample, rows_iter):
+                total_rows += 1
+                # Filas pares de la hoja (2, 4, ...) con fondo alterno
+                style = 'report_row_alt' if total_rows % 2 == 1 else 'report_row'
+                worksheet.append(styled_row(
+                    [ReportExporter._cell_value(row.get(column)) for column in columns], style
+                ))
+        
+        # Si hay metadata, crear hoja adicional
+        report_metadata = ReportExporter._resolve_metadata(report_metadata)
+        if report_metadata:
+            meta_worksheet = workbook.create_sheet('Información')
             
-            # Aplicar estilo al encabezado
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_alignment
-                cell.border = cell_border
-            
-            # Ajustar ancho de columnas automáticamente
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if cell.value:
-                            cell.border = cell_border
-                            cell.alignment = Alignment(horizontal="left", vertical="center")
-                            max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-                # Ancho mínimo de 12, máximo de 60
-                adjusted_width = min(max(max_length + 3, 12), 60)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            # Alternar colores de filas
-            light_fill = PatternFill(start_color="F7FAFC", end_color="F7FAFC", fill_type="solid")
-            for row_idx, row in enumerate(worksheet.iter_rows(min_row=2), start=2):
-                if row_idx % 2 == 0:
-                    for cell in row:
-                        if not cell.fill.start_color.rgb or cell.fill.start_color.rgb == '00000000':
-                            cell.fill = light_fill
+            # Ajustar ancho de columnas de metadata
+            meta_worksheet.column_dimensions['A'].width = 20
+            meta_worksheet.column_dimensions['B'].width = 60
             
-            # Si hay metadata, crear hoja adicional
-            if report_metadata:
-                metadata_df = pd.DataFrame([
-                    ['Reporte', report_metadata.get('title', 'N/A')],
-                    ['Generado por', report_metadata.get('user', 'N/A')],
-                    ['Fecha', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-                    ['Total registros', len(data)],
-                    ['Consulta', report_metadata.get('prompt', 'N/A')],
-                ])
-                metadata_df.to_excel(writer, sheet_name='Información', index=False, header=False)
-                
-                # Formato de la hoja de metadata
-                meta_worksheet = writer.sheets['Información']
-                for row in meta_worksheet.iter_rows():
-                    for cell in row:
-                        cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                        if cell.column == 1:
-                            cell.font = Font(bold=True, size=11)
-                
-                # Ajustar ancho de columnas de metadata
-                meta_worksheet.column_dimensions['A'].width = 20
-                meta_worksheet.column_dimensions['B'].width = 60
+            label_font = Font(bold=True, size=11)
+            meta_alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
+            for label, value in [
+                ('Reporte', report_metadata.get('title', 'N/A')),
+                ('Generado por', report_metadata.get('user', 'N/A')),
+                ('Fecha', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                ('Total registros', total_rows),
+                ('Consulta', report_metadata.get('prompt', 'N/A')),
+            ]:
+                label_cell = WriteOnlyCell(meta_worksheet, value=label)
+                label_cell.font = label_font
+                label_cell.alignment = meta_alignment
+                value_cell = WriteOnlyCell(meta_worksheet, value=value)
+                value_cell.alignment = meta_alignment
+                meta_worksheet.append([label_cell, value_cell])
         
+        workbook.save(output)
         output.seek(0)
         return output
     
     @staticmethod
     def to_pdf(
-        data: List[Dict], 
+        data: Iterable[Dict], 
         filename: str, 
         report_metadata: Dict = None,
-        chart_data: Dict = None
-    ) -> BytesIO:
+        chart_data: Dict = None,
+        output: BinaryIO = None
+    ) -> BinaryIO:
         """
         Exporta datos a PDF con formato profesional
         
+        La tabla se arma por bloques de PDF_TABLE_CHUNK_ROWS filas (cada uno
+        con su encabezado) a medida que se leen las filas, para que reportlab
+        no tenga que partir una única tabla gigante en cada salto de página.
+        Se muestran como máximo REPORT_PDF_MAX_ROWS filas; del resto solo se
+        informa el total.
+        
         Args:
-            data: Lista de diccionarios con los datos
+            data: Filas (dicts); puede ser un generador, se recorre una sola vez
             filename: Nombre sugerido para el archivo
-            report_metadata: Información adicional del reporte
+            report_metadata: Información adicional del reporte (admite valores Future)
             chart_data: Datos para generar gráficos
+            output: Archivo destino (por defecto un archivo temporal)
             
         Returns:
-            BytesIO con el archivo PDF
+            Archivo con el PDF, posicionado al inicio
         """
         
-        output = BytesIO()
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=ReportExporter.SPOOL_MAX_BYTES)
+        
+        max_rows = getattr(settings, 'REPORT_PDF_MAX_ROWS', 2000)
+        rows_iter = iter(data)
+        first_row = next(rows_iter, None)
+        columns = list(first_row.keys()) if first_row is not None else []
         
         # Determinar orientación según número de columnas
-        df = pd.DataFrame(data)
-        num_columns = len(df.columns)
+        num_columns = len(columns)
         
         # Si hay más de 6 columnas, usar landscape
         pagesize = landscape(A4) if num_columns > 6 else A4
@@ -186,7 +276,30 @@ class ReportExporter:
             fontName='Helvetica-Bold'
         )
         
-        # Contenido del PDF
+        # Tabla de datos por bloques (SIN GRÁFICO - se quitó como solicitaste)
+        tables = []
+        total_rows = 0
+        if first_row is not None:
+            # Calcular ancho de columnas dinámicamente
+            page_width = pagesize[0] - 40  # Ancho disponible
+            col_widths = [page_width / num_columns] * num_columns
+            table_style = ReportExporter._pdf_table_style(num_columns)
+            
+            chunk = []
+            for row in chain([first_row], rows_iter):
+                total_rows += 1
+                if total_rows > max_rows:
+                    # Solo se cuenta el resto de filas
+                    continue
+                chunk.append([row.get(column) for column in columns])
+                if len(chunk) == ReportExporter.PDF_TABLE_CHUNK_ROWS:
+                    tables.append(ReportExporter._pdf_table(columns, chunk, col_widths, table_style))
+                    chunk = []
+            if chunk:
+                tables.append(ReportExporter._pdf_table(columns, chunk, col_widths, table_style))
+        
+        # Contenido del PDF (el resumen se espera recién aquí, con la tabla ya armada)
+        report_metadata = ReportExporter._resolve_metadata(report_metadata)
         story = []
         
         # Título
@@ -203,7 +316,7 @@ class ReportExporter:
             <b>Generado por:</b> {report_metadata.get('user', 'Sistema')}<br/>
             <b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}<br/>
             <b>Consulta:</b> {report_metadata.get('prompt', 'N/A')}<br/>
-            <b>Total de registros:</b> {len(data)}
+            <b>Total de registros:</b> {total_rows}
             """
             story.append(Paragraph(metadata_text, styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
@@ -214,73 +327,20 @@ class ReportExporter:
             story.append(Paragraph(report_metadata['summary'], styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
         
-        # Tabla de datos (SIN GRÁFICO - se quitó como solicitaste)
-        if data:
+        if tables:
             story.append(Paragraph('Datos Detallados', heading_style))
             story.append(Spacer(1, 0.1 * inch))
             
             # NO limitar columnas - mostrar TODAS
             # Limitar solo filas si son demasiadas (para PDF)
-            max_rows = 100  # Aumentado a 100 registros
-            show_all_message = False
-            
-            if len(df) > max_rows:
-                df_display = df.head(max_rows)
-                show_all_message = True
-            else:
-                df_display = df
-            
-            if show_all_message:
+            if total_rows > max_rows:
                 story.append(Paragraph(
-                    f'<i>Mostrando primeros {max_rows} registros de {len(data)} total. Descarga el Excel para ver todos.</i>',
+                    f'<i>Mostrando primeros {max_rows} registros de {total_rows} total. Descarga el Excel para ver todos.</i>',
                     styles['Italic']
                 ))
                 story.append(Spacer(1, 0.1 * inch))
             
-            # Crear tabla con TODAS las columnas
-            table_data = [df_display.columns.tolist()] + df_display.values.tolist()
-            
-            # Calcular ancho de columnas dinámicamente
-            page_width = pagesize[0] - 40  # Ancho disponible
-            col_widths = [page_width / len(df_display.columns)] * len(df_display.columns)
-            
-            # Ajustar tamaño de fuente según número de columnas
-            if num_columns > 10:
-                font_size = 6
-                header_font_size = 7
-            elif num_columns > 7:
-                font_size = 7
-                header_font_size = 8
-            else:
-                font_size = 8
-                header_font_size = 9
-            
-            table = Table(table_data, colWidths=col_widths, repeatRows=1)
-            
-            # Estilo de tabla mejorado
-            table.setStyle(TableStyle([
-                # Encabezado
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a5568')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), header_font_size),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                
-                # Cuerpo
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), font_size),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f7fafc')]),
-                ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                ('TOPPADDING', (0, 1), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
-            ]))
-            
-            story.append(table)
+            story.extend(tables)
         
         # Construir PDF
         doc.build(story)
@@ -288,6 +348,54 @@ class ReportExporter:
         output.seek(0)
         return output
     
+    @staticmethod
+    def _pdf_table_style(num_columns: int) -> TableStyle:
+        """
+        Estilo compartido por todos los bloques de la tabla del PDF
+        """
+        # Ajustar tamaño de fuente según número de columnas
+        if num_columns > 10:
+            font_size = 6
+            header_font_size = 7
+        elif num_columns > 7:
+            font_size = 7
+            header_font_size = 8
+        else:
+            font_size = 8
+            header_font_size = 9
+        
+        return TableStyle([
+            # Encabezado
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a5568')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), header_font_size),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+            
+            # Cuerpo
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), font_size),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f7fafc')]),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 1), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
+        ])
+    
+    @staticmethod
+    def _pdf_table(columns: List[str], rows: List[List], col_widths: List[float], table_style: TableStyle) -> Table:
+        """
+        Bloque de la tabla del PDF con su propio encabezado (repeatRows=1 lo
+        repite si el bloque igual se parte entre dos páginas)
+        """
+        table = Table([columns] + rows, colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        return table
+    
     @staticmethod
     def _generate_chart(chart_config: Dict, data: List[Dict]) -> BytesIO:
         """
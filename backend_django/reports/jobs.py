@@ -0,0 +1,341 @@
+"""
+Generación de reportes en segundo plano
+
+build_report ejecuta el flujo completo (interpretación con IA, consulta,
+resumen y exportación) y lo usan tanto la vista síncrona como los trabajos.
+En modo asíncrono la vista solo registra un ReportLog 'pending' y retorna su
+id; el archivo generado se guarda con default_storage (MEDIA_ROOT) y se
+descarga luego desde /api/reports/<id>/download/. Con varios servidores,
+MEDIA_ROOT debe ser un volumen compartido.
+"""
+import multiprocessing
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from .ai_service import AIReportService
+from .export_service import ReportExporter
+from .query_runner import ReportQueryResult
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+
+def build_report(user, prompt, export_format='pdf', include_chart=True):
+    """
+    Genera el archivo del reporte para el prompt
+
+    El resumen de IA (llamada de red) se pide en un hilo apenas se leen las
+    primeras filas, mientras el hilo principal sigue leyendo la consulta y
+    armando el archivo; el exportador solo lo espera cuando lo necesita.
+
+    Returns:
+        dict con el archivo ('file', posicionado al inicio), 'filename',
+        'content_type', los datos para el ReportLog y 'stage_timings'
+        (segundos por etapa)
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    # 1. Interpretar prompt con IA
+    ai_service = AIReportService()
+    ai_response = ai_service.interpret_prompt(prompt)
+
+    sql_query = ai_response['sql_query']
+    report_type = ai_response['report_type']
+    explanation = ai_response['explanation']
+    suggested_chart = ai_response.get('suggested_chart_type', 'bar')
+    tokens_used = ai_response.get('tokens_used', 0)
+
+    # 2. Validar seguridad SQL
+    ai_service.validate_sql_safety(sql_query)
+    timings['interpret'] = _elapsed(started)
+
+    # 3. Ejecutar query (por bloques con cursor del servidor; ver query_runner)
+    stage_started = time.perf_counter()
+    with ReportQueryResult(sql_query) as results, ThreadPoolExecutor(max_workers=1) as executor:
+        head = results.head
+        timings['query'] = _elapsed(stage_started)
+
+        # 4. Generar resumen con IA (con las primeras filas) en paralelo
+        def summarize(total_count):
+            summary_started = time.perf_counter()
+            try:
+                return ai_service.generate_report_summary(prompt, head, total_count=total_count)
+            finally:
+                timings['summary'] = _elapsed(summary_started)
+
+        summary = executor.submit(summarize, results.known_count)
+
+        # 5. Preparar metadata
+        report_metadata = {
+            'title': f"Reporte de {report_type.title()}",
+            'user': user.get_full_name() or user.email,
+            'prompt': prompt,
+            'explanation': explanation,
+            'summary': summary,
+            'generated_at': timezone.now().isoformat(),
+        }
+
+        # 6. Exportar según formato (los exportadores consumen las filas en streaming)
+        stage_started = time.perf_counter()
+        if export_format == 'excel':
+            file_content = ReportExporter.to_excel(results, 'reporte', report_metadata)
+            extension = 'xlsx'
+        else:  # PDF
+            export_format = 'pdf'
+            chart_data = None
+            if include_chart and len(head) > 0 and suggested_chart != 'none':
+                # Intentar detectar campos para gráfico
+                numeric_fields = [k for k, v in head[0].items() if isinstance(v, (int, float))]
+                text_fields = [k for k, v in head[0].items() if isinstance(v, str)]
+
+                if numeric_fields and text_fields:
+                    chart_data = {
+                        'type': suggested_chart,
+                        'x_field': text_fields[0],
+                        'y_field': numeric_fields[0],
+                        'title': explanation
+                    }
+
+            file_content = ReportExporter.to_pdf(results, 'reporte', report_metadata, chart_data)
+            extension = 'pdf'
+        # El export incluye la lectura del resto de filas de la consulta
+        timings['export'] = _elapsed(stage_started)
+
+        # Excel no usa el resumen; igual se espera para no dejar el hilo suelto
+        summary.result()
+
+    timings['total'] = _elapsed(started)
+
+    return {
+        'file': file_content,
+        'filename': f'reporte_{report_type}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{extension}',
+        'content_type': CONTENT_TYPES[export_format],
+        'report_type': report_type,
+        'sql_query': sql_query,
+        'tokens_used': tokens_used,
+        'results_count': results.count,
+        'truncated': results.truncated,
+        'stage_timings': timings,
+    }
+
+
+def _elapsed(started):
+    return round(time.perf_counter() - started, 3)
+
+
+def run_report_job(report_log_id):
+    """
+    Genera el reporte registrado en ReportLog y guarda el archivo. El reporte
+    ya debe estar tomado ('running', ver ReportJobRunner.claim). Se puede
+    llamar en el proceso actual o en un proceso hijo.
+    """
+    from .models import ReportLog
+
+    report_log = ReportLog.objects.select_related('user').get(id=report_log_id)
+
+    start_time = time.time()
+    try:
+        report = build_report(
+            report_log.user,
+            report_log.original_prompt,
+            report_log.export_format,
+            report_log.include_chart
+        )
+        with report['file'] as file_content:
+            report_log.file_path = default_storage.save(
+                f"reports/generated/{report_log.id}/{report['filename']}", File(file_content)
+            )
+
+        report_log.report_type = report['report_type']
+        report_log.generated_sql = report['sql_query']
+        report_log.results_count = report['results_count']
+        report_log.tokens_used = report['tokens_used']
+        report_log.stage_timings = report['stage_timings']
+        report_log.status = 'completed'
+        report_log.success = True
+
+    except Exception as e:
+        logger.error(f"Error generando reporte {report_log_id}: {str(e)}")
+        report_log.status = 'failed'
+        report_log.success = False
+        report_log.error_message = str(e)
+
+    report_log.execution_time = time.time() - start_time
+    report_log.completed_at = timezone.now()
+    report_log.save()
+    return report_log
+
+
+def _run_report_job_in_child(report_log_id):
+    """
+    Punto de entrada del proceso hijo del pool
+    """
+    try:
+        if not report_job_runner.claim(report_log_id):
+            # Ya lo tomó `run_report_jobs` mientras esperaba en el pool
+            logger.info(f"Reporte {report_log_id} ya fue tomado por otro ejecutor")
+            return None
+        return str(run_report_job(report_log_id).id)
+    finally:
+        connections.close_all()
+
+
+def _init_report_process():
+    """
+    Inicializa Django en el proceso hijo
+    """
+    import django
+    django.setup()
+
+
+class ReportJobRunner:
+    """
+    Cola de reportes asíncronos.
+    - backend 'process': cada worker web mantiene un pool de procesos
+      (REPORT_JOBS_MAX_WORKERS) y el request retorna apenas se encola
+    - backend 'db': el reporte queda 'pending' y lo genera el comando
+      `run_report_jobs` en un proceso aparte
+
+    Con cualquier backend, `run_report_jobs` también toma los pendientes que
+    llevan más de REPORT_JOBS_PENDING_GRACE_SECONDS sin empezar (p. ej. si el
+    worker web que los encoló se reinició) y marca como fallidos los que
+    llevan más de REPORT_JOBS_TIMEOUT_SECONDS generándose (reap_stale_jobs).
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return getattr(settings, 'REPORT_JOBS_BACKEND', 'process')
+
+    def submit(self, user, prompt, export_format='pdf', include_chart=True, input_type='text', transcription=None):
+        """
+        Registra el reporte como pendiente y lo encola
+        """
+        from .models import ReportLog
+
+        report_log = ReportLog.objects.create(
+            user=user,
+            report_type='custom',
+            input_type=input_type,
+            original_prompt=prompt,
+            transcription=transcription,
+            generated_sql='',
+            export_format=export_format,
+            include_chart=include_chart,
+            status='pending'
+        )
+
+        if self.backend == 'process':
+            report_log_id = str(report_log.id)
+            transaction.on_commit(lambda: self._submit_to_pool(report_log_id))
+
+        return report_log
+
+    def claim_next_job(self):
+        """
+        Toma el siguiente reporte pendiente, evitando que dos ejecutores tomen
+        el mismo. Con el backend 'process' solo toma los que el pool no empezó
+        dentro de REPORT_JOBS_PENDING_GRACE_SECONDS
+        """
+        from .models import ReportLog
+
+        pending = ReportLog.objects.filter(status='pending')
+        if self.backend != 'db':
+            grace = timedelta(seconds=getattr(settings, 'REPORT_JOBS_PENDING_GRACE_SECONDS', 300))
+            pending = pending.filter(created_at__lt=timezone.now() - grace)
+
+        with transaction.atomic():
+            report_log = pending.select_for_update(skip_locked=True).order_by('created_at').first()
+            if report_log is None:
+                return None
+            report_log.status = 'running'
+            report_log.started_at = timezone.now()
+            report_log.save(update_fields=['status', 'started_at'])
+        return report_log
+
+    def claim(self, report_log_id):
+        """
+        Toma un reporte pendiente concreto. Retorna False si otro ejecutor ya
+        lo tomó
+        """
+        from .models import ReportLog
+
+        return ReportLog.objects.filter(id=report_log_id, status='pending').update(
+            status='running',
+            started_at=timezone.now()
+        ) == 1
+
+    def reap_stale_jobs(self):
+        """
+        Marca como fallidos los reportes que llevan más de
+        REPORT_JOBS_TIMEOUT_SECONDS generándose (su proceso murió o se colgó).
+        Retorna cuántos se marcaron
+        """
+        from .models import ReportLog
+
+        timeout = getattr(settings, 'REPORT_JOBS_TIMEOUT_SECONDS', 1800)
+        now = timezone.now()
+        reaped = ReportLog.objects.filter(
+            status='running',
+            started_at__lt=now - timedelta(seconds=timeout)
+        ).update(
+            status='failed',
+            success=False,
+            error_message=f'Tiempo de generación agotado ({timeout}s)',
+            completed_at=now
+        )
+        if reaped:
+            logger.warning(f"{reaped} reportes marcados como fallidos por tiempo agotado")
+        return reaped
+
+    def _submit_to_pool(self, report_log_id):
+        future = self._get_executor().submit(_run_report_job_in_child, report_log_id)
+        future.add_done_callback(lambda f: self._on_job_done(report_log_id, f))
+
+    def _on_job_done(self, report_log_id, future):
+        error = future.exception()
+        if error is None:
+            logger.info(f"Reporte {report_log_id} finalizado")
+            return
+
+        # El proceso hijo murió antes de registrar el resultado
+        from .models import ReportLog
+
+        logger.error(f"Reporte {report_log_id} abortado: {str(error)}")
+        ReportLog.objects.filter(id=report_log_id, status__in=['pending', 'running']).update(
+            status='failed',
+            success=False,
+            error_message=str(error),
+            completed_at=timezone.now()
+        )
+        with self._lock:
+            self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'REPORT_JOBS_MAX_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_report_process
+                )
+            return self._executor
+
+
+# Instancia única por proceso
+report_job_runner = ReportJobRunner()
@@ -0,0 +1,253 @@
+"""
+Instantáneas de KPIs para los dashboards
+
+Los dashboards de administración y de empleados leen una fila de KPISnapshot
+por clave única en lugar de recalcular ventas, stock y clientes en cada
+carga. Las señales de órdenes, stock, usuarios y empleados (reports.signals)
+solo marcan como invalidadas las claves afectadas, y se recalculan:
+- con `manage.py refresh_dashboard_kpis --interval N` (recomendado), que
+  recalcula las invalidadas y las vencidas, o
+- en la lectura, solo si no existen, son de otro día o superan
+  KPI_SNAPSHOT_MAX_AGE_SECONDS. Una instantánea invalidada se sigue
+  sirviendo hasta entonces, así que la carga del dashboard no agrega.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+from authentication.models import User
+from employees.models import Employee, Department
+from orders.models import Order
+from products.models import Product, ProductVariant
+from .models import KPISnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = 'global'
+
+
+def employee_key(user_id):
+    return f'employee:{user_id}'
+
+
+def _money(value):
+    # Mismo formato que DRF para DecimalField ("123.45" o None)
+    return str(value.quantize(Decimal('0.01'))) if value is not None else None
+
+
+class KPISnapshotService:
+    """
+    Calcula, guarda y entrega las instantáneas de KPIs
+    """
+
+    # Estados de orden que cuentan como venta en los dashboards
+    SALE_STATUSES = ['confirmed', 'processing', 'shipped', 'delivered']
+
+    # Filas de las listas del dashboard (órdenes recientes, stock bajo)
+    LIST_SIZE = 5
+
+    @property
+    def max_age(self):
+        return timedelta(seconds=getattr(settings, 'KPI_SNAPSHOT_MAX_AGE_SECONDS', 300))
+
+    def get_global(self):
+        return self.get(GLOBAL_KEY)
+
+    def get_employee(self, user):
+        return self.get(employee_key(user.id))
+
+    def get(self, key):
+        """
+        Datos de la instantánea (una lectura por clave). Solo se recalcula aquí
+        si no existe o está vencida; si solo está invalidada se sirve igual
+        """
+        snapshot = KPISnapshot.objects.filter(key=key).first()
+        if snapshot is not None and not self.is_expired(snapshot):
+            return snapshot.data
+        return self.refresh(key)
+
+    def is_expired(self, snapshot):
+        """
+        Instantánea de otro día o más antigua que KPI_SNAPSHOT_MAX_AGE_SECONDS
+        """
+        now = timezone.now()
+        return (
+            snapshot.data.get('date') != timezone.localdate(now).isoformat()
+            or now - snapshot.computed_at > self.max_age
+        )
+
+    def is_stale(self, snapshot):
+        """
+        Vencida o invalidada por un cambio posterior al cálculo
+        """
+        return (
+            (snapshot.invalidated_at is not None and snapshot.invalidated_at >= snapshot.computed_at)
+            or self.is_expired(snapshot)
+        )
+
+    def refresh(self, key):
+        """
+        Recalcula y guarda la instantánea de key
+        """
+        started = timezone.now()
+        if key == GLOBAL_KEY:
+            data = self._compute_global(started)
+        elif key.startswith('employee:'):
+            data = self._compute_employee(int(key.split(':', 1)[1]), started)
+        else:
+            raise ValueError(f'Clave de KPIs desconocida: {key}')
+
+        KPISnapshot.objects.update_or_create(key=key, defaults={'data': data, 'computed_at': started})
+        return data
+
+    def refresh_stale(self):
+        """
+        Recalcula la instantánea global y las de empleado vencidas. Retorna
+        cuántas se recalcularon
+        """
+        refreshed = 0
+        snapshots = {snapshot.key: snapshot for snapshot in KPISnapshot.objects.all()}
+        snapshots.setdefault(GLOBAL_KEY, None)
+        for key, snapshot in snapshots.items():
+            if snapshot is None or self.is_stale(snapshot):
+                self.refresh(key)
+                refreshed += 1
+        return refreshed
+
+    @staticmethod
+    def invalidate(keys):
+        """
+        Marca las instantáneas de keys como invalidadas al confirmar la
+        transacción en curso (las ya invalidadas no se vuelven a escribir)
+        """
+        keys = [key for key in keys if key]
+
+        def mark():
+            KPISnapshot.objects.filter(key__in=keys).filter(
+                Q(invalidated_at__isnull=True) | Q(invalidated_at__lt=F('computed_at'))
+            ).update(invalidated_at=timezone.now())
+
+        transaction.on_commit(mark)
+
+    @staticmethod
+    def _periods(now):
+        today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today_start, today_start.replace(day=1)
+
+    def _compute_global(self, now):
+        today_start, month_start = self._periods(now)
+        sales = Q(status__in=self.SALE_STATUSES)
+        today = Q(created_at__gte=today_start)
+        month = Q(created_at__gte=month_start)
+
+        orders = Order.objects.aggregate(
+            today_count=Count('id', filter=sales & today),
+            today_total=Sum('total_amount', filter=sales & today),
+            month_count=Count('id', filter=sales & month),
+            month_total=Sum('total_amount', filter=sales & month),
+            total_orders=Count('id'),
+            total_revenue=Sum('total_amount', filter=sales),
+            pending_orders=Count('id', filter=Q(status__in=['pending', 'confirmed'])),
+        )
+
+        low_stock = ProductVariant.objects.filter(product=OuterRef('pk'), stock_quantity__lte=F('min_stock_level'))
+        out_of_stock = ProductVariant.objects.filter(product=OuterRef('pk'), stock_quantity=0)
+        products = Product.objects.annotate(
+            has_low_stock=Exists(low_stock), has_no_stock=Exists(out_of_stock)
+        ).aggregate(
+            total=Count('id'),
+            total_active=Count('id', filter=Q(status='active')),
+            low_stock=Count('id', filter=Q(has_low_stock=True)),
+            out_of_stock=Count('id', filter=Q(has_no_stock=True)),
+        )
+        low_stock_products = list(
+            Product.objects.filter(Exists(low_stock)).order_by('available_stock', 'name').values(
+                'id', 'name', 'sku', 'available_stock'
+            )[:self.LIST_SIZE]
+        )
+
+        customers = Q(role='customer')
+        users = User.objects.aggregate(
+            total=Count('id'),
+            customers=Count('id', filter=customers),
+            new_customers_today=Count('id', filter=customers & Q(created_at__gte=today_start)),
+            new_customers_this_month=Count('id', filter=customers & Q(created_at__gte=month_start)),
+            new_users_this_month=Count('id', filter=Q(created_at__gte=month_start)),
+        )
+
+        recent_orders = [
+            {
+                'id': str(order['id']),
+                'order_number': order['order_number'],
+                'status': order['status'],
+                'total_amount': _money(order['total_amount']),
+                'customer': f"{order['customer__first_name']} {order['customer__last_name']}".strip(),
+                'created_at': order['created_at'].isoformat(),
+            }
+            for order in Order.objects.order_by('-created_at').values(
+                'id', 'order_number', 'status', 'total_amount', 'created_at',
+                'customer__first_name', 'customer__last_name'
+            )[:self.LIST_SIZE]
+        ]
+
+        return {
+            'date': timezone.localdate(now).isoformat(),
+            'computed_at': now.isoformat(),
+            'sales': {
+                'today': {'total': _money(orders['today_total']), 'count': orders['today_count']},
+                'this_month': {'total': _money(orders['month_total']), 'count': orders['month_count']},
+            },
+            'orders': {
+                'total': orders['total_orders'],
+                'revenue': _money(orders['total_revenue']),
+                'pending': orders['pending_orders'],
+                'recent': recent_orders,
+            },
+            'products': {
+                'total': products['total'],
+                'total_active': products['total_active'],
+                'low_stock': products['low_stock'],
+                'out_of_stock': products['out_of_stock'],
+                'low_stock_list': [
+                    {**product, 'id': str(product['id'])} for product in low_stock_products
+                ],
+            },
+            'customers': {
+                'total': users['customers'],
+                'new_today': users['new_customers_today'],
+                'new_this_month': users['new_customers_this_month'],
+            },
+            'users': {
+                'total': users['total'],
+                'new_this_month': users['new_users_this_month'],
+            },
+            'employees': {
+                'total_active': Employee.objects.filter(employment_status='active').count(),
+                'departments': Department.objects.filter(is_active=True).count(),
+            },
+        }
+
+    def _compute_employee(self, user_id, now):
+        today_start, _ = self._periods(now)
+        mine_today = Q(processed_by_id=user_id, created_at__gte=today_start)
+        # Las pendientes son de toda la tienda: las órdenes de otros empleados
+        # no invalidan esta clave, así que ese conteo puede quedar atrasado
+        # hasta KPI_SNAPSHOT_MAX_AGE_SECONDS
+        orders = Order.objects.aggregate(
+            today_count=Count('id', filter=mine_today),
+            today_total=Sum('total_amount', filter=mine_today),
+            pending_orders=Count('id', filter=Q(status__in=['pending', 'confirmed'])),
+        )
+        return {
+            'date': timezone.localdate(now).isoformat(),
+            'computed_at': now.isoformat(),
+            'sales': {
+                'today': {'total': _money(orders['today_total']), 'count': orders['today_count']},
+            },
+            'orders': {
+                'pending': orders['pending_orders'],
+            },
+        }
@@ -0,0 +1,30 @@
+"""
+Recalcula las instantáneas de KPIs de los dashboards que estén vencidas
+"""
+import time
+from django.core.management.base import BaseCommand
+from reports.kpis import KPISnapshotService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las instantáneas de KPIs vencidas de los dashboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Segundos entre revisiones (0 = una sola vez)',
+        )
+
+    def handle(self, *args, **options):
+        service = KPISnapshotService()
+
+        while True:
+            refreshed = service.refresh_stale()
+            if refreshed:
+                self.stdout.write(self.style.SUCCESS(f'✅ {refreshed} instantáneas de KPIs recalculadas'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
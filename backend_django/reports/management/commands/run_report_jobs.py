@@ -0,0 +1,54 @@
+"""
+Genera los reportes asíncronos pendientes (backend REPORT_JOBS_BACKEND='db')
+
+Con el backend 'process' también conviene correrlo: retoma los pendientes que
+ningún worker web empezó y marca como fallidos los que quedaron colgados.
+"""
+import time
+from django.core.management.base import BaseCommand
+from reports.jobs import report_job_runner, run_report_job
+
+
+class Command(BaseCommand):
+    help = 'Procesa los ReportLog pendientes fuera de los workers web'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar los reportes pendientes y terminar',
+        )
+        parser.add_argument(
+            '--poll-seconds',
+            type=int,
+            default=5,
+            help='Segundos de espera entre consultas cuando no hay reportes',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('📊 Esperando reportes pendientes...'))
+
+        while True:
+            reaped = report_job_runner.reap_stale_jobs()
+            if reaped:
+                self.stdout.write(self.style.WARNING(f'⚠️  {reaped} reportes colgados marcados como fallidos'))
+
+            report_log = report_job_runner.claim_next_job()
+
+            if report_log is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_seconds'])
+                continue
+
+            self.stdout.write(f'⏳ Generando reporte {report_log.id}')
+            report_log = run_report_job(report_log.id)
+
+            if report_log.status == 'completed':
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Reporte {report_log.id} generado en {report_log.execution_time:.1f}s ({report_log.results_count} filas)'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'❌ Reporte {report_log.id} falló: {report_log.error_message}'
+                ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['created_at'], name='reports_rep_created_6282a5_idx'),
+        ),
+    ]
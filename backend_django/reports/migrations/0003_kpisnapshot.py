@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_reportlog_reports_rep_created_6282a5_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KPISnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField()),
+                ('invalidated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Indicadores del Dashboard',
+                'verbose_name_plural': 'Indicadores del Dashboard',
+            },
+        ),
+    ]
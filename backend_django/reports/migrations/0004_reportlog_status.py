@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_failed_reports(apps, schema_editor):
+    """
+    Los reportes ya registrados están terminados; los que fallaron quedan como 'failed'
+    """
+    ReportLog = apps.get_model('reports', 'ReportLog')
+    ReportLog.objects.filter(success=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_kpisnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportlog',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='include_chart',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('running', 'Generando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='completed', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='reportlog',
+            name='execution_time',
+            field=models.FloatField(default=0, help_text='Tiempo de ejecución en segundos'),
+        ),
+        migrations.AlterField(
+            model_name='reportlog',
+            name='file_path',
+            field=models.CharField(blank=True, help_text='Archivo generado (ruta en MEDIA_ROOT)', max_length=500, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['status', 'created_at'], name='reports_rep_status_d246e0_idx'),
+        ),
+        migrations.RunPython(mark_failed_reports, migrations.RunPython.noop),
+    ]
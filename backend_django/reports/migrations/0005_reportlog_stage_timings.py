@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_reportlog_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportlog',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, help_text='Segundos por etapa (interpret, query, summary, export, total)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_reportlog_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
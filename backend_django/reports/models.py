@@ -29,6 +29,15 @@ class ReportLog(models.Model):
         ('json', 'JSON'),
     ]
     
+    # Los reportes síncronos se registran ya terminados; los asíncronos
+    # pasan por pending -> running -> completed/failed (ver reports.jobs)
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'Generando'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generated_reports')
     report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
@@ -46,10 +55,17 @@ class ReportLog(models.Model):
     # Resultados
     results_count = models.IntegerField(default=0)
     export_format = models.CharField(max_length=10, choices=EXPORT_FORMATS)
-    file_path = models.CharField(max_length=500, null=True, blank=True)
+    include_chart = models.BooleanField(default=True)
+    file_path = models.CharField(max_length=500, null=True, blank=True, help_text="Archivo generado (ruta en MEDIA_ROOT)")
+    
+    # Estado de la generación
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     
     # Metadata
-    execution_time = models.FloatField(help_text="Tiempo de ejecución en segundos")
+    execution_time = models.FloatField(default=0, help_text="Tiempo de ejecución en segundos")
+    stage_timings = models.JSONField(default=dict, blank=True, help_text="Segundos por etapa (interpret, query, summary, export, total)")
     tokens_used = models.IntegerField(default=0, help_text="Tokens consumidos en la IA")
     success = models.BooleanField(default=True)
     error_message = models.TextField(null=True, blank=True)
@@ -61,7 +77,30 @@ class ReportLog(models.Model):
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['report_type']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at']),
         ]
     
     def __str__(self):
         return f"{self.user.email} - {self.report_type} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class KPISnapshot(models.Model):
+    """
+    Indicadores precalculados de los dashboards (ver reports.kpis).
+    key: 'global' (dashboard de administración) o 'employee:<id>'
+    """
+    key = models.CharField(max_length=100, unique=True)
+    data = models.JSONField(default=dict)
+    
+    # Inicio del último cálculo; la instantánea está vencida si hubo un
+    # evento (invalidated_at) posterior
+    computed_at = models.DateTimeField()
+    invalidated_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Indicadores del Dashboard'
+        verbose_name_plural = 'Indicadores del Dashboard'
+    
+    def __str__(self):
+        return f"{self.key} - {self.computed_at.strftime('%Y-%m-%d %H:%M')}"
@@ -0,0 +1,129 @@
+"""
+Ejecución por bloques de las consultas SQL generadas para los reportes
+
+La consulta se ejecuta con un cursor del servidor (cursor con nombre en
+PostgreSQL, vía connection.chunked_cursor) dentro de una transacción, y las
+filas se leen por bloques de REPORT_FETCH_CHUNK_SIZE a medida que los
+exportadores las consumen. Así la memoria del worker no depende del tamaño
+del resultado.
+
+- REPORT_MAX_ROWS: filas máximas por reporte; las siguientes se descartan
+  y el resultado queda marcado como truncated
+- REPORT_STATEMENT_TIMEOUT_MS: statement_timeout de PostgreSQL para la
+  consulta y cada FETCH (otros motores no aplican límite)
+"""
+from itertools import islice
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReportQueryResult:
+    """
+    Resultado de una consulta de reporte que se lee una sola vez, en orden.
+
+    Uso:
+        with ReportQueryResult(sql) as result:
+            result.columns, result.head   # columnas y primeras filas (ya leídas)
+            for row in result: ...        # todas las filas como dicts
+            result.count, result.truncated
+    """
+
+    # Filas que se leen al abrir (resumen, gráfico y detección de columnas)
+    HEAD_ROWS = 100
+
+    def __init__(self, sql, params=None, max_rows=None, chunk_size=None, timeout_ms=None, using=DEFAULT_DB_ALIAS):
+        self.sql = sql
+        self.params = params
+        self.max_rows = max_rows or getattr(settings, 'REPORT_MAX_ROWS', 100000)
+        self.chunk_size = chunk_size or getattr(settings, 'REPORT_FETCH_CHUNK_SIZE', 2000)
+        self.timeout_ms = timeout_ms if timeout_ms is not None else getattr(settings, 'REPORT_STATEMENT_TIMEOUT_MS', 30000)
+        self.using = using
+
+        self.columns = []
+        self.head = []
+        self.count = 0
+        self.truncated = False
+        self.exhausted = False
+
+        self._atomic = None
+        self._cursor = None
+        self._stream = None
+        self._iterated = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type, exc_value, traceback)
+
+    @property
+    def known_count(self):
+        """
+        Total de filas si ya se conoce (todas leídas), si no None
+        """
+        return self.count if self.exhausted else None
+
+    def open(self):
+        connection = connections[self.using]
+        self._atomic = transaction.atomic(using=self.using)
+        self._atomic.__enter__()
+        try:
+            if connection.vendor == 'postgresql' and self.timeout_ms:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SET LOCAL statement_timeout = {int(self.timeout_ms)}')
+
+            self._cursor = connection.chunked_cursor()
+            self._cursor.execute(self.sql, self.params)
+            self._stream = self._read()
+            self.head = list(islice(self._stream, self.HEAD_ROWS))
+            # Con cursores con nombre, description existe tras el primer FETCH
+            self.columns = [column[0] for column in self._cursor.description or []]
+        except Exception as e:
+            self.close(type(e), e, e.__traceback__)
+            raise
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando el cursor del reporte: {str(e)}")
+            self._cursor = None
+        if self._atomic is not None:
+            atomic, self._atomic = self._atomic, None
+            atomic.__exit__(exc_type, exc_value, traceback)
+
+    def __iter__(self):
+        if self._iterated:
+            raise RuntimeError('Las filas del reporte solo se pueden recorrer una vez')
+        self._iterated = True
+        yield from self.head
+        yield from self._stream
+
+    def _read(self):
+        """
+        Filas como dicts, leyendo por bloques hasta agotar el cursor o
+        llegar a max_rows (se pide una fila más para saber si hay truncamiento)
+        """
+        columns = None
+        while True:
+            size = min(self.chunk_size, self.max_rows + 1 - self.count)
+            rows = self._cursor.fetchmany(size)
+            if columns is None:
+                columns = [column[0] for column in self._cursor.description or []]
+            for row in rows:
+                if self.count >= self.max_rows:
+                    self.truncated = True
+                    break
+                self.count += 1
+                yield dict(zip(columns, row))
+            if self.truncated or len(rows) < size:
+                break
+
+        self.exhausted = True
+        if self.truncated:
+            logger.warning(f"Reporte truncado a {self.max_rows} filas")
@@ -5,6 +5,7 @@ from .models import ReportLog
 class ReportLogSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     user_name = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = ReportLog
@@ -18,13 +19,24 @@ class ReportLogSerializer(serializers.ModelSerializer):
             'transcription',
             'results_count',
             'export_format',
+            'status',
+            'download_url',
             'execution_time',
+            'stage_timings',
             'tokens_used',
             'success',
             'error_message',
             'created_at',
+            'started_at',
+            'completed_at',
         ]
         read_only_fields = ['id', 'created_at']
     
     def get_user_name(self, obj):
         return obj.user.get_full_name() or obj.user.email
+    
+    def get_download_url(self, obj):
+        # Solo los reportes generados en segundo plano guardan el archivo
+        if obj.status == 'completed' and obj.file_path:
+            return f"/api/reports/{obj.id}/download/"
+        return None
@@ -0,0 +1,50 @@
+"""
+Señales que invalidan las instantáneas de KPIs de los dashboards
+
+Cada cambio invalida solo las claves que afecta: la global y, para órdenes,
+la del empleado que la procesó. Las instantáneas invalidadas se recalculan
+con `refresh_dashboard_kpis` (ver reports.kpis).
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from authentication.models import User
+from employees.models import Employee, Department
+from orders.models import Order
+from products.models import Product
+from products.stock import stock_changed
+from .kpis import GLOBAL_KEY, KPISnapshotService, employee_key
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_kpis_on_order_change(sender, instance, **kwargs):
+    KPISnapshotService.invalidate([
+        GLOBAL_KEY,
+        employee_key(instance.processed_by_id) if instance.processed_by_id else None,
+    ])
+
+
+@receiver(stock_changed)
+def invalidate_kpis_on_stock_change(sender, **kwargs):
+    # También cubre los cambios de estado que los servicios de órdenes hacen
+    # con update() (confirmar, cancelar, vencer reservas, órdenes en bloque)
+    KPISnapshotService.invalidate([GLOBAL_KEY])
+
+
+@receiver(post_save, sender=User)
+def invalidate_kpis_on_user_save(sender, update_fields=None, **kwargs):
+    # El login solo actualiza last_login: no cambia ningún indicador
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    KPISnapshotService.invalidate([GLOBAL_KEY])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_global_kpis(sender, **kwargs):
+    KPISnapshotService.invalidate([GLOBAL_KEY])
@@ -18,4 +18,8 @@ urlpatterns = [
     
     # Sugerencias de reportes
     path('suggestions/', views.report_suggestions, name='report_suggestions'),
+    
+    # Estado y descarga de reportes generados en segundo plano
+    path('<uuid:report_id>/', views.report_status, name='report_status'),
+    path('<uuid:report_id>/download/', views.download_report, name='download_report'),
 ]
@@ -6,17 +6,20 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db import connection
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse
 from django.utils import timezone
+import os
 import time
 import json
 
 from .ai_service import AIReportService
 # from .whisper_service import WhisperTranscriptionService
-from .export_service import ReportExporter
+from .jobs import CONTENT_TYPES, build_report, report_job_runner
+from .query_runner import ReportQueryResult
 from .models import ReportLog
 from .serializers import ReportLogSerializer
+from core.pagination import CreatedAtCursorPagination, OptInCursorPagination
 
 
 @api_view(['POST'])
@@ -30,8 +33,12 @@ def generate_report(request):
             "prompt": "string (opcional si hay audio)",
             "audio": "file (opcional)",
             "export_format": "pdf|excel",
-            "include_chart": boolean (default: true)
+            "include_chart": boolean (default: true),
+            "async": boolean (default: false)
         }
+    
+    Con "async": true retorna 202 con el id del reporte; el estado se consulta
+    en GET /api/reports/<id>/ y el archivo en GET /api/reports/<id>/download/
     """
     
     user = request.user
@@ -49,8 +56,9 @@ def generate_report(request):
         # 1. Obtener prompt (texto o audio)
         prompt = request.data.get('prompt')
         audio_file = request.FILES.get('audio')
-        export_format = request.data.get('export_format', 'pdf')
-        include_chart = request.data.get('include_chart', True)
+        export_format = 'excel' if request.data.get('export_format') == 'excel' else 'pdf'
+        include_chart = str(request.data.get('include_chart', True)).lower() != 'false'
+        run_async = str(request.data.get('async', False)).lower() == 'true'
         
         transcription = None
         input_type = 'text'
@@ -69,88 +77,52 @@ def generate_report(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 2. Interpretar prompt con IA
-        ai_service = AIReportService()
-        ai_response = ai_service.interpret_prompt(prompt)
-        
-        sql_query = ai_response['sql_query']
-        report_type = ai_response['report_type']
-        explanation = ai_response['explanation']
-        suggested_chart = ai_response.get('suggested_chart_type', 'bar')
-        tokens_used = ai_response.get('tokens_used', 0)
-        
-        # 3. Validar seguridad SQL
-        ai_service.validate_sql_safety(sql_query)
-        
-        # 4. Ejecutar query
-        with connection.cursor() as cursor:
-            cursor.execute(sql_query)
-            columns = [col[0] for col in cursor.description]
-            results = [
-                dict(zip(columns, row))
-                for row in cursor.fetchall()
-            ]
-        
-        # 5. Generar resumen con IA
-        summary = ai_service.generate_report_summary(prompt, results)
-        
-        # 6. Preparar metadata
-        report_metadata = {
-            'title': f"Reporte de {report_type.title()}",
-            'user': user.get_full_name() or user.email,
-            'prompt': prompt,
-            'explanation': explanation,
-            'summary': summary,
-            'generated_at': timezone.now().isoformat(),
-        }
+        # Modo asíncrono: se encola y se retorna el id del reporte
+        if run_async:
+            report_log = report_job_runner.submit(
+                user, prompt, export_format, include_chart,
+                input_type=input_type, transcription=transcription
+            )
+            return Response({
+                'success': True,
+                'message': 'Reporte encolado',
+                'report_id': str(report_log.id),
+                'status': report_log.status,
+                'status_url': f"/api/reports/{report_log.id}/"
+            }, status=status.HTTP_202_ACCEPTED)
         
-        # 7. Exportar según formato
-        if export_format == 'excel':
-            file_content = ReportExporter.to_excel(results, 'reporte', report_metadata)
-            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            filename = f'reporte_{report_type}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        else:  # PDF
-            chart_data = None
-            if include_chart and len(results) > 0 and suggested_chart != 'none':
-                # Intentar detectar campos para gráfico
-                numeric_fields = [k for k, v in results[0].items() if isinstance(v, (int, float))]
-                text_fields = [k for k, v in results[0].items() if isinstance(v, str)]
-                
-                if numeric_fields and text_fields:
-                    chart_data = {
-                        'type': suggested_chart,
-                        'x_field': text_fields[0],
-                        'y_field': numeric_fields[0],
-                        'title': explanation
-                    }
-            
-            file_content = ReportExporter.to_pdf(results, 'reporte', report_metadata, chart_data)
-            content_type = 'application/pdf'
-            filename = f'reporte_{report_type}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        # 2-7. Interpretar, consultar, resumir y exportar (ver reports.jobs)
+        report = build_report(user, prompt, export_format, include_chart)
         
         # 8. Guardar log
         execution_time = time.time() - start_time
         
         report_log = ReportLog.objects.create(
             user=user,
-            report_type=report_type,
+            report_type=report['report_type'],
             input_type=input_type,
             original_prompt=prompt,
             transcription=transcription,
-            generated_sql=sql_query,
-            results_count=len(results),
+            generated_sql=report['sql_query'],
+            results_count=report['results_count'],
             export_format=export_format,
+            include_chart=include_chart,
             execution_time=execution_time,
-            tokens_used=tokens_used,
-            success=True
+            tokens_used=report['tokens_used'],
+            stage_timings=report['stage_timings'],
+            success=True,
+            completed_at=timezone.now()
         )
         
         # 9. Devolver archivo
-        response = HttpResponse(file_content.read(), content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # FileResponse (StreamingHttpResponse) envía el archivo por bloques
+        response = FileResponse(
+            report['file'], as_attachment=True, filename=report['filename'], content_type=report['content_type']
+        )
         response['X-Report-Id'] = str(report_log.id)
         response['X-Execution-Time'] = str(execution_time)
-        response['X-Results-Count'] = str(len(results))
+        response['X-Results-Count'] = str(report['results_count'])
+        response['X-Results-Truncated'] = 'true' if report['truncated'] else 'false'
         
         return response
         
@@ -169,7 +141,9 @@ def generate_report(request):
             execution_time=execution_time,
             tokens_used=0,
             success=False,
-            error_message=str(e)
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now()
         )
         
         return Response(
@@ -181,6 +155,58 @@ def generate_report(request):
         )
 
 
+def _get_user_report(request, report_id):
+    """
+    ReportLog visible para el usuario (admin ve todos), o None
+    """
+    reports = ReportLog.objects.select_related('user')
+    if request.user.role != 'admin':
+        reports = reports.filter(user=request.user)
+    return reports.filter(id=report_id).first()
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_status(request, report_id):
+    """
+    Estado de un reporte (asíncrono o no)
+    GET /api/reports/<id>/
+    """
+    report_log = _get_user_report(request, report_id)
+    if report_log is None:
+        return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(ReportLogSerializer(report_log).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_report(request, report_id):
+    """
+    Descarga el archivo de un reporte generado en segundo plano
+    GET /api/reports/<id>/download/
+    """
+    report_log = _get_user_report(request, report_id)
+    if report_log is None:
+        return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if report_log.status != 'completed':
+        return Response(
+            {'error': 'El reporte aún no está listo', 'status': report_log.status},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    if not report_log.file_path or not default_storage.exists(report_log.file_path):
+        return Response({'error': 'El archivo del reporte no está disponible'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return FileResponse(
+        default_storage.open(report_log.file_path, 'rb'),
+        as_attachment=True,
+        filename=os.path.basename(report_log.file_path),
+        content_type=CONTENT_TYPES.get(report_log.export_format, 'application/octet-stream')
+    )
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def preview_report(request):
@@ -224,13 +250,8 @@ def preview_report(request):
         # Validar y ejecutar
         ai_service.validate_sql_safety(sql_query)
         
-        with connection.cursor() as cursor:
-            cursor.execute(sql_query)
-            columns = [col[0] for col in cursor.description]
-            results = [
-                dict(zip(columns, row))
-                for row in cursor.fetchall()
-            ]
+        with ReportQueryResult(sql_query, max_rows=int(limit)) as query_result:
+            results = list(query_result)
         
         return Response({
             'success': True,
@@ -258,6 +279,8 @@ def preview_report(request):
 def report_history(request):
     """
     Historial de reportes generados por el usuario
+    GET /api/reports/history/?page=1&page_size=20
+    GET /api/reports/history/?pagination=cursor (luego ?cursor=<next>)
     """
     
     user = request.user
@@ -279,6 +302,13 @@ def report_history(request):
     if success_only == 'true':
         reports = reports.filter(success=True)
     
+    # Paginación por cursor (opcional): sin COUNT ni OFFSET
+    if OptInCursorPagination.wants_cursor(request):
+        paginator = CreatedAtCursorPagination()
+        reports_page = paginator.paginate_queryset(reports, request)
+        serializer = ReportLogSerializer(reports_page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     # Paginación simple
     page = int(request.query_params.get('page', 1))
     page_size = int(request.query_params.get('page_size', 20))